@@ -10,7 +10,7 @@
 # All Imports
 #-------------
 
-from flask import Flask, request, render_template, flash, redirect, url_for
+from flask import Flask, request, render_template, flash, redirect, url_for, jsonify, session
 import sys
 sys.path.insert(0, '../')
 import os
@@ -25,13 +25,18 @@ from werkzeug.exceptions import InternalServerError
 import json
 from pdfminer.high_level import extract_text
 import format as format
+import grammar_check
 import email_user as email_user
 import email_user_local as email_user_local
+import jobs
+import outbox
 from score_model import ScoreModel, IdeaModel, StyleModel
 import pandas as pd
-from grade import Grade
-import mysql.connector
+from grade import Grade, GradeConfig
+import database
+import file_store
 import ast
+import threading
 import traceback
 from datetime import datetime
 import urllib.parse
@@ -64,23 +69,26 @@ else:
 
 # Define Global Variables
 # ------------------------
-conn = ''
-cursor = ''
+store = None
 
-# Connect to database with the required host, username, password and name
+# Connect to database with the required host, username, password and name, or a local SQLite file if one is given.
+# Every request and grading job takes its own connection from the store's pool.
 # ------------------------
 try:
-    conn = mysql.connector.connect(host=app.config['DB_HOST'], user=app.config['DB_USERNAME'], passwd=app.config['DB_PASSWORD'], database=app.config['DB_NAME'])
-    cursor = conn.cursor()
+    if app.config['DB_SQLITE']:
+        store = database.connect_sqlite(app.config['DB_SQLITE'], app.config['DB_POOL_SIZE'])
+    else:
+        store = database.connect_mysql(app.config['DB_HOST'], app.config['DB_USERNAME'], app.config['DB_PASSWORD'],
+                                       app.config['DB_NAME'], app.config['DB_POOL_SIZE'])
 except Exception as e:
     if debug:
         print(e)
     print ('Unable to connect to database ' + app.config['DB_NAME'])
 
-command = "INSERT INTO UserFiles (name, data, grade, feedback, error, email, upload_date) VALUES (%s, %s, %s, %s, %s, %s, %s)"
 email = ''
 
-# Initialize rubric, weights and style dictionaries with default values
+# Initialize rubric, weights and style dictionaries with default values, each user's own preferences are kept in
+# their session instead of changing these
 # -------------------------------
 rubric = {'grammar': 20, 'key': 10, 'length': 20, 'format': 20, 'model': 20, 'reference': 10}
 # How easily or hard it is to lose points from each sections, use None to chose between word count and page count
@@ -92,16 +100,57 @@ style = {'font': "Times New Roman", 'size': 12, 'line_spacing': 2.0, 'after_spac
                       'right_margin': 1.0, 'top_margin': 1.0, 'header': 0.0, 'footer': 0.0, 'gutter': 0.0, 'indent': 1.0}
 
 start = "./data/"
-gradeModel = Grade(rubric, weights, start, style=style)
+# Every docx is parsed once, the Format is kept by the hash of the file and shared by the upload preview, grading and
+# the results page
+documents = format.FormatCache(app.config['DOCUMENT_CACHE_SIZE'])
+# The models are shared by every user, only the GradeConfig given with each essay differs
+gradeModel = Grade(rubric, weights, start, style=style, documents=documents)
+# One LanguageTool server for each worker, started now so the first essays graded don't have to wait on them
+grammar_check.configure(app.config['GRAMMAR_POOL_SIZE'])
+grammar_check.warmup()
+# Essays are graded by a pool of workers instead of inside the request
+jobQueue = jobs.JobQueue(app.config['JOB_WORKERS'], app.config['JOB_KEEP'])
 if debug:
     print('Ready!')
     
 # Set Values in Config Dictionary
 # -------------------------------
 app.config.from_mapping(
-    UPLOAD_FOLDER = os.path.join(app.instance_path, 'uploads'))
+    UPLOAD_FOLDER = os.path.join(app.instance_path, 'uploads'),
+    FILE_FOLDER = os.path.join(app.instance_path, 'files'))
 ALLOWED_EXTENSIONS = app.config['ALLOWED_EXTENSIONS']
 
+# Emails are stored in the outbox and sent by a background thread, so a job never waits on the SMTP server. Any left
+# unsent when the website stopped are sent once it starts again.
+emails = outbox.Outbox(os.path.join(app.instance_path, 'outbox.db'),
+                       outbox.smtp_connect(app.config['EMAIL_HOST'], app.config['EMAIL_PORT'],
+                                           email_user.sender_email if app.config['EMAIL_SSL'] else None,
+                                           email_user.password, app.config['EMAIL_SSL']),
+                       email_user.sender_email, app.config['EMAIL_BATCH_SIZE'], app.config['EMAIL_RETRIES'],
+                       app.config['EMAIL_BACKOFF'])
+emails.start()
+
+# Graded files are kept here by the hash of their contents, the database only holds their key. A file is removed once
+# it hasn't been uploaded again for FILE_KEEP seconds, which is checked every FILE_SWEEP seconds.
+files = file_store.FileStore(app.config['FILE_FOLDER'])
+
+
+def sweepFiles():
+    """
+    Removes every file older than FILE_KEEP from the file store, then schedules the next sweep
+    """
+    try:
+        files.remove_older_than(app.config['FILE_KEEP'])
+    except Exception as e:
+        if debug:
+            print(e)
+    timer = threading.Timer(app.config['FILE_SWEEP'], sweepFiles)
+    timer.daemon = True
+    timer.start()
+
+
+sweepFiles()
+
     
 
 
@@ -114,15 +163,11 @@ def updatePreference():
     -------
     A redirect back to the current webpage
     """
-   # Define global variables
-    global email
-    global rubric
-    global style
-    global weights
-    global gradeModel
-    
     # Store the preferences input
     if request.method == "POST":
+        rubric = {}
+        weights = {}
+        style = {}
         rubric['grammar'] = request.form.get("rubric1")
         rubric['key'] = request.form.get("rubric2")
         rubric['length'] = request.form.get("rubric3")
@@ -183,10 +228,10 @@ def updatePreference():
             if style[keys] == 0 or style[keys] == 0.0 or style[keys] == "None":
                 style[keys] = None
                 
-        # Updates each category with the values input
-        gradeModel.update_rubric(rubric)
-        gradeModel.update_weights(weights)
-        gradeModel.update_style(style)
+        # Stores the values input for this user only, gradeModel is shared by everyone
+        session['rubric'] = rubric
+        session['weights'] = weights
+        session['style'] = style
         
     return redirect (url_for('igaResponse'))
 
@@ -202,9 +247,6 @@ def updateEmail():
     A redirect back to the current webpage
     """
     
-    global rubric
-    global style
-    global weights
     if request.method == "POST":
        email = request.form.get("email")
     return redirect (url_for('igaResponse'))
@@ -277,36 +319,16 @@ def results():
             print(user_email)
             print(date)
         # retrieve the user's most recent essay
-        comm = "SELECT name, data, grade, error, feedback FROM UserFiles WHERE email = %s AND upload_date = %s"
-        args = (user_email, date)
-        cursor.execute(comm, args)
-        # only get the most recent one
-        result = cursor.fetchall()
+        result = store.get_result(user_email, date)
         if not result:
             return render_template('no_results.html')
-        result = result[0]
         # insert grade, feedback and error values
         form.grade.data = result[2]
         form.response.data = result[4]
         form.error.data = result[3]
-        # save file data to temporary file
-        filename = os.path.join(app.config['UPLOAD_FOLDER'], result[0])
-        file = open(filename, 'wb')
-        file.write(result[1])
-        file.close()
-        # determine type of file
-        filetype = filename.split('.')
-        # if word document
-        if filetype[len(filetype) - 1] == 'docx':
-            # get text from file
-            f = format.Format(filename)
-            form.essay.data = f.get_text()
-        # if pdf file
-        elif filetype[len(filetype) - 1] == 'pdf':
-            # get text from file
-            form.essay.data = extract_text(filename)
-        # remove temporary file
-        os.remove(filename)
+        # the text was stored when the essay was graded, so the file never has to be read again. Essays saved before
+        # the text was kept in the database still have it in the file store.
+        form.essay.data = result[5] if result[5] is not None else getStoredText(result[1]) or ''
         return render_template('results.html', form=form)
     except Exception as e:
         if debug:
@@ -326,15 +348,8 @@ def igaResponse():
      --------
      A redirect back to the current webpage. 
     """
-    global rubric
-    global style
-    global weights
-    global gradeModel
-    current_db = ''
-    current_gd = ''
-    current_out = ''
-    current_information = ''
-    current_text = ''
+    job_id = None
+    config = getConfig()
     if request.method == 'GET':
        form = IGAFormData(request.form)
        form.essay.data = ''
@@ -344,9 +359,9 @@ def igaResponse():
        form.uploadFile.data = ''
        form.information.data = ''
        form.email.data = ''
-       form.rubric.data = 'Rubric: ' + json.dumps(rubric)
-       form.weights.data = 'Weights: ' + json.dumps(weights)
-       form.style.data = 'Style: ' + json.dumps(style)
+       form.rubric.data = 'Rubric: ' + json.dumps(config.get_rubric())
+       form.weights.data = 'Weights: ' + json.dumps(config.get_weights())
+       form.style.data = 'Style: ' + json.dumps(config.get_style())
     if request.method == 'POST':
         form = IGAFormData(request.form)
         # For evaluate
@@ -358,35 +373,20 @@ def igaResponse():
                filepath = filepath[1].lstrip()
                if " " in filepath:
                 filepath = filepath.replace(" ", "_")
-               current_db, current_gd, current_out  = processEvaluateFile(os.path.join('./',(os.path.relpath((os.path.join(app.config['UPLOAD_FOLDER'], filepath))))))
-               if current_gd:
-                    form.grade.data = current_gd
-                    form.response.data = current_db
-                    form.error.data, form.information.data = formatError (current_out)
-                    # any uploaded file will be saved to database, open file to read its data
-                    path = os.path.join('./', (os.path.relpath((os.path.join(app.config['UPLOAD_FOLDER'], filepath)))))
-                    now = datetime.now()
-                    formatted_date = now.strftime('%Y-%m-%d %H:%M:%S')
-                    processSave(filepath, path, current_gd, form.response.data, form.error.data, form.email.data, formatted_date)
-
-                    # after storing file in database, send email
-                    if form.email.data:
-                        processEmail(form.email.data, formatted_date)
-                        flash("Email has been sent to: " + form.email.data)
-                        # remove temp file so space is not wasted
-                        os.remove(os.path.join('./', (os.path.relpath((os.path.join(app.config['UPLOAD_FOLDER'], filepath))))))
-                    else:
-                        flash("Please enter a valid email addresss")       
+               path = os.path.join('./', (os.path.relpath((os.path.join(app.config['UPLOAD_FOLDER'], filepath)))))
+               now = datetime.now()
+               formatted_date = now.strftime('%Y-%m-%d %H:%M:%S')
+               # grading, saving and emailing all happen once the job is picked up by a worker
+               job_id = jobQueue.submit(processFileJob, filepath, path, form.email.data, formatted_date,
+                                        config)
+               if form.email.data:
+                    flash("Your essay has been queued, an email will be sent to: " + form.email.data +
+                          " once it has been graded")
                else:
-                    flash("Error in evaluating essay")
+                    flash("Please enter a valid email addresss")
             elif form.essay.data:
-               current_db, current_gd, current_out = processEvaluateTextEssay(form.essay.data)
-               if current_gd:
-                    form.grade.data = current_gd
-                    form.response.data = current_db
-                    form.error.data, form.information.data = formatError (current_out)
-               else:
-                    flash("Error in evaluating essay")
+               job_id = jobQueue.submit(processTextJob, form.essay.data, None, config)
+               flash("Your essay has been queued for grading")
             else:
                 flash ("Please enter an essay or upload a file")
             # any uploaded file will be saved to database, open file to read its data
@@ -402,9 +402,9 @@ def igaResponse():
            form.information.data = ''
            form.uploadFile.data = ''
            form.email.data = ''
-           form.rubric.data = 'Rubric: ' + json.dumps(rubric)
-           form.weights.data = 'Weights: ' + json.dumps(weights)
-           form.style.data = 'Style: ' + json.dumps(style)
+           form.rubric.data = 'Rubric: ' + json.dumps(config.get_rubric())
+           form.weights.data = 'Weights: ' + json.dumps(config.get_weights())
+           form.style.data = 'Style: ' + json.dumps(config.get_style())
            
       
                     
@@ -433,8 +433,92 @@ def igaResponse():
                 flash("File types accepted are .pdf, .docx, .txt")
                 return redirect(request.url)
                 
-    return render_template('igaView.html', form=form)
+    return render_template('igaView.html', form=form, job_id=job_id)
+
+
+
+@app.route('/status/<job_id>')
+def status(job_id):
+    """
+    Returns the status of a grading job queued by igaResponse
+
+    Returns
+    -------
+    JSON containing the job's status, which is one of queued, running, done or failed. Once done, it also contains the
+    grade, response, error and information of the essay, or an error message if it couldn't be evaluated.
+    """
+    job = jobQueue.get_status(job_id)
+    if job is None:
+        return jsonify({'status': 'missing'}), 404
+
+    response = {'status': job['status'], 'waiting': jobQueue.get_waiting()}
+    if job['status'] == 'done':
+        response.update(job['result'])
+    if job['status'] == 'failed':
+        response['message'] = "Error in evaluating essay"
+    return jsonify(response)
+
+
+def processFileJob(name, path, email, date, config=None):
+    """
+     Evaluates an uploaded file, saves it to the database and emails the user a link to the results. This is run by
+     jobQueue, outside of any request.
+
+     Returns
+     -------
+     The grade, response, error and information for the essay, or a message if it couldn't be evaluated
+    """
+    result = processTextJob(None, path, config)
+    if 'message' in result:
+        return result
+
+    # keep the file, along with its text and the breakdown of its grade, so viewing the results doesn't need to read
+    # or grade it again. The report reuses everything measured while grading.
+    key = files.put(path)
+    report = gradeModel.get_report(path, config)
+    text = report.pop('text')
+    processSave(name, key, text, report, result['grade'], result['response'], result['error'], email, date)
+    # after storing file in database, send email
+    if email:
+        try:
+            sendEmail(email, date)
+        except Exception as e:
+            if debug:
+                print(e)
+            result['message'] = "Error in sending Email"
+        # remove temp file so space is not wasted
+        os.remove(path)
+    return result
+
+
+def processTextJob(essay, filepath=None, config=None):
+    """
+     Evaluates an essay, or the file at filepath if given, under the user's GradeConfig. This is run by jobQueue,
+     outside of any request.
+
+     Returns
+     -------
+     The grade, response, error and information for the essay, or a message if it couldn't be evaluated
+    """
+    if filepath is not None:
+        current_db, current_gd, current_out = processEvaluateFile(filepath, config)
+    else:
+        current_db, current_gd, current_out = processEvaluateTextEssay(essay, config)
+    if not current_gd:
+        return {'message': "Error in evaluating essay"}
 
+    error, information = formatError(current_out)
+    return {'grade': current_gd, 'response': current_db, 'error': error, 'information': information}
+
+
+def getConfig():
+    """
+    Returns
+    -------
+    The GradeConfig holding the current user's preferences, or the default rubric, weights and style if they haven't
+    set any
+    """
+    return GradeConfig(session.get('rubric', rubric), session.get('weights', weights), session.get('style', style))
 
 
 def getFileText(filepath):
@@ -448,7 +532,7 @@ def getFileText(filepath):
     # File must be a docx or doc
     if f[len(f) - 1] == "docx" or f[len(f) - 1] == "doc":
         try:
-            word = format.Format(filepath)
+            word = documents.get(filepath)
             t = word.get_text()
             return t
         except Exception as e:
@@ -477,7 +561,20 @@ def getFileText(filepath):
             return None
 
 
-def processEvaluateFile(filepath):
+def getStoredText(key):
+    """
+    Returns
+    -------
+    The text of a docx in the file store, for essays saved before their text was stored in the database, or None if
+    there is no such file, such as for an essay that was typed in rather than uploaded
+    """
+    if key is None or not key.endswith('.docx') or not files.exists(key):
+        return None
+    # the file store key starts with the same hash the FormatCache uses, so the file doesn't need hashing again
+    return documents.get(files.get_path(key), key.split('.')[0]).get_text()
+
+
+def processEvaluateFile(filepath, config=None):
     """
      Evaluates file for grading
      
@@ -486,10 +583,9 @@ def processEvaluateFile(filepath):
      The debug, grade and output for the essay 
     """
     
-    global gradeModel
     if filepath:
         try:
-            db, gd, out = gradeModel.get_grade(filepath)
+            db, gd, out = gradeModel.get_grade(filepath, config)
             return out, gd, db
         except Exception as e:
             if debug:
@@ -500,7 +596,7 @@ def processEvaluateFile(filepath):
 
 
     
-def processEvaluateTextEssay(essay):
+def processEvaluateTextEssay(essay, config=None):
     """
      Evaluates input essay for grading
      
@@ -509,10 +605,9 @@ def processEvaluateTextEssay(essay):
      The debug, grade and output for the essay 
     """
 
-    global gradeModel
     if essay:
         try:
-            db, gd, out = gradeModel.get_grade(essay)
+            db, gd, out = gradeModel.get_grade(essay, config)
             return out, gd, db
         except Exception as e:
             if debug:
@@ -553,18 +648,10 @@ def formatError(error):
 
 # Saves the Essay in Database
 # ----------------------------   
-def processSave(name, path, grade, feedback, error, email, upload_date):
-    global conn
-    global cursor
-    if cursor:
+def processSave(name, key, text, report, grade, feedback, error, email, upload_date):
+    if store:
         try:
-            file = open(path, 'rb')
-            args = (name, file.read(), grade, feedback, error, email, upload_date)
-            cursor.execute(command, args)
-            # write update to database
-            conn.commit()
-            file.close()
-            return cursor.lastrowid
+            return store.save(name, key, text, report, grade, feedback, error, email, upload_date)
         except Exception as e:
             if debug:
                 print (e)
@@ -576,26 +663,15 @@ def processSave(name, path, grade, feedback, error, email, upload_date):
 # Sends Email to given email address
 # ----------------------------------
 
-def processEmail(email, date):
-    if  email:
-        if date:
-            try:
-                if debug:
-                    email_user_local.send_email_local(email, date)
-                else:
-                    email_user.send_email(email, date)
-                return 1
-            except Exception as e:
-                if debug:
-                    print(e)
-                flash("Error in sending Email")
-                return None
-        else:
-            flash("Essay has not been evaluated")
-            return None
+def sendEmail(email, date):
+    """
+     Adds the email with the results link to the outbox, which sends it in the background. Any error is raised instead
+     of flashed so it can be used outside of a request
+    """
+    if debug:
+        emails.send(email, email_user_local.get_message(email, date))
     else:
-        flash("Email address has not been set")
-        return None
+        emails.send(email, email_user.get_message(email, date))
 
 
 if __name__ == '__main__':
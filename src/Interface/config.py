@@ -18,6 +18,28 @@ class Config(object):
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
     ALLOWED_FONTS = ["Times New Roman", "Calibri Math"]
     SESSION_COOKIE_SECURE = True
+    # Set to a filepath to store essays in a local SQLite database instead of MySQL
+    DB_SQLITE = None
+    DB_POOL_SIZE = 5
+    # Seconds a graded file is kept for, which matches the database removing essays after 7 days
+    FILE_KEEP = 7 * 24 * 60 * 60
+    # Seconds between each check for files older than FILE_KEEP
+    FILE_SWEEP = 60 * 60
+    # Number of essays graded at the same time, and how many seconds a finished job's status is kept
+    JOB_WORKERS = 2
+    JOB_KEEP = 3600
+    # Number of LanguageTool servers, so every essay being graded at once can check its grammar without waiting
+    GRAMMAR_POOL_SIZE = JOB_WORKERS
+    # Number of parsed docx files kept in memory, shared by the upload preview, grading and the results page
+    DOCUMENT_CACHE_SIZE = 32
+    # SMTP server the outbox sends emails through, set EMAIL_SSL to False to use a local test server without a login
+    EMAIL_HOST = 'smtp.gmail.com'
+    EMAIL_PORT = 465
+    EMAIL_SSL = True
+    # Emails sent at a time over one connection, times a failed email is retried, and seconds before the first retry
+    EMAIL_BATCH_SIZE = 20
+    EMAIL_RETRIES = 5
+    EMAIL_BACKOFF = 30
 
 class ProductionConfig(Config):
     pass
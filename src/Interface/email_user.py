@@ -16,8 +16,11 @@ decrypted_bytes = (cipher_suite.decrypt(encrypted))
 password = bytes(decrypted_bytes).decode("utf-8") #convert to string
 
 
-def send_email(receiver_email, date):
-    message = f"""\
+def get_message(receiver_email, date):
+    """
+    Returns the email telling the user where to find the results of the essay they uploaded at the given date
+    """
+    return f"""\
 Subject: Your essay has been graded
 
 Your essay has now been graded. To view the results, click the following link:
@@ -25,6 +28,10 @@ http://ec2-23-21-141-182.compute-1.amazonaws.com/results?email={urllib.parse.quo
 
 This essay will be removed from our database in 7 days. At that point, you will no longer be able to view it with the above link.
 """
+
+
+def send_email(receiver_email, date):
+    message = get_message(receiver_email, date)
     context = ssl.create_default_context()
     with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
         server.login(sender_email, password)
@@ -16,8 +16,11 @@ decrypted_bytes = (cipher_suite.decrypt(encrypted))
 password = bytes(decrypted_bytes).decode("utf-8") #convert to string
 
 
-def send_email_local(receiver_email, date):
-    message = f"""\
+def get_message(receiver_email, date):
+    """
+    Returns the email telling the user where to find the results of the essay they uploaded at the given date
+    """
+    return f"""\
 Subject: Your essay has been graded
 
 Your essay has now been graded. To view the results, click the following link:
@@ -25,6 +28,10 @@ http://127.0.0.1:5000/results?email={urllib.parse.quote(receiver_email)}&date={u
 
 This essay will be removed from our database in 7 days. At that point, you will no longer be able to view it with the above link.
 """
+
+
+def send_email_local(receiver_email, date):
+    message = get_message(receiver_email, date)
     context = ssl.create_default_context()
     with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
         server.login(sender_email, password)
@@ -0,0 +1,112 @@
+import concurrent.futures
+import threading
+import time
+import traceback
+import uuid
+
+
+class JobQueue:
+    """
+    The JobQueue class runs submitted jobs on a pool of worker threads, so a request can hand off the slow work of
+    grading an essay and return straight away. Each job is given an id that can be used to check on it later.
+
+    Parameters
+    ----------
+    workers : int
+        The number of jobs run at the same time, any others wait in the queue.
+    keep : int
+        The number of seconds a finished job is kept for, after which its status can no longer be found.
+    """
+    __slots__ = ('__executor', '__jobs', '__lock', '__keep')
+
+    def __init__(self, workers=2, keep=3600):
+        self.__executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.__jobs = {}
+        self.__lock = threading.Lock()
+        self.__keep = keep
+
+    def submit(self, function, *args):
+        """
+        Adds function(*args) to the queue
+
+        Parameters
+        ----------
+        function : function
+            The work to be done, whatever it returns is kept as the job's result.
+        args
+            Passed on to function.
+
+        Returns
+        -------
+        str
+            The job's id, see get_status().
+        """
+        job_id = uuid.uuid4().hex
+        with self.__lock:
+            self.__forget_finished()
+            self.__jobs[job_id] = {'status': 'queued', 'result': None, 'error': None, 'finished': None}
+        self.__executor.submit(self.__run, job_id, function, args)
+        return job_id
+
+    def __run(self, job_id, function, args):
+        self.__update(job_id, status='running')
+        try:
+            self.__update(job_id, status='done', result=function(*args), finished=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self.__update(job_id, status='failed', error=str(e), finished=time.time())
+
+    def __update(self, job_id, **changes):
+        with self.__lock:
+            self.__jobs[job_id].update(changes)
+
+    def __forget_finished(self):
+        """
+        Removes every job that finished more than keep seconds ago, the lock must already be held.
+        """
+        now = time.time()
+        for job_id in [j for j in self.__jobs.keys() if self.__jobs[j]['finished'] is not None and
+                       now - self.__jobs[j]['finished'] > self.__keep]:
+            del self.__jobs[job_id]
+
+    def get_status(self, job_id):
+        """
+        Parameters
+        ----------
+        job_id : str
+            The id given by submit().
+
+        Returns
+        -------
+        dict
+            'status' is one of 'queued', 'running', 'done' or 'failed'.
+            'result' is whatever the job returned once it is done, otherwise None.
+            'error' is the reason the job failed, otherwise None.
+            None is returned instead if no job has the given id.
+        """
+        with self.__lock:
+            if job_id not in self.__jobs:
+                return None
+            job = self.__jobs[job_id]
+            return {'status': job['status'], 'result': job['result'], 'error': job['error']}
+
+    def get_waiting(self):
+        """
+        Returns
+        -------
+        int
+            The number of jobs that are queued or running.
+        """
+        with self.__lock:
+            return len([j for j in self.__jobs.values() if j['finished'] is None])
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting jobs.
+
+        Parameters
+        ----------
+        wait : bool
+            If True, this waits for every queued job to finish first.
+        """
+        self.__executor.shutdown(wait)
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import pandas
+
+# The default rubric and weights, the same as main.py
+rubric = {'grammar': 20, 'key': 10, 'length': 20, 'format': 20, 'model': 20, 'reference': 10}
+weights = {'grammar': 1, 'allowed_mistakes': 3, 'key_max': 2, 'key_min': 0, 'word_min': 300, 'word_max': None,
+           'page_min': None, 'page_max': None, 'format': 5, 'reference': 5}
+
+# File types that can be graded when given a directory
+EXTENSIONS = ('.txt', '.pdf', '.docx')
+# Columns written to a .tsv output, a .jsonl output uses the same keys
+COLUMNS = ('id', 'grade', 'feedback', 'debug')
+
+# The Grade used by this process, workers forked after it is made share its models and embeddings with the parent
+_grade = None
+
+
+def read_essays(path):
+    """
+    Returns every essay to be graded from a spreadsheet or a directory
+
+    Parameters
+    ----------
+    path : str
+        Either a .tsv or .csv with an 'essay' column, and optionally an 'essay_id' column, or a directory of .txt, .pdf
+        and .docx files.
+
+    Returns
+    -------
+    list of tuple of str, str
+        An (id, text) pair for every essay. The id is the essay_id, the row number or the file name, and the text is
+        either the essay itself or a filepath that Grade.get_grade() will read. Rows with an empty essay are left out.
+
+    Raises
+    ------
+    FileNotFoundError
+        The given path doesn't exist.
+    KeyError
+        The spreadsheet has no 'essay' column.
+    """
+    if os.path.isdir(path):
+        essays = []
+        for name in sorted(os.listdir(path)):
+            if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                filepath = os.path.relpath(os.path.join(path, name))
+                # Grade only reads a file if its path begins with ./ or ../
+                if not filepath.startswith('..'):
+                    filepath = './' + filepath
+                essays.append((name, filepath))
+        return essays
+
+    data = pandas.read_csv(path, sep='\t' if path.endswith('.tsv') else ',', encoding='ISO-8859-1')
+    ids = data['essay_id'] if 'essay_id' in data.columns else range(len(data))
+    # An empty cell is read as NaN, which would otherwise be graded as the essay 'nan'
+    return [(str(i), str(text)) for i, text in zip(ids, data['essay']) if not pandas.isna(text) and str(text).strip()]
+
+
+def read_finished(path):
+    """
+    Returns the id of every essay already written to an output, so an interrupted run can be resumed
+
+    Parameters
+    ----------
+    path : str
+        A .tsv or .jsonl output written by grade_all().
+
+    Returns
+    -------
+    set of str
+        Every id found, empty if the output doesn't exist yet.
+    """
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+
+    with open(path, newline='', encoding='utf8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                # A line cut off by the interruption is graded again
+                try:
+                    finished.add(str(json.loads(line)['id']))
+                except (ValueError, KeyError):
+                    continue
+        else:
+            for row in csv.DictReader(f, delimiter='\t'):
+                if row['id'] is not None and row['debug'] is not None:
+                    finished.add(row['id'])
+
+    return finished
+
+
+def _init_worker(settings):
+    """
+    Makes the Grade for a worker that couldn't be forked from the parent, see grade_all().
+    """
+    # Imported here so that reading essays and results doesn't require the models
+    from grade import Grade
+
+    global _grade
+    _grade = Grade(**settings)
+
+
+def _grade_batch(batch):
+    """
+    Grades a batch of (id, text) pairs with this process' Grade
+
+    Returns
+    -------
+    tuple of list, dict
+        An (id, (debug, grade, feedback)) pair for every essay, followed by the time spent on each stage, see
+        Grade.get_timings().
+    """
+    _grade.reset_timings()
+    results = _grade.get_grades([text for i, text in batch])
+    return [(i, r) for (i, text), r in zip(batch, results)], _grade.get_timings()
+
+
+def grade_all(input_path, output_path, settings, workers=1, batch_size=32, resume=True, log=sys.stderr):
+    """
+    Grades every essay from input_path and streams the results to output_path as each batch finishes
+
+    Parameters
+    ----------
+    input_path : str
+        See read_essays().
+    output_path : str
+        A .jsonl file gets one JSON object per line, anything else is written as a .tsv with the columns in COLUMNS.
+    settings : dict
+        The keyword arguments given to Grade.
+    workers : int
+        The number of processes grading at once. Where possible, the workers are forked after the models have been
+        loaded, so their memory is shared with the parent instead of being loaded again.
+    batch_size : int
+        The number of essays given to Grade.get_grades() at a time.
+    resume : bool
+        If True, essays already in output_path are skipped and new results are added to the end. Otherwise output_path
+        is written over.
+    log : file
+        Where the progress and timing summary are written, or None to write nothing.
+
+    Returns
+    -------
+    dict
+        The number of essays measured and total seconds spent on each stage, see Grade.get_timings().
+    """
+    global _grade
+
+    essays = read_essays(input_path)
+    finished = read_finished(output_path) if resume else set()
+    essays = [e for e in essays if e[0] not in finished]
+    batches = [essays[i:i + batch_size] for i in range(0, len(essays), batch_size)]
+    if len(batches) == 0:
+        if log is not None:
+            print("Every essay in " + input_path + " has already been graded", file=log)
+        return {}
+
+    jsonl = output_path.endswith('.jsonl')
+    new_file = not resume or not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    out = open(output_path, 'w' if not resume else 'a', newline='', encoding='utf8')
+    writer = None if jsonl else csv.writer(out, delimiter='\t')
+    if writer is not None and new_file:
+        writer.writerow(COLUMNS)
+
+    pool = None
+    if workers > 1 and len(batches) > 1:
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Load everything before forking, so every worker shares the parent's memory
+            from grade import Grade
+            _grade = Grade(**settings)
+            pool = multiprocessing.get_context('fork').Pool(workers)
+        else:
+            pool = multiprocessing.Pool(workers, _init_worker, (settings,))
+        results = pool.imap(_grade_batch, batches)
+    else:
+        _init_worker(settings)
+        results = map(_grade_batch, batches)
+
+    timings = {}
+    done, start = 0, time.perf_counter()
+    try:
+        for graded, batch_timings in results:
+            for i, (debug, grade, output) in graded:
+                if jsonl:
+                    out.write(json.dumps({'id': i, 'grade': grade, 'feedback': output, 'debug': debug}) + '\n')
+                else:
+                    writer.writerow((i, grade, output, debug))
+            out.flush()
+
+            for stage in batch_timings.keys():
+                count, seconds = timings.get(stage, (0, 0.0))
+                timings[stage] = (count + batch_timings[stage][0], seconds + batch_timings[stage][1])
+
+            done += len(graded)
+            if log is not None:
+                elapsed = time.perf_counter() - start
+                print("Graded " + str(done) + "/" + str(len(essays)) + " essays (" + str(len(finished)) +
+                      " already done) in " + str(round(elapsed, 1)) + "s", file=log)
+    finally:
+        out.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if _grade is not None:
+            _grade.close()
+
+    if log is not None:
+        print(get_summary(timings), file=log)
+
+    return timings
+
+
+def get_summary(timings):
+    """
+    Parameters
+    ----------
+    timings : dict
+        The timings given by grade_all() or Grade.get_timings().
+
+    Returns
+    -------
+    str
+        A table of the essays measured, total seconds and average seconds per essay for each stage. Time spent in
+        worker processes is added together, so the total can be more than the time the run took.
+    """
+    summary = "Stage".ljust(12) + "Essays".rjust(8) + "Seconds".rjust(12) + "Per Essay".rjust(12) + "\n"
+    for stage in sorted(timings.keys()):
+        count, seconds = timings[stage]
+        summary += stage.ljust(12) + str(count).rjust(8) + str(round(seconds, 2)).rjust(12)
+        summary += str(round(seconds / count, 3) if count > 0 else 0).rjust(12) + "\n"
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade every essay in a .tsv, .csv or directory of .txt, .pdf and "
+                                                 ".docx files.")
+    parser.add_argument('input', help="a .tsv or .csv with an 'essay' column, or a directory of essays")
+    parser.add_argument('output', help="a .tsv or .jsonl file where results are written")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of grading processes")
+    parser.add_argument('--batch-size', type=int, default=32, help="essays graded by a worker at a time")
+    parser.add_argument('--start', default='../data/', help="filepath to the data folder")
+    parser.add_argument('--preferences', help="a .json file with 'rubric' and 'weights', in place of the defaults")
+    parser.add_argument('--fused', action='store_true', help="use the fused model in place of the four models")
+    parser.add_argument('--cache-path', help="a directory to store grades and measurements between runs")
+    parser.add_argument('--restart', action='store_true', help="write over the output instead of resuming it")
+    args = parser.parse_args()
+
+    settings = {'rubric': rubric, 'weights': weights, 'start': args.start, 'fused': args.fused,
+                'cache_path': args.cache_path}
+    if args.preferences is not None:
+        with open(args.preferences) as f:
+            preferences = json.load(f)
+        settings['rubric'] = preferences['rubric']
+        settings['weights'] = preferences['weights']
+
+    grade_all(args.input, args.output, settings, args.workers, args.batch_size, not args.restart)
+
+
+# This stops all the code from running when Sphinx imports the module.
+if __name__ == '__main__':
+    main()
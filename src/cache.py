@@ -0,0 +1,238 @@
+import collections
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+
+def get_key(*parts):
+    """
+    Returns a key for the given parts, the same parts will always give the same key
+
+    Parameters
+    ----------
+    parts
+        Any number of values that can be stored as JSON, such as strings, numbers, lists and dictionaries.
+
+    Returns
+    -------
+    str
+        A hex digest of the parts.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+
+def get_file_key(filepath):
+    """
+    Returns a key for the contents of a file, so two copies of the same file have the same key
+
+    Parameters
+    ----------
+    filepath : str
+        The file to be read.
+
+    Returns
+    -------
+    str
+        A hex digest of the file.
+
+    Raises
+    ------
+    FileNotFoundError
+        The given filepath doesn't exist.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    The LRUCache class keeps a limited number of values in memory, throwing out the least recently used value once it
+    is full. It is safe to use from multiple threads.
+
+    Parameters
+    ----------
+    maxsize : int
+        The most values kept at once.
+    """
+    __slots__ = ('__maxsize', '__entries', '__lock')
+
+    def __init__(self, maxsize=128):
+        self.__maxsize = maxsize
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, default=None):
+        """
+        Parameters
+        ----------
+        key : str
+            The key the value was stored with.
+        default
+            Returned if there is no value for the key.
+
+        Returns
+        -------
+        The value stored with the key, otherwise default.
+        """
+        with self.__lock:
+            if key not in self.__entries:
+                return default
+            self.__entries.move_to_end(key)
+            return self.__entries[key]
+
+    def put(self, key, value):
+        """
+        Parameters
+        ----------
+        key : str
+            The key to store the value with.
+        value
+            The value to be stored.
+        """
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every value.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+
+class DiskCache:
+    """
+    The DiskCache class stores values as files in a directory, so they are kept between runs and shared between
+    processes.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to store the files in, it is made if it doesn't exist.
+    """
+    __slots__ = ('__directory',)
+
+    def __init__(self, directory):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __get_path(self, key):
+        return os.path.join(self.__directory, key[:2], key + '.pickle')
+
+    def get(self, key, default=None):
+        """
+        Parameters
+        ----------
+        key : str
+            The key the value was stored with.
+        default
+            Returned if there is no value for the key, or it can't be read.
+
+        Returns
+        -------
+        The value stored with the key, otherwise default.
+        """
+        try:
+            with open(self.__get_path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return default
+
+    def put(self, key, value):
+        """
+        Parameters
+        ----------
+        key : str
+            The key to store the value with.
+        value
+            The value to be stored, it must be able to be pickled.
+        """
+        path = self.__get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so another process never reads half a value
+        temp = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        with open(temp, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(temp, path)
+
+    def clear(self):
+        """
+        Removes every stored file.
+        """
+        for root, directories, files in os.walk(self.__directory):
+            for f in files:
+                if f.endswith('.pickle'):
+                    os.remove(os.path.join(root, f))
+
+
+class Cache:
+    """
+    The Cache class combines an LRUCache in front of an optional DiskCache. Values found on disk are kept in memory for
+    the next time they are needed.
+
+    Parameters
+    ----------
+    maxsize : int
+        The most values kept in memory at once.
+    directory : str
+        An optional directory to also store values on disk, see DiskCache.
+    """
+    __slots__ = ('__memory', '__disk')
+
+    def __init__(self, maxsize=128, directory=None):
+        self.__memory = LRUCache(maxsize)
+        self.__disk = None if directory is None else DiskCache(directory)
+
+    def get(self, key, default=None):
+        """
+        Parameters
+        ----------
+        key : str
+            The key the value was stored with.
+        default
+            Returned if there is no value for the key.
+
+        Returns
+        -------
+        The value stored with the key, otherwise default.
+        """
+        value = self.__memory.get(key)
+        if value is None and self.__disk is not None:
+            value = self.__disk.get(key)
+            if value is not None:
+                self.__memory.put(key, value)
+        if value is None:
+            return default
+        return value
+
+    def put(self, key, value):
+        """
+        Parameters
+        ----------
+        key : str
+            The key to store the value with.
+        value
+            The value to be stored, it can't be None.
+        """
+        self.__memory.put(key, value)
+        if self.__disk is not None:
+            self.__disk.put(key, value)
+
+    def clear(self):
+        """
+        Removes every value, both in memory and on disk.
+        """
+        self.__memory.clear()
+        if self.__disk is not None:
+            self.__disk.clear()
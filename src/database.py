@@ -0,0 +1,443 @@
+import contextlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+# Made for SQLite, the MySQL table is made by hand, see the database section of the documentation
+CREATE_TABLE = ("CREATE TABLE IF NOT EXISTS UserFiles (file_id INTEGER PRIMARY KEY AUTOINCREMENT, name CHAR(50), "
+                "file_key CHAR(80), essay MEDIUMTEXT, result TEXT, grade FLOAT, feedback TEXT, error TEXT, "
+                "email CHAR(70), upload_date DATETIME)")
+# Columns added since the table was first made, which are added to an older SQLite table by connect_sqlite()
+ADDED_COLUMNS = (('file_key', 'CHAR(80)'), ('essay', 'MEDIUMTEXT'), ('result', 'TEXT'))
+# Results are always looked up by email and upload date
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS UserFilesLookup ON UserFiles (email, upload_date)"
+# The file itself is kept in a file_store.FileStore, only its key is stored in the table. The essay's text and its
+# result are stored when it is graded, so showing the results never has to read the file again.
+INSERT_FILE = ("INSERT INTO UserFiles (name, file_key, essay, result, grade, feedback, error, email, upload_date) "
+               "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)")
+SELECT_RESULT = ("SELECT name, file_key, grade, error, feedback, essay, result FROM UserFiles "
+                 "WHERE email = %s AND upload_date = %s")
+
+
+class ConnectionPool:
+    """
+    The ConnectionPool class keeps a bounded number of database connections, so requests running at the same time each
+    use their own connection instead of sharing one. Each connection is checked out by one caller at a time and checked
+    back in once they are done with it. Connections are only opened when first needed, and a connection that has been
+    idle for a while is checked before being handed out, being replaced if it has dropped.
+
+    Parameters
+    ----------
+    connect : function
+        Opens and returns a new connection.
+    is_alive : function
+        Given a connection, returns True if it can still be used.
+    size : int
+        The most connections open at once.
+    check_after : float
+        The number of seconds a connection can be idle before it is checked with is_alive when checked out.
+
+    Raises
+    ------
+    ValueError
+        The size is less than 1.
+    """
+    __slots__ = ('__connect', '__is_alive', '__size', '__check_after', '__connections', '__created', '__lock')
+
+    def __init__(self, connect, is_alive, size=5, check_after=30):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.__connect = connect
+        self.__is_alive = is_alive
+        self.__size = size
+        self.__check_after = check_after
+        # Holds (connection, time it was checked in) pairs
+        self.__connections = queue.LifoQueue()
+        self.__created = 0
+        self.__lock = threading.Lock()
+
+    def get_size(self):
+        """
+        Returns
+        -------
+        int
+            The most connections open at once.
+        """
+        return self.__size
+
+    def __grow(self):
+        """
+        Opens a new connection if the pool hasn't reached its size yet
+
+        Returns
+        -------
+        The new connection, or None if the pool is already full.
+        """
+        with self.__lock:
+            if self.__created >= self.__size:
+                return None
+            self.__created += 1
+        try:
+            return self.__connect()
+        except Exception:
+            with self.__lock:
+                self.__created -= 1
+            raise
+
+    def checkout(self, timeout=None):
+        """
+        Takes a connection out of the pool, waiting for one to be checked in if they are all in use. The connection must
+        be given back with checkin(), or discard() if it has failed.
+
+        Parameters
+        ----------
+        timeout : float
+            The most seconds to wait for a connection, waits forever if not given.
+
+        Returns
+        -------
+        A connection that was either just opened or passed its check.
+
+        Raises
+        ------
+        queue.Empty
+            No connection was checked in before the timeout.
+        """
+        while True:
+            try:
+                c, since = self.__connections.get_nowait()
+            except queue.Empty:
+                c = self.__grow()
+                if c is not None:
+                    return c
+                c, since = self.__connections.get(timeout=timeout)
+
+            if time.time() - since <= self.__check_after or self.__check(c):
+                return c
+            # The connection has dropped, so close it and try again, which opens a new one in its place
+            self.discard(c)
+
+    def __check(self, c):
+        try:
+            return self.__is_alive(c)
+        except Exception:
+            return False
+
+    def checkin(self, c):
+        """
+        Gives a connection taken by checkout() back to the pool
+
+        Parameters
+        ----------
+        c
+            The connection to give back.
+        """
+        self.__connections.put((c, time.time()))
+
+    def discard(self, c):
+        """
+        Closes a connection taken by checkout() instead of giving it back, so a new one is opened in its place
+
+        Parameters
+        ----------
+        c
+            The connection to close.
+        """
+        try:
+            c.close()
+        except Exception:
+            pass
+        with self.__lock:
+            self.__created -= 1
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """
+        Checks out a connection for the length of a with statement, checking it back in afterwards. If the connection
+        fails its check after an error, it is discarded instead.
+
+        Parameters
+        ----------
+        timeout : float
+            See checkout().
+        """
+        c = self.checkout(timeout)
+        try:
+            yield c
+        except Exception:
+            if self.__check(c):
+                self.checkin(c)
+            else:
+                self.discard(c)
+            raise
+        self.checkin(c)
+
+    def health_check(self):
+        """
+        Checks every connection that isn't currently checked out, closing any that have dropped.
+
+        Returns
+        -------
+        int
+            The number of connections that were closed.
+        """
+        closed = 0
+        checked = []
+        try:
+            while True:
+                checked.append(self.__connections.get_nowait()[0])
+        except queue.Empty:
+            pass
+
+        for c in checked:
+            if self.__check(c):
+                self.checkin(c)
+            else:
+                self.discard(c)
+                closed += 1
+        return closed
+
+    def close(self):
+        """
+        Closes every connection that isn't currently checked out.
+        """
+        try:
+            while True:
+                self.discard(self.__connections.get_nowait()[0])
+        except queue.Empty:
+            pass
+
+
+class UserFileStore:
+    """
+    The UserFileStore class reads and writes the UserFiles table through a ConnectionPool. Any statement that fails
+    because its connection dropped is tried again on a new connection. Use connect_mysql() or connect_sqlite() to make
+    one.
+
+    Parameters
+    ----------
+    pool : ConnectionPool
+        The pool connections are taken from.
+    errors : tuple of type
+        The exceptions raised when a connection drops, these are retried while any other exception is raised straight
+        away.
+    placeholder : str
+        The parameter placeholder used by the database, '%s' for MySQL or '?' for SQLite.
+    retries : int
+        The most times a statement is tried again.
+    backoff : float
+        The number of seconds waited before the first retry, doubling with every retry after it.
+    timeout : float
+        The most seconds to wait for a free connection, waits forever if None.
+    """
+    __slots__ = ('__pool', '__errors', '__placeholder', '__retries', '__backoff', '__timeout')
+
+    def __init__(self, pool, errors, placeholder='%s', retries=2, backoff=0.1, timeout=10):
+        self.__pool = pool
+        self.__errors = errors
+        self.__placeholder = placeholder
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__timeout = timeout
+
+    def __statement(self, statement):
+        return statement.replace('%s', self.__placeholder)
+
+    def __run(self, function):
+        """
+        Runs function(connection) with a pooled connection, retrying on a new connection if it drops
+
+        Returns
+        -------
+        Whatever the function returns.
+        """
+        for attempt in range(self.__retries + 1):
+            c = self.__pool.checkout(self.__timeout)
+            try:
+                result = function(c)
+            except self.__errors:
+                # The connection is most likely gone, so don't give it to anyone else
+                self.__pool.discard(c)
+                if attempt >= self.__retries:
+                    raise
+                time.sleep(self.__backoff * (2 ** attempt))
+                continue
+            except Exception:
+                self.__pool.checkin(c)
+                raise
+            self.__pool.checkin(c)
+            return result
+
+    def save(self, name, file_key, essay, result, grade, feedback, error, email, upload_date):
+        """
+        Stores a graded essay
+
+        Parameters
+        ----------
+        name : str
+            The file name of the essay.
+        file_key : str
+            The key the file was stored under, see file_store.FileStore.put().
+        essay : str
+            The text of the essay.
+        result : dict
+            The breakdown of the grade given by grade.Grade.get_report(), stored as JSON. None can be given instead.
+        grade : float
+            The grade given to the essay.
+        feedback : str
+            The feedback given to the essay.
+        error : str
+            The grammar and spelling errors found in the essay.
+        email : str
+            The email address of the user who uploaded the essay.
+        upload_date : str
+            The date and time the essay was uploaded, formatted as '%Y-%m-%d %H:%M:%S'.
+
+        Returns
+        -------
+        int
+            The file_id of the stored essay.
+        """
+        def insert(c):
+            cursor = c.cursor()
+            try:
+                cursor.execute(self.__statement(INSERT_FILE),
+                               (name, file_key, essay, None if result is None else json.dumps(result), grade, feedback,
+                                error, email, upload_date))
+                c.commit()
+                return cursor.lastrowid
+            except Exception:
+                c.rollback()
+                raise
+            finally:
+                cursor.close()
+
+        return self.__run(insert)
+
+    def get_result(self, email, upload_date):
+        """
+        Parameters
+        ----------
+        email : str
+            The email address the essay was uploaded with.
+        upload_date : str
+            The date and time the essay was uploaded, see save().
+
+        Returns
+        -------
+        tuple
+            The name, file key, grade, error, feedback, text and result of the essay, or None if it couldn't be found.
+            The result is the dictionary given to save(), and both it and the text are None for essays stored before
+            they were added to the table.
+        """
+        def select(c):
+            cursor = c.cursor()
+            try:
+                cursor.execute(self.__statement(SELECT_RESULT), (email, upload_date))
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+        result = self.__run(select)
+        if not result:
+            return None
+        row = tuple(result[0])
+        return row[:6] + (None if row[6] is None else json.loads(row[6]),)
+
+    def health_check(self):
+        """
+        Closes every idle connection that has dropped, see ConnectionPool.health_check().
+
+        Returns
+        -------
+        int
+            The number of connections that were closed.
+        """
+        return self.__pool.health_check()
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        self.__pool.close()
+
+
+def connect_mysql(host, user, password, database, size=5, retries=2):
+    """
+    Returns a UserFileStore for a MySQL database, such as the RDS database the website uses
+
+    Parameters
+    ----------
+    host : str
+        The address of the database server.
+    user : str
+        The username to log in with.
+    password : str
+        The password to log in with.
+    database : str
+        The name of the database holding the UserFiles table.
+    size : int
+        The most connections open at once.
+    retries : int
+        The most times a statement is tried again after its connection drops.
+
+    Returns
+    -------
+    UserFileStore
+        The store, no connection is opened until it is first used.
+    """
+    # Imported here so that importing this module doesn't require MySQL
+    import mysql.connector
+
+    def connect():
+        return mysql.connector.connect(host=host, user=user, passwd=password, database=database, connection_timeout=10)
+
+    pool = ConnectionPool(connect, lambda c: c.is_connected(), size)
+    return UserFileStore(pool, (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError),
+                         '%s', retries)
+
+
+def connect_sqlite(filepath, size=5, retries=2):
+    """
+    Returns a UserFileStore for a SQLite database, which is useful for running the website locally and for testing. The
+    UserFiles table is made if it doesn't exist, and any columns an older table is missing are added to it.
+
+    Parameters
+    ----------
+    filepath : str
+        The database file, it is made if it doesn't exist.
+    size : int
+        The most connections open at once.
+    retries : int
+        The most times a statement is tried again after failing, such as when the database is locked.
+
+    Returns
+    -------
+    UserFileStore
+        The store.
+    """
+    # Done once up front, as two connections adding the same column at once would fail
+    c = sqlite3.connect(filepath, timeout=10)
+    try:
+        c.execute(CREATE_TABLE)
+        columns = [row[1] for row in c.execute("PRAGMA table_info(UserFiles)")]
+        for name, kind in ADDED_COLUMNS:
+            if name not in columns:
+                c.execute("ALTER TABLE UserFiles ADD COLUMN " + name + " " + kind)
+        c.execute(CREATE_INDEX)
+        c.commit()
+    finally:
+        c.close()
+
+    def connect():
+        # Each connection is only used by one thread at a time, but not always the thread that opened it
+        return sqlite3.connect(filepath, timeout=10, check_same_thread=False)
+
+    def is_alive(c):
+        c.execute("SELECT 1")
+        return True
+
+    return UserFileStore(ConnectionPool(connect, is_alive, size), (sqlite3.OperationalError,), '?', retries)
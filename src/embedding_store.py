@@ -0,0 +1,249 @@
+import hashlib
+import os
+import threading
+import numpy as np
+
+VOCAB_EXTENSION = '.vocab'
+MATRIX_EXTENSION = '.npy'
+
+# Stores and embedding matrices that have already been loaded by this process, shared between every model
+_stores = {}
+_matrices = {}
+
+
+def get_store_path(text_path):
+    """
+    Returns the filepath prefix of the binary store that belongs to a GloVe text file
+
+    Parameters
+    ----------
+    text_path : str
+        A filepath to a GloVe .txt file, such as glove.6B.300d.txt.
+
+    Returns
+    -------
+    str
+        The same filepath without the .txt extension. The store itself is made of this prefix followed by '.vocab' and
+        '.npy'.
+    """
+    root, extension = os.path.splitext(text_path)
+    if extension == '.txt':
+        return root
+    return text_path
+
+
+def store_exists(store_path):
+    """
+    Parameters
+    ----------
+    store_path : str
+        A filepath prefix given by get_store_path().
+
+    Returns
+    -------
+    bool
+        True if both the vocabulary index and the matrix of the store can be found.
+    """
+    return os.path.exists(store_path + VOCAB_EXTENSION) and os.path.exists(store_path + MATRIX_EXTENSION)
+
+
+def convert(text_path, store_path=None):
+    """
+    Converts a GloVe text file into a binary store. This only needs to be done once, after which load() can be used to
+    get the vectors in a matter of seconds.
+
+    Parameters
+    ----------
+    text_path : str
+        A filepath to a GloVe .txt file, where every line is a word followed by its vector.
+    store_path : str
+        An optional filepath prefix for the store, if not given then get_store_path() will be used.
+
+    Returns
+    -------
+    str
+        The filepath prefix of the newly written store.
+
+    Raises
+    ------
+    FileNotFoundError
+        The given GloVe file doesn't exist.
+    ValueError
+        The GloVe file has lines with differing vector lengths.
+    """
+    if store_path is None:
+        store_path = get_store_path(text_path)
+
+    words = []
+    vectors = []
+    with open(text_path, encoding='utf8') as f:
+        for line in f:
+            word, _, values = line.rstrip().partition(' ')
+            words.append(word)
+            vectors.append(np.asarray(values.split(), dtype='float32'))
+    matrix = np.vstack(vectors)
+
+    # Write to temporary files first so a half written store is never picked up by load(). Each process and thread
+    # uses its own, so conversions of the same file running at once never write over each other's halves.
+    temp = store_path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+    np.save(temp + MATRIX_EXTENSION, matrix)
+    with open(temp + VOCAB_EXTENSION, 'w', encoding='utf8') as f:
+        f.write('\n'.join(words))
+    os.replace(temp + MATRIX_EXTENSION, store_path + MATRIX_EXTENSION)
+    os.replace(temp + VOCAB_EXTENSION, store_path + VOCAB_EXTENSION)
+
+    return store_path
+
+
+def load(store_path):
+    """
+    Memory-maps a binary store, so the matrix pages are only read when used and are shared through the OS page cache
+    between every process that loads the same store.
+
+    Parameters
+    ----------
+    store_path : str
+        A filepath prefix given by convert() or get_store_path().
+
+    Returns
+    -------
+    tuple of dict, numpy.ndarray
+        The vocabulary index, mapping every word to its row, followed by the read-only matrix of vectors.
+
+    Raises
+    ------
+    FileNotFoundError
+        The store hasn't been made yet, see convert().
+    """
+    with open(store_path + VOCAB_EXTENSION, encoding='utf8') as f:
+        vocabulary = {word: i for i, word in enumerate(f.read().split('\n'))}
+    matrix = np.load(store_path + MATRIX_EXTENSION, mmap_mode='r')
+
+    return vocabulary, matrix
+
+
+def gather(vocabulary, matrix, word_index, vocab_size):
+    """
+    Builds an embedding matrix for a tokenizer's vocabulary, where row i holds the vector of the word with index i.
+    Words missing from the store are left as zeros.
+
+    Parameters
+    ----------
+    vocabulary : dict
+        The vocabulary index given by load().
+    matrix : numpy.ndarray
+        The matrix given by load().
+    word_index : dict
+        A tokenizer's word_index, mapping every word to its index.
+    vocab_size : int
+        The number of rows the embedding matrix should have.
+
+    Returns
+    -------
+    numpy.ndarray
+        A float32 matrix with vocab_size rows.
+    """
+    embedding_matrix = np.zeros((vocab_size, matrix.shape[1]), dtype='float32')
+
+    pairs = [(i, vocabulary[word]) for word, i in word_index.items() if word in vocabulary and i < vocab_size]
+    if len(pairs) > 0:
+        indexes, rows = np.array(pairs, dtype='int64').T
+        # Sorting the rows keeps the reads from the memory-map sequential
+        order = np.argsort(rows)
+        embedding_matrix[indexes[order]] = matrix[rows[order]]
+
+    return embedding_matrix
+
+
+def get_fingerprint(word_index, vocab_size):
+    """
+    Returns a fingerprint of a tokenizer's vocabulary, two tokenizers with the same fingerprint produce the same
+    embedding matrix.
+
+    Parameters
+    ----------
+    word_index : dict
+        A tokenizer's word_index, mapping every word to its index.
+    vocab_size : int
+        The number of rows the embedding matrix should have.
+
+    Returns
+    -------
+    str
+        A hex digest of the vocabulary.
+    """
+    digest = hashlib.sha1(str(vocab_size).encode('utf8'))
+    for word, i in sorted(word_index.items(), key=lambda pair: pair[1]):
+        digest.update(('\n' + word + ' ' + str(i)).encode('utf8'))
+    return digest.hexdigest()
+
+
+def get_store(text_path):
+    """
+    Returns the binary store that belongs to a GloVe text file, converting the text file first if it hasn't been done
+    already. The store is only loaded once per process.
+
+    Parameters
+    ----------
+    text_path : str
+        A filepath to a GloVe .txt file, the store will be looked for next to it.
+
+    Returns
+    -------
+    tuple of dict, numpy.ndarray
+        The vocabulary index and the read-only matrix of vectors, see load().
+    """
+    store_path = os.path.abspath(get_store_path(text_path))
+    if store_path not in _stores:
+        if not store_exists(store_path):
+            convert(text_path, store_path)
+        _stores[store_path] = load(store_path)
+    return _stores[store_path]
+
+
+def get_embedding_matrix(text_path, word_index, vocab_size):
+    """
+    Returns an embedding matrix for a tokenizer's vocabulary. Matrices are registered by the GloVe file and the
+    vocabulary's fingerprint, so models with matching vocabularies share one read-only matrix, and every other model
+    gathers its rows from the same shared store.
+
+    Parameters
+    ----------
+    text_path : str
+        A filepath to a GloVe .txt file, the store will be looked for next to it.
+    word_index : dict
+        A tokenizer's word_index, mapping every word to its index.
+    vocab_size : int
+        The number of rows the embedding matrix should have.
+
+    Returns
+    -------
+    numpy.ndarray
+        A read-only float32 matrix with vocab_size rows.
+    """
+    key = (os.path.abspath(get_store_path(text_path)), get_fingerprint(word_index, vocab_size))
+    if key not in _matrices:
+        vocabulary, matrix = get_store(text_path)
+        embedding_matrix = gather(vocabulary, matrix, word_index, vocab_size)
+        embedding_matrix.setflags(write=False)
+        _matrices[key] = embedding_matrix
+    return _matrices[key]
+
+
+def clear():
+    """
+    Forgets every store and embedding matrix loaded so far, so the next call reads them from disk again.
+    """
+    _stores.clear()
+    _matrices.clear()
+
+
+# If you want to run this program specifically, you can put the appropriate
+# code into this main() function.
+def main():
+    convert('../data/glove6B/glove.6B.300d.txt')
+
+
+# This stops all the code from running when Sphinx imports the module.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+import time
+
+CHUNK_SIZE = 1 << 20
+
+
+class FileStore:
+    """
+    The FileStore class keeps uploaded essay files in a directory, named by a hash of their contents, so the same file
+    is only ever stored once and the database only needs to hold its key.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to store the files in, it is made if it doesn't exist.
+    """
+    __slots__ = ('__directory',)
+
+    def __init__(self, directory):
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, key):
+        """
+        Parameters
+        ----------
+        key : str
+            A key given by put().
+
+        Returns
+        -------
+        str
+            The filepath of the stored file, which keeps the extension of the original file.
+        """
+        return os.path.join(self.__directory, key[:2], key)
+
+    def __get_temp(self, path):
+        return path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+
+    def put(self, filepath):
+        """
+        Stores a copy of a file, reading it in chunks so it is never held in memory all at once
+
+        Parameters
+        ----------
+        filepath : str
+            The file to be stored.
+
+        Returns
+        -------
+        str
+            The file's key, which is the hash of its contents followed by its extension, such as 'ab12...ef.docx'.
+
+        Raises
+        ------
+        FileNotFoundError
+            The given filepath doesn't exist.
+        """
+        digest = hashlib.sha256()
+        temp = self.__get_temp(os.path.join(self.__directory, os.path.basename(filepath)))
+        with open(filepath, 'rb') as source, open(temp, 'wb') as target:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                target.write(chunk)
+
+        key = digest.hexdigest() + os.path.splitext(filepath)[1].lower()
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Already stored, so only mark it as used again
+            os.utime(path)
+            os.remove(temp)
+        except FileNotFoundError:
+            # Either it wasn't stored, or it was just removed by remove_older_than()
+            os.replace(temp, path)
+        return key
+
+    def exists(self, key):
+        """
+        Parameters
+        ----------
+        key : str
+            The key given by put().
+
+        Returns
+        -------
+        bool
+            True if the file is stored.
+        """
+        return os.path.exists(self.get_path(key))
+
+    def remove_older_than(self, seconds):
+        """
+        Removes every file that hasn't been stored again in the given number of seconds
+
+        Parameters
+        ----------
+        seconds : float
+            How long a file is kept after it was last stored.
+
+        Returns
+        -------
+        int
+            The number of files removed.
+        """
+        removed = 0
+        oldest = time.time() - seconds
+        for root, directories, files in os.walk(self.__directory):
+            for f in files:
+                path = os.path.join(root, f)
+                if f.endswith('.tmp') or os.path.getmtime(path) >= oldest:
+                    continue
+                os.remove(path)
+                removed += 1
+        return removed
@@ -1,9 +1,16 @@
+import cache
+import threading
 import zipfile
 import xml.etree.ElementTree
 import json
 
 WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
 WORD_PROPERTIES = '{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}'
+MARKUP_NAMESPACE = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+# Changed whenever Format.get_facts() gives different facts, so facts cached by grade.Grade are read again
+FACTS_VERSION = 3
+# Changed whenever Format.get_text() gives different text, so essays cached by grade.Grade are read again
+TEXT_VERSION = 2
 
 
 def get_style():
@@ -105,6 +112,163 @@ def update_format_file(filepath, style):
     return True
 
 
+def iter_blocks(document):
+    """
+    Reads an opened word/document.xml one piece at a time, yielding each paragraph, table row and section properties
+    directly in the body as soon as it ends. Each piece is thrown away once the next one is asked for, so even a very
+    long document is never held in memory all at once.
+
+    Parameters
+    ----------
+    document : file
+        The opened word/document.xml.
+
+    Returns
+    -------
+    generator of xml.etree.ElementTree.Element
+        Every paragraph, table, table row and section properties directly in the body. A table is yielded once its
+        rows have already been yielded and removed from it.
+    """
+    # The table rows directly in the body are read on their own, so even a very long table isn't kept whole
+    BODY, TBL, TR = WORD_NAMESPACE + 'body', WORD_NAMESPACE + 'tbl', WORD_NAMESPACE + 'tr'
+    body, block = None, None
+    depth = 0
+    for event, element in xml.etree.ElementTree.iterparse(document, ('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and element.tag == BODY:
+                body = element
+            elif depth == 3:
+                block = element
+            continue
+
+        depth -= 1
+        if body is None or not (depth == 2 or (depth == 3 and block.tag == TBL and element.tag == TR)):
+            continue
+        yield element
+        # Everything in it has been read, so it can be thrown away
+        if depth == 2:
+            body.remove(element)
+        else:
+            block.remove(element)
+
+
+def get_run_text(r):
+    """
+    Returns the text of a run, with its tabs and line breaks
+
+    Parameters
+    ----------
+    r : xml.etree.ElementTree.Element
+        A w:r element.
+
+    Returns
+    -------
+    str
+        The run's text.
+    """
+    text = []
+    for child in r:
+        if child.tag == WORD_NAMESPACE + 't':
+            if child.text is not None:
+                text.append(child.text)
+        elif child.tag == WORD_NAMESPACE + 'tab':
+            text.append('\t')
+        elif child.tag == WORD_NAMESPACE + 'br' or child.tag == WORD_NAMESPACE + 'cr':
+            text.append('\n')
+    return ''.join(text)
+
+
+def get_paragraph_runs(block, fallback=False):
+    """
+    Returns every paragraph in a piece of a document, such as one given by iter_blocks(), along with its runs
+
+    Parameters
+    ----------
+    block : xml.etree.ElementTree.Element
+        A paragraph, table or table row.
+    fallback : bool
+        If True, the paragraphs of the copy of a text box kept for older versions of Word are given as well, with None
+        in place of their runs.
+
+    Returns
+    -------
+    list of tuple
+        A (paragraph, list of runs) pair for every paragraph in the order they begin. A paragraph inside of another
+        one, such as in a text box, is given on its own and its runs are left out of the paragraph holding it. The copy
+        of a text box kept for older versions of Word is left out entirely unless fallback is True.
+    """
+    P, R = WORD_NAMESPACE + 'p', WORD_NAMESPACE + 'r'
+    skipped = set()
+    for element in block.iter(MARKUP_NAMESPACE + 'Fallback'):
+        skipped.update([id(e) for e in element.iter()])
+
+    paragraphs = []
+    for p in block.iter(P):
+        if id(p) in skipped:
+            if fallback:
+                paragraphs.append((p, None))
+            continue
+        runs = list(p.iter(R))
+        nested = list(p.iter(P))
+        if len(nested) > 1 or len(skipped) > 0:
+            # Leave out the runs that belong to a nested paragraph, or to a copy that is skipped
+            inner = set(skipped)
+            for q in nested[1:]:
+                inner.update([id(r) for r in q.iter(R)])
+            runs = [r for r in runs if id(r) not in inner]
+        paragraphs.append((p, runs))
+    return paragraphs
+
+
+def get_paragraph_texts(block):
+    """
+    Returns the text of every paragraph in a piece of a document, such as one given by iter_blocks()
+
+    Parameters
+    ----------
+    block : xml.etree.ElementTree.Element
+        A paragraph, table or table row.
+
+    Returns
+    -------
+    list of str
+        The text of every paragraph given by get_paragraph_runs().
+    """
+    return [''.join([get_run_text(r) for r in runs]) for p, runs in get_paragraph_runs(block)]
+
+
+def iter_paragraphs(filepath):
+    """
+    Yields the text of every paragraph in a docx as soon as it has been read, so work on the text, such as checking its
+    grammar, can begin before the whole document has been read
+
+    Parameters
+    ----------
+    filepath : str
+        The filepath of the docx.
+
+    Returns
+    -------
+    generator of str
+        The text of every paragraph, see get_paragraph_texts(). Joining them with new lines gives Format.get_text().
+
+    Raises
+    ------
+    FileNotFoundError
+        The given filepath doesn't exist.
+    BadZipFile
+        The given file cannot be unzipped.
+    KeyError
+        The file has no document in it.
+    """
+    with zipfile.ZipFile(filepath) as file_tree:
+        with file_tree.open('word/document.xml') as document:
+            for block in iter_blocks(document):
+                if block.tag != WORD_NAMESPACE + 'sectPr':
+                    yield from get_paragraph_texts(block)
+
+
 class Format:
     """
     The Format class handles all of the .doc and .docx XML decompiling to generate a dictionary of the document's
@@ -127,48 +291,56 @@ class Format:
     KeyError
         The file cannot be read correctly, most likey due to being broken.
     """
-    __slots__ = ('__document', '__font', '__word_count', '__page_count', '__default_style')
+    __slots__ = ('__font_table', '__fonts', '__spacing', '__indent', '__margin', '__paragraph_number',
+                 '__font_locations', '__spacing_locations', '__paragraphs', '__word_count', '__page_count',
+                 '__default_style')
 
     def __init__(self, filepath):
-        # Opening up the needed xml documents
-        file_tree = zipfile.ZipFile(filepath)
-        self.__document = xml.etree.ElementTree.XML(file_tree.read('word/document.xml'))
-        self.__font = xml.etree.ElementTree.XML(file_tree.read('word/fontTable.xml'))
-        general = xml.etree.ElementTree.XML(file_tree.read('docProps/app.xml'))
-        style = xml.etree.ElementTree.XML(file_tree.read('word/styles.xml'))
-
-        # Saving these values for later so we don't need to keep general
-        self.__word_count = int(general.find(WORD_PROPERTIES + 'Words').text)
-        self.__page_count = int(general.find(WORD_PROPERTIES + 'Pages').text)
-
-        # Need to get the default style now
-        rPr = style.find(WORD_NAMESPACE + 'docDefaults').find(WORD_NAMESPACE + 'rPrDefault') \
-            .find(WORD_NAMESPACE + 'rPr')
-        pPr = style.find(WORD_NAMESPACE + 'docDefaults').find(WORD_NAMESPACE + 'pPrDefault') \
-            .find(WORD_NAMESPACE + 'pPr')
-        secPr = self.__document.find(WORD_NAMESPACE + 'body').find(WORD_NAMESPACE + 'sectPr')
-
-        font = ''
-        size = '24'
-        line = '240'
-        after = '160'
-        before = '0'
-        if rPr is not None:
-            rFonts = rPr.find(WORD_NAMESPACE + 'rFonts')
-            if WORD_NAMESPACE + 'ascii' in rFonts.keys():
-                font = rFonts.attrib[WORD_NAMESPACE + 'ascii']
-            else:
-                if WORD_NAMESPACE + 'asciiTheme' in rFonts.keys():
-                    font = rFonts.attrib[WORD_NAMESPACE + 'asciiTheme']
-            if WORD_NAMESPACE + 'val' in rPr.keys():
-                size = rPr.find(WORD_NAMESPACE + 'sz').attrib[WORD_NAMESPACE + 'val']
-        if pPr is not None:
-            if WORD_NAMESPACE + 'line' in pPr.keys():
-                line = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'line']
-            if WORD_NAMESPACE + 'after' in pPr.keys():
-                after = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'after']
-            if WORD_NAMESPACE + 'before' in pPr.keys():
-                before = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'before']
+        # Opening up the needed xml documents, the document itself is read later on as it can be very large
+        with zipfile.ZipFile(filepath) as file_tree:
+            font = xml.etree.ElementTree.XML(file_tree.read('word/fontTable.xml'))
+            general = xml.etree.ElementTree.XML(file_tree.read('docProps/app.xml'))
+            style = xml.etree.ElementTree.XML(file_tree.read('word/styles.xml'))
+
+            self.__font_table = [f.attrib[WORD_NAMESPACE + 'name'] for f in font.iter(WORD_NAMESPACE + 'font')]
+
+            # Saving these values for later so we don't need to keep general
+            self.__word_count = int(general.find(WORD_PROPERTIES + 'Words').text)
+            self.__page_count = int(general.find(WORD_PROPERTIES + 'Pages').text)
+
+            # Need to get the default style now
+            rPr = style.find(WORD_NAMESPACE + 'docDefaults').find(WORD_NAMESPACE + 'rPrDefault') \
+                .find(WORD_NAMESPACE + 'rPr')
+            pPr = style.find(WORD_NAMESPACE + 'docDefaults').find(WORD_NAMESPACE + 'pPrDefault') \
+                .find(WORD_NAMESPACE + 'pPr')
+
+            font = ''
+            size = '24'
+            line = '240'
+            after = '160'
+            before = '0'
+            if rPr is not None:
+                rFonts = rPr.find(WORD_NAMESPACE + 'rFonts')
+                if WORD_NAMESPACE + 'ascii' in rFonts.keys():
+                    font = rFonts.attrib[WORD_NAMESPACE + 'ascii']
+                else:
+                    if WORD_NAMESPACE + 'asciiTheme' in rFonts.keys():
+                        font = rFonts.attrib[WORD_NAMESPACE + 'asciiTheme']
+                if WORD_NAMESPACE + 'val' in rPr.keys():
+                    size = rPr.find(WORD_NAMESPACE + 'sz').attrib[WORD_NAMESPACE + 'val']
+            if pPr is not None:
+                if WORD_NAMESPACE + 'line' in pPr.keys():
+                    line = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'line']
+                if WORD_NAMESPACE + 'after' in pPr.keys():
+                    after = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'after']
+                if WORD_NAMESPACE + 'before' in pPr.keys():
+                    before = pPr.find(WORD_NAMESPACE + 'spacing').attrib[WORD_NAMESPACE + 'before']
+
+            self.__default_style = {'font': font, 'size': int(size) / 2, 'line_spacing': int(line) / 240,
+                                    'after_spacing': int(after) / 20, 'before_spacing': int(before) / 20}
+
+            with file_tree.open('word/document.xml') as document:
+                secPr = self.__read_document(document)
 
         pgSzW = secPr.find(WORD_NAMESPACE + 'pgSz').attrib[WORD_NAMESPACE + 'w']
         pgSzH = secPr.find(WORD_NAMESPACE + 'pgSz').attrib[WORD_NAMESPACE + 'h']
@@ -181,13 +353,150 @@ class Format:
         gutter = secPr.find(WORD_NAMESPACE + 'pgMar').attrib[WORD_NAMESPACE + 'gutter']
 
         # Saving all these values as an easy to access dictionary
-        self.__default_style = {'font': font, 'size': int(size) / 2, 'line_spacing': int(line) / 240,
-                                'after_spacing': int(after) / 20, 'before_spacing': int(before) / 20,
-                                'page_width': int(pgSzW) / 1440, 'page_height': int(pgSzH) / 1440,
-                                'left_margin': int(pgMarLeft) / 1440, 'bottom_margin': int(pgMarBottom) / 1440,
-                                'right_margin': int(pgMarRight) / 1440, 'top_margin': int(pgMarTop) / 1440,
-                                'header': int(header) / 1440, 'footer': int(footer) / 1440,
-                                'gutter': int(gutter) / 1440}
+        self.__default_style.update({'page_width': int(pgSzW) / 1440, 'page_height': int(pgSzH) / 1440,
+                                     'left_margin': int(pgMarLeft) / 1440, 'bottom_margin': int(pgMarBottom) / 1440,
+                                     'right_margin': int(pgMarRight) / 1440, 'top_margin': int(pgMarTop) / 1440,
+                                     'header': int(header) / 1440, 'footer': int(footer) / 1440,
+                                     'gutter': int(gutter) / 1440})
+
+    def __read_document(self, document):
+        """
+        Reads the fonts, spacing, indentation, margins and text of every paragraph in a single pass over the document,
+        see iter_blocks().
+
+        Parameters
+        ----------
+        document : file
+            The opened word/document.xml.
+
+        Returns
+        -------
+        xml.etree.ElementTree.Element
+            The body's section properties, which hold the page size and margins.
+
+        Raises
+        ------
+        KeyError
+            The document has no body or section properties.
+        """
+        # Each font and spacing used, along with the number of characters using it and the paragraphs it is used in
+        self.__fonts = {}
+        self.__spacing = {}
+        self.__font_locations = {}
+        self.__spacing_locations = {}
+        self.__indent = 0
+        self.__margin = 0
+        self.__paragraph_number = 0
+        self.__paragraphs = []
+        secPr = None
+
+        for block in iter_blocks(document):
+            if block.tag == WORD_NAMESPACE + 'sectPr':
+                if secPr is None:
+                    secPr = block
+                continue
+
+            for p, runs in get_paragraph_runs(block, True):
+                spacing = self.__read_paragraph(p)
+                if runs is None:
+                    # The copy of a text box for older versions of Word isn't part of the text, but its paragraphs still
+                    # count towards the indent and margin, and its fonts and spacing are still listed
+                    for r in p.iter(WORD_NAMESPACE + 'r'):
+                        self.__fonts.setdefault(self.__read_run(r)[0], 0)
+                    self.__spacing.setdefault(spacing, 0)
+                    continue
+
+                # Paragraphs are numbered in the same order as get_paragraphs()
+                location = len(self.__paragraphs)
+                text = []
+                for r in runs:
+                    f, t = self.__read_run(r)
+                    self.__fonts[f] = self.__fonts.get(f, 0) + len(t)
+                    self.__add_location(self.__font_locations, f, location)
+                    text.append(t)
+                self.__paragraphs.append(''.join(text))
+                self.__spacing[spacing] = self.__spacing.get(spacing, 0) + len(self.__paragraphs[-1])
+                self.__add_location(self.__spacing_locations, spacing, location)
+
+        if secPr is None:
+            raise KeyError('sectPr')
+        return secPr
+
+    def __add_location(self, locations, key, location):
+        """
+        Adds a paragraph to the list of paragraphs using key, unless it was the last one added
+        """
+        used = locations.setdefault(key, [])
+        if len(used) == 0 or used[-1] != location:
+            used.append(location)
+
+    def __read_run(self, r):
+        """
+        Returns the (font, size) pair and the text of a run, using the default style for anything it doesn't set
+        """
+        f = self.__default_style['font']
+        s = 2 * self.__default_style['size']
+
+        rPr = r.find(WORD_NAMESPACE + 'rPr')
+        # Attempt to grab the font and size, otherwise assume default is used
+        if rPr is not None:
+            rFonts = rPr.find(WORD_NAMESPACE + 'rFonts')
+            if rFonts is not None:
+                if WORD_NAMESPACE + 'ascii' in rFonts.keys():
+                    f = rFonts.attrib[WORD_NAMESPACE + 'ascii']
+                else:
+                    if WORD_NAMESPACE + 'asciiTheme' in rFonts.keys():
+                        f = rFonts.attrib[WORD_NAMESPACE + 'asciiTheme']
+            sz = rPr.find(WORD_NAMESPACE + 'sz')
+            if sz is not None:
+                s = sz.attrib[WORD_NAMESPACE + 'val']
+
+        # Note that for whatever reason, font sizes are stored twice the actual pt size
+        return (f, int(s) / 2), get_run_text(r)
+
+    def __read_paragraph(self, p):
+        """
+        Adds a paragraph's indentation and margins to the document's totals, and returns its spacing as a (line, after,
+        before) tuple, using the default style for anything it doesn't set
+        """
+        self.__paragraph_number += 1
+        dl = 240 * self.__default_style['line_spacing']
+        da = 20 * self.__default_style['after_spacing']
+        db = 20 * self.__default_style['before_spacing']
+        pPr = p.find(WORD_NAMESPACE + 'pPr')
+
+        # If any part is missing, assume default is used
+        if pPr is not None:
+            spacing = pPr.find(WORD_NAMESPACE + 'spacing')
+            if spacing is not None:
+                if WORD_NAMESPACE + 'line' in spacing.keys():
+                    dl = spacing.attrib[WORD_NAMESPACE + 'line']
+                if WORD_NAMESPACE + 'after' in spacing.keys():
+                    da = spacing.attrib[WORD_NAMESPACE + 'after']
+                if WORD_NAMESPACE + 'before' in spacing.keys():
+                    db = spacing.attrib[WORD_NAMESPACE + 'before']
+
+            ind = pPr.find(WORD_NAMESPACE + 'ind')
+            if ind is not None:
+                if WORD_NAMESPACE + 'firstLine' in ind.keys():
+                    # 720 is equal to half an inch, the correct standard indent length
+                    if int(ind.attrib[WORD_NAMESPACE + 'firstLine']) == 720:
+                        self.__indent += 1
+                    else:
+                        if int(ind.attrib[WORD_NAMESPACE + 'firstLine']) != 0:
+                            self.__indent += 0.5
+                # Assume default margins unless otherwise stated
+                if WORD_NAMESPACE + 'left' in ind.keys():
+                    if int(ind.attrib[WORD_NAMESPACE + 'left']) != 0:
+                        self.__margin += 1
+                if WORD_NAMESPACE + 'right' in ind.keys():
+                    if int(ind.attrib[WORD_NAMESPACE + 'right']) != 0:
+                        self.__margin += 1
+                if WORD_NAMESPACE + 'hanging' in ind.keys():
+                    if int(ind.attrib[WORD_NAMESPACE + 'hanging']) != 0:
+                        self.__margin += 1
+
+        return int(dl) / 240, int(da) / 20, int(db) / 20
 
     def get_font_table(self):
         """
@@ -199,12 +508,7 @@ class Format:
         list of str
             A list of fonts.
         """
-        a = []
-
-        for f in self.__font.iter(WORD_NAMESPACE + 'font'):
-            a.append(f.attrib[WORD_NAMESPACE + 'name'])
-
-        return a
+        return list(self.__font_table)
 
     def get_font(self):
         """
@@ -213,38 +517,32 @@ class Format:
         Returns
         -------
         list of tuples
-            A list of pairs, where each pair is a pair of the font name and the associated size used, followed by the
-            number of times the set of fonts and sizes is used.
-        """
-        fonts = []
-
-        paragraphs = self.__document.find(WORD_NAMESPACE + 'body')
-
-        # Checking every paragraph
-        for p in paragraphs.iter(WORD_NAMESPACE + 'p'):
-            # Checking every sentence break-up
-            for r in p.iter(WORD_NAMESPACE + 'r'):
-                f = self.__default_style['font']
-                s = 2 * self.__default_style['size']
-
-                rPr = r.find(WORD_NAMESPACE + 'rPr')
-                # Attempt to grab the font and size, otherwise assume default is used
-                if rPr is not None:
-                    rFonts = rPr.find(WORD_NAMESPACE + 'rFonts')
-                    if rFonts is not None:
-                        if WORD_NAMESPACE + 'ascii' in rFonts.keys():
-                            f = rFonts.attrib[WORD_NAMESPACE + 'ascii']
-                        else:
-                            if WORD_NAMESPACE + 'asciiTheme' in rFonts.keys():
-                                f = rFonts.attrib[WORD_NAMESPACE + 'asciiTheme']
-                    sz = rPr.find(WORD_NAMESPACE + 'sz')
-                    if sz is not None:
-                        s = sz.attrib[WORD_NAMESPACE + 'val']
-                # Note that for whatever reason, font sizes are stored twice the actual pt size
-                if (f, int(s) / 2) not in fonts:
-                    fonts.append((f, int(s) / 2))
-
-        return fonts
+            A list of pairs, where each pair is a pair of the font name and the associated size used, in the order
+            they are first used.
+        """
+        return list(self.__fonts.keys())
+
+    def get_font_usage(self):
+        """
+        Returns how much of the document's text uses each font and size
+
+        Returns
+        -------
+        dict
+            The number of characters using each (font, size) pair given by get_font().
+        """
+        return dict(self.__fonts)
+
+    def get_font_locations(self):
+        """
+        Returns where in the document each font and size is used
+
+        Returns
+        -------
+        dict
+            The index of every paragraph in get_paragraphs() using each (font, size) pair given by get_font().
+        """
+        return {f: list(self.__font_locations[f]) for f in self.__font_locations.keys()}
 
     def get_spacing(self):
         """
@@ -256,32 +554,29 @@ class Format:
             A list of the three floats, the first being the line spacing, followed by the after paragraph and before
             paragraph spacings.
         """
-        spacing_list = []
+        return list(self.__spacing.keys())
 
-        paragraphs = self.__document.find(WORD_NAMESPACE + 'body')
-
-        # Check every paragraph
-        for p in paragraphs.iter(WORD_NAMESPACE + 'p'):
-            dl = 240 * self.__default_style['line_spacing']
-            da = 20 * self.__default_style['after_spacing']
-            db = 20 * self.__default_style['before_spacing']
-            pPr = p.find(WORD_NAMESPACE + 'pPr')
+    def get_spacing_usage(self):
+        """
+        Returns how much of the document's text uses each spacing
 
-            # If any part is missing, assume default is used
-            if pPr is not None:
-                spacing = pPr.find(WORD_NAMESPACE + 'spacing')
-                if spacing is not None:
-                    if WORD_NAMESPACE + 'line' in spacing.keys():
-                        dl = spacing.attrib[WORD_NAMESPACE + 'line']
-                    if WORD_NAMESPACE + 'after' in spacing.keys():
-                        da = spacing.attrib[WORD_NAMESPACE + 'after']
-                    if WORD_NAMESPACE + 'before' in spacing.keys():
-                        db = spacing.attrib[WORD_NAMESPACE + 'before']
+        Returns
+        -------
+        dict
+            The number of characters in the paragraphs using each spacing given by get_spacing().
+        """
+        return dict(self.__spacing)
 
-            if (int(dl) / 240, int(da) / 20, int(db) / 20) not in spacing_list:
-                spacing_list.append((int(dl) / 240, int(da) / 20, int(db) / 20))
+    def get_spacing_locations(self):
+        """
+        Returns where in the document each spacing is used
 
-        return spacing_list
+        Returns
+        -------
+        dict
+            The index of every paragraph in get_paragraphs() using each spacing given by get_spacing().
+        """
+        return {s: list(self.__spacing_locations[s]) for s in self.__spacing_locations.keys()}
 
     def get_indentation(self):
         """
@@ -294,27 +589,7 @@ class Format:
             A float, where 0 is no indents, 1 is all indented, and getting close to 0.5 means either inconsistent
             indentation or non-standard indentation, either way bad.
         """
-        indent = 0
-        paragraph_number = 0
-
-        paragraphs = self.__document.find(WORD_NAMESPACE + 'body')
-
-        # Check every paragraph
-        for p in paragraphs.iter(WORD_NAMESPACE + 'p'):
-            paragraph_number += 1
-            pPr = p.find(WORD_NAMESPACE + 'pPr')
-            if pPr is not None:
-                ind = pPr.find(WORD_NAMESPACE + 'ind')
-                if ind is not None:
-                    if WORD_NAMESPACE + 'firstLine' in ind.keys():
-                        # 720 is equal to half an inch, the correct standard indent length
-                        if int(ind.attrib[WORD_NAMESPACE + 'firstLine']) == 720:
-                            indent += 1
-                        else:
-                            if int(ind.attrib[WORD_NAMESPACE + 'firstLine']) != 0:
-                                indent += 0.5
-
-        return indent / paragraph_number
+        return self.__indent / self.__paragraph_number
 
     def get_margin(self):
         """
@@ -326,52 +601,49 @@ class Format:
         float
             A float between 0.0 and 2.0 describing the margins consistency.
         """
-        margin = 0
-        paragraph_number = 0
-
-        paragraphs = self.__document.find(WORD_NAMESPACE + 'body')
-
-        # Check every paragraph
-        for p in paragraphs.iter(WORD_NAMESPACE + 'p'):
-            paragraph_number += 1
-            pPr = p.find(WORD_NAMESPACE + 'pPr')
-
-            # Assume default unless otherwise stated
-            if pPr is not None:
-                ind = pPr.find(WORD_NAMESPACE + 'ind')
-                if ind is not None:
-                    if WORD_NAMESPACE + 'left' in ind.keys():
-                        if int(ind.attrib[WORD_NAMESPACE + 'left']) != 0:
-                            margin += 1
-                    if WORD_NAMESPACE + 'right' in ind.keys():
-                        if int(ind.attrib[WORD_NAMESPACE + 'right']) != 0:
-                            margin += 1
-                    if WORD_NAMESPACE + 'hanging' in ind.keys():
-                        if int(ind.attrib[WORD_NAMESPACE + 'hanging']) != 0:
-                            margin += 1
-
-        return margin / paragraph_number
+        return self.__margin / self.__paragraph_number
 
     def get_text(self):
         """
         Returns
         -------
         str
-            A string containing the all of the document's text.
+            A string containing the all of the document's text, with each paragraph on its own line.
+        """
+        return '\n'.join(self.__paragraphs)
+
+    def get_paragraphs(self):
+        """
+        Returns
+        -------
+        list of str
+            The text of every paragraph in the document, see get_paragraph_texts().
         """
-        text = ""
-        paragraphs = self.__document.find(WORD_NAMESPACE + 'body')
+        return list(self.__paragraphs)
 
-        # Checking every paragraph
-        for p in paragraphs.iter(WORD_NAMESPACE + 'p'):
-            # Checking every sentence break-up
-            for r in p.iter(WORD_NAMESPACE + 'r'):
-                t = r.find(WORD_NAMESPACE + 't')
-                # Attempt to get any text
-                if t is not None:
-                    text += t.text
+    def get_facts(self):
+        """
+        Returns every fact about the document's format that is used when grading it
 
-        return text
+        Returns
+        -------
+        dict
+            'font' is the list given by get_font().
+            'font_usage' is the dictionary given by get_font_usage().
+            'font_locations' is the dictionary given by get_font_locations().
+            'spacing' is the list given by get_spacing().
+            'spacing_usage' is the dictionary given by get_spacing_usage().
+            'spacing_locations' is the dictionary given by get_spacing_locations().
+            'indent' is the float given by get_indentation().
+            'margin' is the float given by get_margin().
+            'default_style' is the dictionary given by get_default_style().
+            'font_table' is the list given by get_font_table().
+        """
+        return {'font': self.get_font(), 'font_usage': self.get_font_usage(),
+                'font_locations': self.get_font_locations(), 'spacing': self.get_spacing(),
+                'spacing_usage': self.get_spacing_usage(), 'spacing_locations': self.get_spacing_locations(),
+                'indent': self.get_indentation(), 'margin': self.get_margin(),
+                'default_style': self.get_default_style(), 'font_table': self.get_font_table()}
 
     def get_word_count(self):
         """
@@ -399,3 +671,74 @@ class Format:
             The default style used by the document.
         """
         return self.__default_style
+
+
+class FormatCache:
+    """
+    The FormatCache class keeps the Format of recently read docx files, keyed by a hash of their contents, so each file
+    is only unzipped and parsed once no matter how many times or under what name it is read. If the same file is asked
+    for by more than one thread at once, only one of them reads it while the rest wait for its Format.
+
+    Parameters
+    ----------
+    maxsize : int
+        The most Formats kept at once.
+    """
+    __slots__ = ('__documents', '__reading', '__lock')
+
+    def __init__(self, maxsize=32):
+        self.__documents = cache.LRUCache(maxsize)
+        # A lock for every file being read, keyed the same as __documents
+        self.__reading = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__documents)
+
+    def get(self, filepath, key=None):
+        """
+        Returns the Format of a docx, reading it only if it isn't already kept
+
+        Parameters
+        ----------
+        filepath : str
+            The docx to be read.
+        key : str
+            The hash of the file's contents if it is already known, such as the start of a file_store.FileStore key,
+            otherwise it is found with cache.get_file_key().
+
+        Returns
+        -------
+        Format
+            The Format of the file, which is shared, so it must not be changed.
+
+        Raises
+        ------
+        FileNotFoundError
+            The given filepath doesn't exist.
+        """
+        if key is None:
+            key = cache.get_file_key(filepath)
+        word = self.__documents.get(key)
+        if word is not None:
+            return word
+
+        with self.__lock:
+            reading = self.__reading.setdefault(key, threading.Lock())
+        try:
+            with reading:
+                # Another thread may have read it while this one waited
+                word = self.__documents.get(key)
+                if word is None:
+                    word = Format(filepath)
+                    self.__documents.put(key, word)
+        finally:
+            with self.__lock:
+                self.__reading.pop(key, None)
+        return word
+
+    def clear(self):
+        """
+        Removes every kept Format.
+        """
+        self.__documents.clear()
@@ -0,0 +1,307 @@
+import feedback
+
+
+def get_share(usage, wrong):
+    """
+    Returns the share of a document's text that uses something it shouldn't
+
+    Parameters
+    ----------
+    usage : dict
+        The number of characters using each font or spacing, such as given by format.Format.get_font_usage().
+    wrong : function
+        Given a key of usage, returns True if it breaks the style.
+
+    Returns
+    -------
+    float
+        A float between 0 and 1, which is 0 for a document without any text.
+    """
+    total = sum(usage.values())
+    if total == 0:
+        return 0
+    return sum([usage[v] for v in usage.keys() if wrong(v)]) / total
+
+
+class Rule:
+    """
+    The Rule class is a single format check, which is run on the facts given by format.Format.get_facts() whenever every
+    style key it needs is set.
+
+    Parameters
+    ----------
+    name : str
+        The name of the rule, which must be unique among the rules it is evaluated with.
+    keys : tuple of str
+        The style keys the rule needs, the rule is skipped if any of them are missing or None.
+    measure : function
+        Given (facts, style, weight, proportional), returns a (points, count, locations) tuple. Points is the number of
+        points lost, count is the number of mistakes found, and locations is a list of paragraph indexes, as given by
+        format.Format.get_paragraphs(), or None if the mistake isn't tied to any paragraph.
+    message : str
+        The feedback given when the rule finds a mistake, the rules in RULES are written by feedback.format_feedback()
+        instead.
+    """
+    __slots__ = ('__name', '__keys', '__measure', '__message')
+
+    def __init__(self, name, keys, measure, message=None):
+        self.__name = name
+        self.__keys = tuple(keys)
+        self.__measure = measure
+        self.__message = message
+
+    def get_name(self):
+        """
+        Returns
+        -------
+        str
+            The name of the rule.
+        """
+        return self.__name
+
+    def get_keys(self):
+        """
+        Returns
+        -------
+        tuple of str
+            The style keys the rule needs.
+        """
+        return self.__keys
+
+    def get_message(self):
+        """
+        Returns
+        -------
+        str
+            The feedback given when the rule finds a mistake, or None if it has none.
+        """
+        return self.__message
+
+    def applies(self, style):
+        """
+        Parameters
+        ----------
+        style : dict
+            A style dictionary, see format.get_style().
+
+        Returns
+        -------
+        bool
+            True if every key the rule needs is set in the style.
+        """
+        return all([style.get(k) is not None for k in self.__keys])
+
+    def measure(self, facts, style, weight, proportional=False):
+        """
+        Parameters
+        ----------
+        facts : dict
+            The dictionary given by format.Format.get_facts().
+        style : dict
+            A style dictionary, see format.get_style().
+        weight : float
+            The number of points lost for each mistake.
+        proportional : bool
+            If True, font and spacing mistakes lose points by the share of the text they cover.
+
+        Returns
+        -------
+        tuple of float, int, list
+            A (points, count, locations) tuple, see Rule.
+        """
+        return self.__measure(facts, style, weight, proportional)
+
+
+def variant_rule(name, used, usage, locations, wrong):
+    """
+    Returns a Rule checking every different font or spacing used in a document, losing weight points for each one that
+    breaks the style, or weight times the share of the text using them if proportional
+
+    Parameters
+    ----------
+    name : str
+        The name of the rule, which is also the style key it checks.
+    used : str
+        The facts key listing every variant used, 'font' or 'spacing'.
+    usage : str
+        The facts key counting the characters using each variant, 'font_usage' or 'spacing_usage'.
+    locations : str
+        The facts key listing the paragraphs using each variant, 'font_locations' or 'spacing_locations'.
+    wrong : function
+        Given (variant, style), returns True if the variant breaks the style.
+
+    Returns
+    -------
+    Rule
+        The rule.
+    """
+    def measure(facts, style, weight, proportional):
+        mistakes = [v for v in facts[used] if wrong(v, style)]
+        found = sorted(set([i for v in mistakes for i in facts[locations].get(v, [])]))
+        if proportional:
+            return round(weight * get_share(facts[usage], lambda v: wrong(v, style)), 2), len(mistakes), found
+        return weight * len(mistakes), len(mistakes), found
+
+    return Rule(name, (name,), measure)
+
+
+def page_rule(name):
+    """
+    Returns a Rule losing weight points if the document's default style doesn't match the style key of the same name
+
+    Parameters
+    ----------
+    name : str
+        The name of the rule, which is also the style and default style key it checks.
+
+    Returns
+    -------
+    Rule
+        The rule.
+    """
+    def measure(facts, style, weight, proportional):
+        if facts['default_style'][name] != style[name]:
+            return weight, 1, None
+        return 0, 0, None
+
+    return Rule(name, (name,), measure)
+
+
+def measure_indent(facts, style, weight, proportional):
+    """
+    Loses points by how far the share of indented paragraphs is from the style, see format.Format.get_indentation()
+    """
+    indent = facts['indent']
+    if style['indent'] < 0.5:
+        points = min(weight * (indent - style['indent']) * 2, weight)
+    else:
+        points = max(min(weight * (style['indent'] - indent) * 2, weight), 0)
+    return points, 1 if style['indent'] != indent else 0, None
+
+
+def measure_margin(facts, style, weight, proportional):
+    """
+    Loses points by how far paragraph margins stray from the default margin, see format.Format.get_margin()
+    """
+    margin = facts['margin']
+    return min(weight * margin, weight), 1 if margin != 0 else 0, None
+
+
+# In the order feedback.format_feedback() expects them
+RULES = [variant_rule('font', 'font', 'font_usage', 'font_locations', lambda f, style: f[0] not in style['font']),
+         variant_rule('size', 'font', 'font_usage', 'font_locations', lambda f, style: f[1] != style['size']),
+         variant_rule('line_spacing', 'spacing', 'spacing_usage', 'spacing_locations',
+                      lambda s, style: s[0] != style['line_spacing']),
+         variant_rule('after_spacing', 'spacing', 'spacing_usage', 'spacing_locations',
+                      lambda s, style: s[1] != style['after_spacing']),
+         variant_rule('before_spacing', 'spacing', 'spacing_usage', 'spacing_locations',
+                      lambda s, style: s[2] != style['before_spacing']),
+         page_rule('page_width'), page_rule('page_height'), page_rule('left_margin'), page_rule('bottom_margin'),
+         page_rule('right_margin'), page_rule('top_margin'), page_rule('header'), page_rule('footer'),
+         page_rule('gutter'),
+         Rule('indent', ('indent',), measure_indent),
+         Rule('margin', ('left_margin', 'right_margin'), measure_margin)]
+
+
+def evaluate(facts, style, weight, proportional=False, rules=None):
+    """
+    Checks a document's format against a style
+
+    Parameters
+    ----------
+    facts : dict
+        The dictionary given by format.Format.get_facts().
+    style : dict
+        A style dictionary, see format.get_style(). Any rule needing a key that is missing or None is skipped.
+    weight : float
+        The number of points lost for each mistake, see grade.get_weights().
+    proportional : bool
+        If True, font and spacing mistakes lose points by the share of the text they cover.
+    rules : list of Rule
+        The rules to check, RULES if not given. New rules can be added with RULES + [Rule(...)].
+
+    Returns
+    -------
+    dict
+        'points' is the total number of points lost, which isn't capped by the rubric.
+        'violations' has a dictionary for every rule that was checked, keyed by its name, holding 'count', the number of
+        mistakes found, 'points', the points lost, and 'locations', the paragraphs the mistakes were found in or None.
+    """
+    if rules is None:
+        rules = RULES
+    return _evaluate(facts, style, weight, proportional, [r for r in rules if r.applies(style)])
+
+
+def _evaluate(facts, style, weight, proportional, rules):
+    """
+    Checks a document against every given rule, which must already apply to the style, see evaluate().
+    """
+    points = 0
+    violations = {}
+    for rule in rules:
+        p, count, locations = rule.measure(facts, style, weight, proportional)
+        points += p
+        violations[rule.get_name()] = {'count': count, 'points': p, 'locations': locations}
+    return {'points': points, 'violations': violations}
+
+
+def evaluate_batch(facts_list, styles, weight, proportional=False, rules=None):
+    """
+    Checks every document against every style, such as when grading a set of essays for several classes at once. The
+    rules each style needs are only worked out once for the whole batch.
+
+    Parameters
+    ----------
+    facts_list : list of dict
+        The dictionaries given by format.Format.get_facts(), such as from grade.Grade.get_measurements().
+    styles : list of dict
+        The style dictionaries to check against.
+    weight : float
+        See evaluate().
+    proportional : bool
+        See evaluate().
+    rules : list of Rule
+        See evaluate().
+
+    Returns
+    -------
+    list of list of dict
+        The result of evaluate() for every document and style, indexed by [document][style].
+    """
+    if rules is None:
+        rules = RULES
+    applied = [[r for r in rules if r.applies(style)] for style in styles]
+    return [[_evaluate(facts, styles[i], weight, proportional, applied[i]) for i in range(len(styles))]
+            for facts in facts_list]
+
+
+def get_feedback(result, rules=None):
+    """
+    Returns the feedback for a result given by evaluate()
+
+    Parameters
+    ----------
+    result : dict
+        The dictionary given by evaluate().
+    rules : list of Rule
+        The rules the result was evaluated with, RULES if not given.
+
+    Returns
+    -------
+    str
+        The comments from feedback.format_feedback() for the rules in RULES, followed by the message of any other rule
+        that found a mistake.
+    """
+    if rules is None:
+        rules = RULES
+    violations = result['violations']
+    found = [r.get_name() for r in rules if r.get_name() in violations and violations[r.get_name()]['count'] > 0]
+    names = [r.get_name() for r in RULES]
+    extra = [r.get_message() for r in rules if r.get_name() in found and r.get_name() not in names and
+             r.get_message() is not None]
+
+    text = feedback.format_feedback([n in found for n in names])
+    if len(extra) > 0 and not any([n in found for n in names]):
+        # Leave out the comment saying the paper has no mistakes
+        text = ""
+    return text + "".join([m + "\n" for m in extra])
@@ -1,9 +1,16 @@
+import concurrent.futures
+import os
+import threading
+import time
+import cache
 import grammar_check
 import keywords
 import feedback
 import format
+import format_rules
 import references
-from score_model import ScoreModel, IdeaModel, OrganizationModel, StyleModel
+import score_model_helper
+from score_model import ScoreModel, IdeaModel, OrganizationModel, StyleModel, FusedModel
 from pdfminer.high_level import extract_text
 from pdfminer.utils import open_filename  # Not used here, but might be needed for Sphinx build
 
@@ -19,6 +26,10 @@ if __name__ == '__main__':
     main()
 
 
+# Every stage an essay is measured in before being scored, see Grade.get_measurements()
+STAGES = ('document', 'format', 'grammar', 'keywords', 'models', 'references')
+
+
 def get_style():
     """
     Returns dictionary defining the essay's style
@@ -70,6 +81,21 @@ def get_weights():
             'word_max': None, 'page_min': None, 'page_max': None, 'format': 0, 'reference': 0}
 
 
+def is_filepath(text):
+    """
+    Parameters
+    ----------
+    text : str
+        Either raw essay text or a filepath, see Grade.get_grade().
+
+    Returns
+    -------
+    bool
+        True if the text should be read as a filepath, which is when it begins with either ./ or ../
+    """
+    return len(text) > 3 and (text[0:3] == '../' or text[0:2] == './')
+
+
 def get_filepath():
     """
     Returns dictionary containing filepaths for data relevant to grading
@@ -86,6 +112,8 @@ def get_filepath():
         'organization_data' is a filepath to the organization model's training data.\n
         'style' is a filepath to the style model's saved weights.\n
         'style_data' is a filepath to the style model's training data.\n
+        'fused' is a filepath to the fused model's saved weights.\n
+        'fused_data' is a filepath to the fused model's training data.\n
         'embedding' is a filepath to glove.6B.300d.txt.\n
         'style_json' is a filepath to a .json file where a style for format.py is stored.\n
         'dictionary' is a filepath to a .csv file containing the keywords to be used when grading papers. Can be set to
@@ -95,10 +123,119 @@ def get_filepath():
             'idea': 'model_weights/final_idea_lstm.h5', 'idea_data': 'comment_set.tsv',
             'organization': 'model_weights/final_organization_lstm.h5', 'organization_data': 'comment_set.tsv',
             'style': 'model_weights/final_style_lstm.h5', 'style_data': 'comment_set.tsv',
+            'fused': 'model_weights/final_fused_lstm.h5', 'fused_data': 'comment_set.tsv',
             'embedding': 'glove6B/glove.6B.300d.txt', 'style_json': 'standard.json',
             'dictionary': 'dictionary.csv'}
 
 
+class GradeConfig:
+    """
+    The GradeConfig class holds the rubric, weights and style an essay is scored under. A GradeConfig can't be changed
+    once it is made, so a single Grade, along with its models, can be shared by many threads that each grade under
+    their own GradeConfig.
+
+    Parameters
+    ----------
+    rubric : dict
+        Should be a dictionary with the same keys as grade.get_rubric().
+    weights : dict
+        Should be a dictionary with the same keys as grade.get_weights().
+    style : dict
+        Should be a dictionary with the same keys as grade.get_style().
+    proportional_format : bool
+        If True, each font, size and spacing rule loses the format weight times the share of the document's text that
+        breaks it, instead of the format weight for every different font, size or spacing that breaks it. A single stray
+        character in the wrong font then costs next to nothing, while a whole essay in the wrong font costs one weight.
+
+    Raises
+    ------
+    KeyError
+        One of the given dictionaries doesn't have the correct keys.
+    """
+
+    __slots__ = ('__rubric', '__weights', '__style', '__proportional_format')
+
+    def __init__(self, rubric, weights, style, proportional_format=False):
+        if type(rubric) is dict and set(rubric.keys()) == set(get_rubric().keys()):
+            self.__rubric = dict(rubric)
+        else:
+            raise KeyError("Given rubric keys do not match skeleton keys")
+        if type(weights) is dict and set(weights) == set(get_weights().keys()):
+            self.__weights = dict(weights)
+        else:
+            raise KeyError("Given weight keys do not match skeleton keys")
+        if type(style) is dict and set(style.keys()) == set(get_style().keys()):
+            self.__style = dict(style)
+        else:
+            raise KeyError("Given style keys do not match skeleton keys")
+        self.__proportional_format = bool(proportional_format)
+
+    def get_rubric(self):
+        """
+        Returns
+        -------
+        dict
+            A copy of the rubric.
+        """
+        return dict(self.__rubric)
+
+    def get_weights(self):
+        """
+        Returns
+        -------
+        dict
+            A copy of the weights.
+        """
+        return dict(self.__weights)
+
+    def get_style(self):
+        """
+        Returns
+        -------
+        dict
+            A copy of the style.
+        """
+        return dict(self.__style)
+
+    def is_proportional_format(self):
+        """
+        Returns
+        -------
+        bool
+            True if format mistakes are scored by the share of the text they cover, see GradeConfig.
+        """
+        return self.__proportional_format
+
+    def replace(self, rubric=None, weights=None, style=None, proportional_format=None):
+        """
+        Returns a new GradeConfig with any given dictionary in place of this one's
+
+        Parameters
+        ----------
+        rubric : dict
+            The new rubric, or None to keep this one's.
+        weights : dict
+            The new weights, or None to keep this one's.
+        style : dict
+            The new style, or None to keep this one's.
+        proportional_format : bool
+            Whether format mistakes are scored by the share of the text they cover, or None to keep this one's.
+
+        Returns
+        -------
+        GradeConfig
+            The new GradeConfig, this one is left unchanged.
+
+        Raises
+        ------
+        KeyError
+            One of the given dictionaries doesn't have the correct keys.
+        """
+        return GradeConfig(self.__rubric if rubric is None else rubric, self.__weights if weights is None else weights,
+                           self.__style if style is None else style,
+                           self.__proportional_format if proportional_format is None else proportional_format)
+
+
 class Grade:
     """
     The Grade class contains definitions and functions used to grade an essay based on the given rubric and weights.
@@ -122,6 +259,27 @@ class Grade:
         style should be a dictionary with the same keys as grade.get_style() or a filepath to a .json file which
         contains a style dictionary. This has a default value set, but if the file is missing, an Exception will be
         thrown.
+    fused : bool
+        If True, a single FusedModel is used in place of the score, idea, organization and style models, which runs
+        each essay through one LSTM instead of four.
+    cache_size : int
+        The most grades kept in memory, so that grading the same essay under the same rubric, weights, style, keywords
+        and model weights again doesn't need to redo any of the work. Five times as many measurements are kept, so
+        an essay graded again under a different rubric, weights or style only needs to be scored, see
+        get_measurements().
+    cache_path : str
+        An optional directory where grades are also stored on disk, so they are kept between runs. Measurements are
+        stored in its 'stages' folder.
+    workers : int
+        The number of threads used to run the stages that don't depend on each other at the same time, such as reading
+        the format while the grammar is checked, and running the models alongside the keyword and reference checks. If
+        0, every stage is run one after another. Use close() to stop the threads once the Grade is no longer needed.
+    incremental_grammar : bool
+        If True, the second grammar check only rechecks the paragraphs changed by the first, see
+        grammar_check.number_of_errors(). This is faster, but can miss a mistake that spans two paragraphs.
+    documents : format.FormatCache
+        Where the Format of every docx read is kept, so one shared with the rest of the website means a file is only
+        parsed once. A new one is made if not given.
 
     Raises
     ------
@@ -132,53 +290,58 @@ class Grade:
         If you get this, then one of the given file paths was incorrect or the file was simply missing.
     """
 
-    __slots__ = ('__model', '__idea_model', '__organization_model', '__style_model', '__words', '__rubric', '__weights',
-                 '__style', '__filepath')
-
-    def __init__(self, rubric, weights, start, filepath=None, style=None):
-        # Setting up file paths
-        if type(filepath) is not dict:
-            filepath = get_filepath()
-        self.__filepath = get_filepath()
-        for i in filepath.keys():
-            self.__filepath[i] = start + filepath[i]
-
-        # Creating the models
-        self.__model = ScoreModel(self.__filepath['model'], self.__filepath['model_data'], self.__filepath['embedding'])
-        self.__idea_model = IdeaModel(self.__filepath['idea'], self.__filepath['idea_data'],
+    __slots__ = ('__model', '__idea_model', '__organization_model', '__style_model', '__fused_model', '__words',
+                 '__config', '__filepath', '__cache', '__stages', '__documents', '__incremental_grammar',
+                 '__executor', '__timings', '__timing_lock')
+
+    def __init__(self, rubric, weights, start, filepath=None, style=None, fused=False, cache_size=128,
+                 cache_path=None, workers=0, documents=None, incremental_grammar=False):
+        # Setting up file paths, any path not given falls back to the default
+        paths = get_filepath()
+        if type(filepath) is dict:
+            paths.update(filepath)
+        self.__filepath = {}
+        for i in paths.keys():
+            self.__filepath[i] = None if paths[i] is None else start + paths[i]
+
+        # Creating the models, models with the same vocabulary share one embedding matrix (see embedding_store.py)
+        self.__model, self.__idea_model, self.__organization_model, self.__style_model = None, None, None, None
+        self.__fused_model = None
+        if fused:
+            self.__fused_model = FusedModel(self.__filepath['fused'], self.__filepath['fused_data'],
+                                            self.__filepath['embedding'])
+        else:
+            self.__model = ScoreModel(self.__filepath['model'], self.__filepath['model_data'],
                                       self.__filepath['embedding'])
-        self.__organization_model = OrganizationModel(self.__filepath['organization'],
-                                                      self.__filepath['organization_data'],
-                                                      self.__filepath['embedding'], self.__idea_model.get_embedding())
-        self.__style_model = StyleModel(self.__filepath['style'], self.__filepath['style_data'],
-                                        self.__filepath['embedding'], self.__idea_model.get_embedding())
+            self.__idea_model = IdeaModel(self.__filepath['idea'], self.__filepath['idea_data'],
+                                          self.__filepath['embedding'])
+            self.__organization_model = OrganizationModel(self.__filepath['organization'],
+                                                          self.__filepath['organization_data'],
+                                                          self.__filepath['embedding'])
+            self.__style_model = StyleModel(self.__filepath['style'], self.__filepath['style_data'],
+                                            self.__filepath['embedding'])
 
         # These are left empty until something is done otherwise
         self.__words = keywords.KeyWords()
-
-        # Storing the given rubric if it is correct
-        if type(rubric) is dict and set(rubric.keys()) == set(get_rubric().keys()):
-            self.__rubric = rubric
-        else:
-            raise KeyError("Given rubric keys do not match skeleton keys")
-        # Storing the given weights if it is correct
-        if type(weights) is dict and set(weights) == set(get_weights().keys()):
-            self.__weights = weights
-        else:
-            raise KeyError("Given weight keys do not match skeleton keys")
-        # Storing the given style if it is correct or retrieving the given filepath
-        if type(style) is dict:
-            if set(style.keys()) == set(get_style().keys()):
-                self.__style = style
-            else:
-                raise KeyError("Given style keys do not match skeleton keys")
-        else:
-            self.__style = format.get_format_file(self.__filepath['style_json'])
+        self.__cache = cache.Cache(cache_size, cache_path)
+        self.__stages = cache.Cache(cache_size * 5, None if cache_path is None else os.path.join(cache_path, 'stages'))
+        self.__documents = format.FormatCache() if documents is None else documents
+        self.__incremental_grammar = incremental_grammar
+        self.__executor = None
+        if workers > 0:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.__timings = {}
+        self.__timing_lock = threading.Lock()
+
+        # Storing the given rubric, weights and style if they are correct, or retrieving the style from its filepath
+        if type(style) is not dict:
+            style = format.get_format_file(self.__filepath['style_json'])
+        self.__config = GradeConfig(rubric, weights, style)
         # Getting the keyword list if a filepath was given
-        if filepath['dictionary'] is not None:
+        if self.__filepath['dictionary'] is not None:
             self.__words = keywords.KeyWords(self.__filepath['dictionary'])
 
-    def get_grade(self, text):
+    def get_grade(self, text, config=None):
         """
         Returns a grade for the given essay in line with the rubric
 
@@ -187,6 +350,8 @@ class Grade:
         text : str
             This can either be raw essay text or a filepath to a .txt, .pdf, or .docx. it will assume that it was
             given a filepath if the the beginning of the string is either ./ or ../
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -202,17 +367,413 @@ class Grade:
         FileNotFoundError
         The given filepath was either wrong, is missing, or is the wrong type.
         """
+        return self.get_grades([text], config)[0]
+
+    def get_grades(self, texts, config=None):
+        """
+        Returns a grade for every given essay in line with the rubric. This is much faster than calling get_grade() for
+        each essay, as every model only runs a single prediction over all of the essays. Essays that have already been
+        graded with the same rubric, weights, style, keywords and model weights are taken from the cache instead, and
+        essays that have only been measured before are scored again without checking their grammar or running a model.
+
+        Parameters
+        ----------
+        texts : list of str
+            Every entry follows the same rules as the text given to get_grade().
+        config : GradeConfig
+            See get_grade().
+
+        Returns
+        -------
+        list of tuple of str, int, str
+            A (debug, grade, feedback) tuple for every essay, in the same order as given. See get_grade().
+
+        Raises
+        ------
+        FileNotFoundError
+        One of the given filepaths was either wrong, is missing, or is the wrong type.
+        """
+        if config is None:
+            config = self.__config
+        grades = [None] * len(texts)
+        essays, keys = [], []
+        pending = {}
+        for i in range(len(texts)):
+            essays.append(self.__get_essay_key(texts[i]))
+            keys.append(self.__get_key(essays[i], config))
+            grades[i] = self.__cache.get(keys[i])
+            if grades[i] is None:
+                pending.setdefault(keys[i], []).append(i)
+
+        # Only the essays missing from the cache are graded, and each of them only once
+        first = [pending[k][0] for k in pending.keys()]
+        measurements = self.__measure([texts[i] for i in first], [essays[i] for i in first],
+                                      self.__get_stages(config))
+        for key, m in zip(pending.keys(), measurements):
+            grade = self.score_measurements(m, config)
+            self.__cache.put(key, grade)
+            for i in pending[key]:
+                grades[i] = grade
+
+        return grades
+
+    def get_measurements(self, texts):
+        """
+        Returns everything measured about every given essay, none of which depends on the rubric, weights or style.
+        Measurements are cached, so they can be scored again under any rubric with score_measurements() without
+        checking grammar or running a model.
 
-        grade, page, word = 100, None, None
-        debug, output, t = "", "", ""
+        Parameters
+        ----------
+        texts : list of str
+            Every entry follows the same rules as the text given to get_grade().
+
+        Returns
+        -------
+        list of dict
+            A dictionary for every essay, in the same order as given, with the keys:
+            'text' is the essay text before being corrected.
+            'page' is the page count of a docx, otherwise None.
+            'format' is the dictionary given by format.Format.get_facts() for a docx, otherwise None.
+            'corrections' is the list of mistakes and their corrections found by grammar_check.number_of_errors().
+            'corrected_text' is the essay text after being corrected.
+            'words' is the number of words in the corrected text.
+            'keywords' is the list of keywords and their occurrences given by keywords.KeyWords.occurrence().
+            'models' is the score, idea, organization and style model outputs.
+            'references' is the number of missing references given by references.extract_citation().
+
+        Raises
+        ------
+        FileNotFoundError
+        One of the given filepaths was either wrong, is missing, or is the wrong type.
+        """
+        return self.__measure(texts, [self.__get_essay_key(t) for t in texts], STAGES)
+
+    def score_measurements(self, measurements, config=None):
+        """
+        Returns a grade in line with the rubric for an essay that has already been measured
+
+        Parameters
+        ----------
+        measurements : dict
+            A dictionary given by get_measurements(). Only the keys needed by the sections in the rubric have to be
+            present.
+        config : GradeConfig
+            See get_grade().
+
+        Returns
+        -------
+        tuple of str, int, str
+            A (debug, grade, feedback) tuple, see get_grade().
+        """
+        if config is None:
+            config = self.__config
+        grade, debug, output = 100, "", ""
+
+        for section, (p, d, o) in self.__score_sections(measurements, config):
+            grade -= p
+            debug += d
+            output += o
+
+        return debug, max(grade, 0), output
+
+    def __score_sections(self, m, config):
+        """
+        Returns a (section, (points, debug, output)) pair for every section of the rubric, in the order the debug and
+        feedback are written.
+        """
+        return [('grammar', self.__score_grammar(m, config)), ('key', self.__score_key(m, config)),
+                ('length', self.__score_length(m, config)), ('format', self.__score_format(m, config)),
+                ('model', self.__score_model(m, config)), ('reference', self.__score_reference(m, config))]
+
+    def get_report(self, text, config=None):
+        """
+        Returns the grade of an essay broken down by section, along with its text, so it can be stored and shown later
+        without reading or grading the essay again. Anything already measured while grading is taken from the cache.
+
+        Parameters
+        ----------
+        text : str
+            See get_grade().
+        config : GradeConfig
+            See get_grade().
+
+        Returns
+        -------
+        dict
+            'text' is the essay text before being corrected.
+            'grade' is the grade given by get_grade().
+            'sections' is the number of points taken off by each section in the rubric, leaving out any set to None.
+            'corrections' is the list of mistakes and their corrections, see get_measurements().
+            'models' is the score, idea, organization and style model outputs, or None if the rubric doesn't use them.
+            'format' is every format rule that was checked along with its mistakes, see format_rules.evaluate(), or None
+            if the essay isn't a docx or the rubric doesn't grade format.
+
+        Raises
+        ------
+        FileNotFoundError
+        The given filepath was either wrong, is missing, or is the wrong type.
+        """
+        if config is None:
+            config = self.__config
+        m = self.__measure([text], [self.__get_essay_key(text)], self.__get_stages(config))[0]
+        rubric = config.get_rubric()
+        sections = {}
+        for section, (p, d, o) in self.__score_sections(m, config):
+            if rubric[section] is not None:
+                sections[section] = p
+
+        models = m.get('models')
+        violations = None
+        if rubric['format'] is not None and m.get('format') is not None:
+            violations = format_rules.evaluate(m['format'], config.get_style(), config.get_weights()['format'],
+                                               config.is_proportional_format())['violations']
+        return {'text': m['text'], 'grade': max(100 - sum(sections.values()), 0), 'sections': sections,
+                'corrections': [list(c) for c in m['corrections']],
+                'models': None if models is None else [float(s) for s in models], 'format': violations}
+
+    def __get_stages(self, config):
+        """
+        Returns the measurement stages needed by the sections in the config's rubric, the document and grammar stages
+        are always needed as every other stage uses the corrected text.
+        """
+        rubric = config.get_rubric()
+        stages = ['document', 'grammar']
+        if rubric['format'] is not None:
+            stages.append('format')
+        if rubric['key'] is not None:
+            stages.append('keywords')
+        if rubric['model'] is not None:
+            stages.append('models')
+        if rubric['reference'] is not None:
+            stages.append('references')
+        return stages
+
+    def __measure(self, texts, essays, stages):
+        """
+        Measures every given essay, taking each stage from the cache when it has already been measured. When Grade was
+        given workers, the stages that don't depend on each other are run at the same time.
+
+        Parameters
+        ----------
+        texts : list of str
+            See get_grades().
+        essays : list of str
+            The key of every essay given by __get_essay_key().
+        stages : list of str
+            The stages to measure, see STAGES.
+
+        Returns
+        -------
+        list of dict
+            See get_measurements().
+        """
+        measurements, futures = [], []
+        for text, essay in zip(texts, essays):
+            document, word = self.__get_document(text, essay)
+            measurements.append(dict(document))
+            f = {}
+            # The format doesn't need the corrected text, so it is found while the grammar is being checked
+            if 'format' in stages:
+                f['format'] = self.__submit(self.__get_stage, essay, 'format', format.FACTS_VERSION, self.__read_format,
+                                            text, word)
+            # Run the grammar and spelling check, the corrected text is needed by every other stage
+            # Each mode can correct the text differently, so they are cached apart
+            f['grammar'] = self.__submit(self.__get_stage, essay, 'grammar', self.__incremental_grammar,
+                                         self.__measure_grammar, document['text'])
+            futures.append(f)
+
+        for m, f in zip(measurements, futures):
+            m.update(f['grammar'].result())
+
+        # Run every model over all of the essays at once, alongside the keyword and reference stages
+        models = None
+        if 'models' in stages:
+            models = self.__submit(self.__measure_models, essays, [m['corrected_text'] for m in measurements])
+        for m, f, essay in zip(measurements, futures, essays):
+            if 'keywords' in stages:
+                f['keywords'] = self.__submit(self.__get_stage, essay, 'keywords', self.__words.get_keywords(),
+                                              self.__measure_keywords, m['corrected_text'])
+            if 'references' in stages:
+                f['references'] = self.__submit(self.__get_stage, essay, 'references', (), self.__measure_references,
+                                                m['corrected_text'])
+
+        for m, f in zip(measurements, futures):
+            for stage in f.keys():
+                m.update(f[stage].result())
+        if models is not None:
+            for m, scores in zip(measurements, models.result()):
+                m['models'] = scores
+
+        return measurements
+
+    def __submit(self, function, *args):
+        """
+        Starts function(*args) on one of the worker threads, or runs it straight away when Grade has no workers
+
+        Returns
+        -------
+        concurrent.futures.Future
+            The future result of the function.
+        """
+        if self.__executor is not None:
+            return self.__executor.submit(function, *args)
+
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __get_stage(self, essay, stage, dependencies, measure, *args):
+        """
+        Returns a single stage's measurements of an essay, only calling measure(*args) if they aren't in the cache
+
+        Parameters
+        ----------
+        essay : str
+            The key of the essay given by __get_essay_key().
+        stage : str
+            The name of the stage, see STAGES.
+        dependencies
+            Anything besides the essay that changes the stage's measurements, such as the keyword list.
+        measure : function
+            Returns a dictionary of the stage's measurements.
+        args
+            Passed on to measure.
+
+        Returns
+        -------
+        dict
+            The stage's measurements.
+        """
+        key = cache.get_key(essay, stage, dependencies)
+        value = self.__stages.get(key)
+        if value is None:
+            start = time.perf_counter()
+            value = measure(*args)
+            self.__add_timing(stage, 1, time.perf_counter() - start)
+            self.__stages.put(key, value)
+        return value
+
+    def __add_timing(self, stage, count, seconds):
+        with self.__timing_lock:
+            total = self.__timings.get(stage, (0, 0.0))
+            self.__timings[stage] = (total[0] + count, total[1] + seconds)
+
+    def get_timings(self):
+        """
+        Returns how long was spent measuring each stage, only counting the essays that weren't found in the cache
+
+        Returns
+        -------
+        dict
+            Maps every stage that has been measured, see STAGES, to a tuple of the number of essays measured and the
+            total number of seconds spent on them.
+        """
+        with self.__timing_lock:
+            return dict(self.__timings)
+
+    def reset_timings(self):
+        """
+        Forgets every timing given by get_timings().
+        """
+        with self.__timing_lock:
+            self.__timings.clear()
+
+    def __get_document(self, text, essay):
+        """
+        Returns the document stage's measurements of an essay, along with the format.Format of a docx if it had to be
+        read. See __read().
+        """
+        key = cache.get_key(essay, 'document', ())
+        document = self.__stages.get(key)
+        if document is not None:
+            return document, None
+
+        start = time.perf_counter()
+        document, word = self.__read(text)
+        self.__add_timing('document', 1, time.perf_counter() - start)
+        self.__stages.put(key, document)
+        return document, word
+
+    def __measure_grammar(self, text):
+        """
+        Returns the grammar stage's measurements of the given essay text, see get_measurements().
+        """
+        corrections, corrected_text = grammar_check.number_of_errors(text, incremental=self.__incremental_grammar)
+        return {'corrections': corrections, 'corrected_text': corrected_text, 'words': len(corrected_text.split())}
+
+    def __measure_keywords(self, text):
+        """
+        Returns the keywords stage's measurements of the given corrected text, see get_measurements().
+        """
+        return {'keywords': self.__words.occurrence(text)}
+
+    def __measure_references(self, text):
+        """
+        Returns the references stage's measurements of the given corrected text, see get_measurements().
+        """
+        return {'references': references.extract_citation(text)}
+
+    def __measure_models(self, essays, texts):
+        """
+        Returns the models stage's measurements of every essay, running every model once over all of the essays that
+        are missing from the cache
+
+        Parameters
+        ----------
+        essays : list of str
+            The key of every essay given by __get_essay_key().
+        texts : list of str
+            The corrected text of every essay.
+
+        Returns
+        -------
+        list of tuple of float
+            The score, idea, organization and style model outputs for every essay, in the same order as given.
+        """
+        versions = self.__get_versions()
+        keys = [cache.get_key(essay, 'models', versions) for essay in essays]
+        scores = [self.__stages.get(key) for key in keys]
+
+        missing = [i for i in range(len(scores)) if scores[i] is None]
+        if len(missing) > 0:
+            start = time.perf_counter()
+            evaluated = self.__evaluate_models([texts[i] for i in missing])
+            self.__add_timing('models', len(missing), time.perf_counter() - start)
+            for i, s in zip(missing, evaluated):
+                scores[i] = s
+                self.__stages.put(keys[i], s)
+
+        return scores
+
+    def __read(self, text):
+        """
+        Returns the document stage's measurements of the given essay
+
+        Parameters
+        ----------
+        text : str
+            See get_grade().
+
+        Returns
+        -------
+        tuple of dict, format.Format
+            The 'text' and 'page' measurements, see get_measurements(), followed by the Format of a docx. 'page' and
+            the Format are None unless given a docx.
+        """
+        page, word = None, None
+        t = ""
 
         # text must be a filepath
-        if len(text) > 3 and (text[0:3] == '../' or text[0:2] == './'):
+        if is_filepath(text):
             f = text.split('.')
 
             # File must be a docx
             if f[len(f) - 1] == "docx":
-                word = format.Format(text)
+                word = self.__documents.get(text)
                 t = word.get_text()
                 page = word.get_page_count()
             # File must be a pdf
@@ -226,45 +787,112 @@ class Grade:
         else:
             t = text
 
-        # Run the grammar and spelling check
-        p, corrected_text, d, o = self.grade_grammar(t)
-        grade -= p
-        debug += d
-        output += o
-
-        # Run the keyword check
-        p, d, o = self.grade_key(corrected_text)
-        grade -= p
-        debug += d
-        output += o
-
-        # Run the length check
-        p, d, o = self.grade_length(corrected_text, page)
-        grade -= p
-        debug += d
-        output += o
-
-        # Run the format check
-        p, d, o = self.grade_format(word)
-        grade -= p
-        debug += d
-        output += o
-
-        # Run the model check
-        p, d, o = self.grade_model(corrected_text)
-        grade -= p
-        debug += d
-        output += o
-
-        # Run the reference check
-        p, d, o = self.grade_reference(corrected_text)
-        grade -= p
-        debug += d
-        output += o
+        return {'text': t, 'page': page}, word
 
-        return debug, max(grade, 0), output
+    def __read_format(self, text, word=None):
+        """
+        Returns the format stage's measurements of the given essay, see get_measurements()
+
+        Parameters
+        ----------
+        text : str
+            See get_grade().
+        word : format.Format
+            The Format of the docx if it has already been read, otherwise it is taken from the FormatCache.
+        """
+        if word is None and is_filepath(text) and text.split('.')[-1] == "docx":
+            word = self.__documents.get(text)
 
-    def grade_grammar(self, text):
+        return {'format': None if word is None else word.get_facts()}
+
+    def __get_essay_key(self, text):
+        """
+        Returns the key of the given essay on its own, files are keyed by their contents, so measurements are kept even
+        if the file is moved, and the file doesn't need to be read to find them.
+
+        Parameters
+        ----------
+        text : str
+            See get_grade().
+
+        Returns
+        -------
+        str
+            A hex digest that can be used with cache.Cache.
+        """
+        if is_filepath(text):
+            # A file's text depends on how it is read, so everything measured from it is kept apart for each version
+            return cache.get_key('file', text.split('.')[-1], cache.get_file_key(text), format.TEXT_VERSION)
+        return cache.get_key('text', text)
+
+    def __get_versions(self):
+        """
+        Returns the weights version of every model in use, see score_model.Model.get_weights_version().
+        """
+        return [m.get_weights_version() for m in [self.__model, self.__idea_model, self.__organization_model,
+                                                  self.__style_model, self.__fused_model] if m is not None]
+
+    def __get_key(self, essay, config):
+        """
+        Returns the cache key for grading the given essay under everything currently used to grade it. Changing the
+        rubric, weights, style, keywords, grammar check mode or retraining a model all lead to a different key.
+
+        Parameters
+        ----------
+        essay : str
+            The key of the essay given by __get_essay_key().
+        config : GradeConfig
+            The rubric, weights and style being graded under.
+
+        Returns
+        -------
+        str
+            A hex digest that can be used with cache.Cache.
+        """
+        return cache.get_key(essay, config.get_rubric(), config.get_weights(), config.get_style(),
+                             config.is_proportional_format(), self.__words.get_keywords(), self.__get_versions(),
+                             self.__incremental_grammar)
+
+    def clear_cache(self):
+        """
+        Removes every stored grade and measurement, both in memory and on disk, along with every kept Format.
+        """
+        self.__cache.clear()
+        self.__stages.clear()
+        self.__documents.clear()
+
+    def close(self):
+        """
+        Stops the worker threads once the stages they are running have finished, every stage after this is run one after
+        another instead.
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def __evaluate_models(self, texts):
+        """
+        Runs the score, idea, organization and style models over every given text
+
+        Parameters
+        ----------
+        texts : list of str
+            Preferably the corrected texts from grade_grammar().
+
+        Returns
+        -------
+        list of tuple of float
+            The score, idea, organization and style model outputs for every text, in the same order as given.
+        """
+        if self.__fused_model is not None:
+            return [tuple(row) for row in self.__fused_model.evaluate_batch(texts)]
+
+        # Each text is only tokenized once for all four models
+        essays = score_model_helper.EssayBatch(texts)
+        return list(zip(self.__model.evaluate_batch(essays), self.__idea_model.evaluate_batch(essays),
+                        self.__organization_model.evaluate_batch(essays), self.__style_model.evaluate_batch(essays)))
+
+    def grade_grammar(self, text, config=None):
         """
         Returns a grade based on grammar and spelling in the given essay
 
@@ -272,6 +900,8 @@ class Grade:
         ----------
         text : str
             The raw text that will be checked for grammar and spelling mistakes
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -285,24 +915,36 @@ class Grade:
             Feedback will contain a pre-written string based on the number of points being taken off.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        # Need corrected text for other functions, so always run
+        m = self.__measure_grammar(text)
+        points, debug, output = self.__score_grammar(m, config)
+
+        return points, m['corrected_text'], debug, output
+
+    def __score_grammar(self, m, config):
+        """
+        Returns the grammar section's (points, debug, output) for the 'corrections' measurement, see grade_grammar().
+        """
+        rubric, weights = config.get_rubric(), config.get_weights()
         points = 0
         debug, output = "", ""
 
-        # Need corrected text for other functions, so always run
-        corrections, corrected_text = grammar_check.number_of_errors(text)
-        if self.__rubric['grammar'] is not None:
+        if rubric['grammar'] is not None:
+            corrections = m['corrections']
             mistakes = len(corrections)
-            if self.__weights['allowed_mistakes'] is not None:
-                mistakes = max(mistakes - self.__weights['allowed_mistakes'], 0)
+            if weights['allowed_mistakes'] is not None:
+                mistakes = max(mistakes - weights['allowed_mistakes'], 0)
 
-            points = min(self.__weights['grammar'] * mistakes, self.__rubric['grammar'])
+            points = min(weights['grammar'] * mistakes, rubric['grammar'])
             debug += "Errors: " + str(len(corrections)) + "\n"
             debug += str(corrections) + "\n"
-            output += feedback.grammar_feedback(round(points * 3 / self.__rubric['grammar']))
+            output += feedback.grammar_feedback(round(points * 3 / rubric['grammar']))
 
-        return points, corrected_text, debug, output
+        return points, debug, output
 
-    def grade_key(self, text):
+    def grade_key(self, text, config=None):
         """
         Returns a grade based on the use (or disuse) of keywords in the given essay
 
@@ -311,6 +953,8 @@ class Grade:
         text : str
             Preferably the corrected text from grade_grammar(), text will be searched for all of the currently defined
             keywords.
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -322,23 +966,36 @@ class Grade:
             Feedback will contain a pre-written string based on the number of points being taken off.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        m = {}
+        if config.get_rubric()['key'] is not None:
+            m['keywords'] = self.__words.occurrence(text)
+
+        return self.__score_key(m, config)
+
+    def __score_key(self, m, config):
+        """
+        Returns the keyword section's (points, debug, output) for the 'keywords' measurement, see grade_key().
+        """
+        rubric, weights = config.get_rubric(), config.get_weights()
         points, key = 0, 0
         debug, output = "", ""
 
-        if self.__rubric['key'] is not None:
-            key_list = self.__words.occurrence(text)
+        if rubric['key'] is not None:
+            key_list = m['keywords']
             for i in key_list:
                 if i[1] > 0:
                     key += 1
-            points = max((self.__weights['key_max'] - key) / (self.__weights['key_max'] - self.__weights['key_min']),
+            points = max((weights['key_max'] - key) / (weights['key_max'] - weights['key_min']),
                          0.0)
-            points = min(round(points * self.__rubric['key']), self.__rubric['key'])
+            points = min(round(points * rubric['key']), rubric['key'])
             debug += "Keyword Usage: " + str(key_list) + "\n"
-            output += feedback.keyword_feedback(round(points * 3 / self.__rubric['key']))
+            output += feedback.keyword_feedback(round(points * 3 / rubric['key']))
 
         return points, debug, output
 
-    def grade_length(self, text, page=None):
+    def grade_length(self, text, page=None, config=None):
         """
         Returns a grade based on the length of the given essay
 
@@ -348,6 +1005,8 @@ class Grade:
             Preferably the corrected text from grade_grammar(), the number of words contained in text will be used.
         page : int
             An int that a doc or docx may have that can be used in place of word count grading
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -358,28 +1017,38 @@ class Grade:
             Feedback will contain a pre-written string based on the number of points being taken off.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        return self.__score_length({'words': len(text.split()), 'page': page}, config)
+
+    def __score_length(self, m, config):
+        """
+        Returns the length section's (points, debug, output) for the 'words' and 'page' measurements, see
+        grade_length().
+        """
+        rubric, weights = config.get_rubric(), config.get_weights()
         points = 0
         debug, output = "", ""
 
-        count = len(text.split())
-        if self.__rubric['length'] is not None:
-            if self.__weights['page_min'] is not None and page is not None and page < self.__weights['page_min']:
-                points = self.__rubric['length']
-            if self.__weights['page_max'] is not None and page is not None and page > self.__weights['page_max']:
-                points = round(self.__rubric['length'] / 2)
-            if self.__weights['word_min'] is not None and page is None and count < self.__weights['word_min']:
-                points = self.__rubric['length']
-            if self.__weights['word_max'] is not None and page is None and count > self.__weights['word_max']:
-                points = round(self.__rubric['length'] / 2)
+        count, page = m['words'], m['page']
+        if rubric['length'] is not None:
+            if weights['page_min'] is not None and page is not None and page < weights['page_min']:
+                points = rubric['length']
+            if weights['page_max'] is not None and page is not None and page > weights['page_max']:
+                points = round(rubric['length'] / 2)
+            if weights['word_min'] is not None and page is None and count < weights['word_min']:
+                points = rubric['length']
+            if weights['word_max'] is not None and page is None and count > weights['word_max']:
+                points = round(rubric['length'] / 2)
 
             if page is not None:
                 debug += "Page Count: " + str(page) + "\n"
             debug += "Word Count: " + str(count) + "\n"
-            output += feedback.length_feedback(round(points * 2 / self.__rubric['length']))
+            output += feedback.length_feedback(round(points * 2 / rubric['length']))
 
         return points, debug, output
 
-    def grade_model(self, text):
+    def grade_model(self, text, scores=None, config=None):
         """
         Returns a grade based on the outputs of the score and feedback models when given the input essay
 
@@ -387,6 +1056,11 @@ class Grade:
         ----------
         text : str
             Preferably the corrected text from grade_grammar(), will be fed into all four models to be evaluated.
+        scores : tuple of float
+            The score, idea, organization and style model outputs if they have already been evaluated for the text,
+            such as by get_measurements(). The models won't be run again if this is given.
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -397,17 +1071,30 @@ class Grade:
             Feedback will contain a pre-written string based on the score given by the three feedback models.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        if config.get_rubric()['model'] is not None and scores is None:
+            scores = self.__evaluate_models([text])[0]
+
+        return self.__score_model({'models': scores}, config)
+
+    def __score_model(self, m, config):
+        """
+        Returns the model section's (points, debug, output) for the 'models' measurement, see grade_model().
+        """
+        rubric = config.get_rubric()
         points = 0
         debug, output = "", ""
 
-        if self.__rubric['model'] is not None:
-            points = self.__model.evaluate(text)
-            idea_score = round((self.__idea_model.evaluate(text) * 3) + 0.5) - 1
-            organization_score = round((self.__organization_model.evaluate(text) * 3) + 0.5) - 1
-            style_score = round((self.__style_model.evaluate(text) * 3) + 0.5) - 1
+        if rubric['model'] is not None:
+            scores = m['models']
+            points = scores[0]
+            idea_score = round((scores[1] * 3) + 0.5) - 1
+            organization_score = round((scores[2] * 3) + 0.5) - 1
+            style_score = round((scores[3] * 3) + 0.5) - 1
 
             debug += "Model Score: " + str(points) + "\n"
-            points = round(self.__rubric['model'] * (1 - points))
+            points = round(rubric['model'] * (1 - points))
             debug += "Idea Score: " + str(idea_score) + "\n"
             debug += "Organization Score: " + str(organization_score) + "\n"
             debug += "Style Score: " + str(style_score) + "\n"
@@ -417,7 +1104,7 @@ class Grade:
 
         return points, debug, output
 
-    def grade_format(self, word):
+    def grade_format(self, word, config=None):
         """
         Returns a grade based on the format of the given essay
 
@@ -425,6 +1112,8 @@ class Grade:
         ----------
         word : format.Format
             An object generated by format when given a docx, will be read for its listed format
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -435,99 +1124,32 @@ class Grade:
             Feedback will contain a pre-written string based on every format mistake.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        facts = None
+        if config.get_rubric()['format'] is not None and word is not None:
+            facts = word.get_facts()
+
+        return self.__score_format({'format': facts}, config)
+
+    def __score_format(self, m, config):
+        """
+        Returns the format section's (points, debug, output) for the 'format' measurement, see grade_format().
+        """
+        rubric, weights, style = config.get_rubric(), config.get_weights(), config.get_style()
         points = 0
         debug, output = "", ""
-        format_bool = [False] * 16
-
-        if self.__rubric['format'] is not None and word is not None:
-            fonts = word.get_font()
-            spacing = word.get_spacing()
-            indent = word.get_indentation()
-            margin = word.get_margin()
-            default_style = word.get_default_style()
-
-            if self.__style['font'] is not None:
-                for f in fonts:
-                    if f[0] not in self.__style['font']:
-                        points += self.__weights['format']
-                        format_bool[0] = True
-            if self.__style['size'] is not None:
-                for f in fonts:
-                    if f[1] != self.__style['size']:
-                        points += self.__weights['format']
-                        format_bool[1] = True
-            if self.__style['line_spacing'] is not None:
-                for s in spacing:
-                    if s[0] != self.__style['line_spacing']:
-                        points += self.__weights['format']
-                        format_bool[2] = True
-            if self.__style['after_spacing'] is not None:
-                for s in spacing:
-                    if s[1] != self.__style['after_spacing']:
-                        points += self.__weights['format']
-                        format_bool[3] = True
-            if self.__style['before_spacing'] is not None:
-                for s in spacing:
-                    if s[2] != self.__style['before_spacing']:
-                        points += self.__weights['format']
-                        format_bool[4] = True
-            if self.__style['page_width'] is not None:
-                if default_style['page_width'] != self.__style['page_width']:
-                    points += self.__weights['format']
-                    format_bool[5] = True
-            if self.__style['page_height'] is not None:
-                if default_style['page_height'] != self.__style['page_height']:
-                    points += self.__weights['format']
-                    format_bool[6] = True
-            if self.__style['left_margin'] is not None:
-                if default_style['left_margin'] != self.__style['left_margin']:
-                    points += self.__weights['format']
-                    format_bool[7] = True
-            if self.__style['bottom_margin'] is not None:
-                if default_style['bottom_margin'] != self.__style['bottom_margin']:
-                    points += self.__weights['format']
-                    format_bool[8] = True
-            if self.__style['right_margin'] is not None:
-                if default_style['right_margin'] != self.__style['right_margin']:
-                    points += self.__weights['format']
-                    format_bool[9] = True
-            if self.__style['top_margin'] is not None:
-                if default_style['top_margin'] != self.__style['top_margin']:
-                    points += self.__weights['format']
-                    format_bool[10] = True
-            if self.__style['header'] is not None:
-                if default_style['header'] != self.__style['header']:
-                    points += self.__weights['format']
-                    format_bool[11] = True
-            if self.__style['footer'] is not None:
-                if default_style['footer'] != self.__style['footer']:
-                    points += self.__weights['format']
-                    format_bool[12] = True
-            if self.__style['gutter'] is not None:
-                if default_style['gutter'] != self.__style['gutter']:
-                    points += self.__weights['format']
-                    format_bool[13] = True
-            if self.__style['indent'] is not None:
-                if self.__style['indent'] < 0.5:
-                    points += min(self.__weights['format'] * (indent - self.__style['indent']) * 2,
-                                  self.__weights['format'])
-                else:
-                    points += max(min(self.__weights['format'] * (self.__style['indent'] - indent) * 2,
-                                      self.__weights['format']), 0)
-                if self.__style['indent'] != indent:
-                    format_bool[14] = True
-            if self.__style['left_margin'] is not None and self.__style['right_margin'] is not None:
-                points += min(self.__weights['format'] * margin, self.__weights['format'])
-                if margin != 0:
-                    format_bool[15] = True
-
-            points = min(points, self.__rubric['format'])
-            debug += "Default Style: " + str(default_style) + "\nFonts: " + str(word.get_font_table()) + "\n"
-            output += feedback.format_feedback(format_bool)
+
+        if rubric['format'] is not None and m['format'] is not None:
+            result = format_rules.evaluate(m['format'], style, weights['format'], config.is_proportional_format())
+            points = min(result['points'], rubric['format'])
+            debug += ("Default Style: " + str(m['format']['default_style']) + "\nFonts: " +
+                      str(m['format']['font_table']) + "\n")
+            output += format_rules.get_feedback(result)
 
         return points, debug, output
 
-    def grade_reference(self, text):
+    def grade_reference(self, text, config=None):
         """
         Returns a grade based on the use (or disuse) of references in the given essay
 
@@ -535,6 +1157,8 @@ class Grade:
         ----------
         text : str
             Preferably the corrected text from grade_grammar(), the text will be searched for any references.
+        config : GradeConfig
+            The rubric, weights and style to grade under, if not given then the ones set on this Grade are used.
 
         Returns
         -------
@@ -545,15 +1169,29 @@ class Grade:
             Feedback will contain a pre-written string based on the number of points being taken off.
             See feedback.py for more info.
         """
+        if config is None:
+            config = self.__config
+        m = {}
+        if config.get_rubric()['reference'] is not None:
+            m['references'] = references.extract_citation(text)
+
+        return self.__score_reference(m, config)
+
+    def __score_reference(self, m, config):
+        """
+        Returns the reference section's (points, debug, output) for the 'references' measurement, see
+        grade_reference().
+        """
+        rubric, weights = config.get_rubric(), config.get_weights()
         points = 0
         debug, output = "", ""
 
-        if self.__rubric['reference'] is not None:
-            reference = references.extract_citation(text)
+        if rubric['reference'] is not None:
+            reference = m['references']
 
-            points = min(reference * self.__weights['reference'], self.__rubric['reference'])
+            points = min(reference * weights['reference'], rubric['reference'])
             debug += "Number of Missing References: " + str(reference) + "\n"
-            output += feedback.reference_feedback(round(points * 2 / self.__rubric['reference']))
+            output += feedback.reference_feedback(round(points * 2 / rubric['reference']))
 
         return points, debug, output
 
@@ -568,21 +1206,19 @@ class Grade:
             then the model will attempt to retrain itself based off the previously given data path.
         name : str
             This parameter specifies which model is to be retrained. Acceptable strings are 'score', 'idea',
-            'organization', or 'style'.
+            'organization', or 'style', or 'fused' if the fused model is being used.
 
         Returns
         -------
         bool
-            Returns True if the model was trained successfully, otherwise False.
+            Returns True if the model was trained successfully, otherwise False, including when the named model isn't
+            being used.
         """
-        if name.lower() == "idea":
-            return self.__idea_model.load_data(filepath)
-        if name.lower() == "organization":
-            return self.__organization_model.load_data(filepath)
-        if name.lower() == "style":
-            return self.__style_model.load_data(filepath)
-        if name.lower() == "score":
-            return self.__model.load_data(filepath)
+        model = {'score': self.__model, 'idea': self.__idea_model, 'organization': self.__organization_model,
+                 'style': self.__style_model, 'fused': self.__fused_model}.get(name.lower())
+        if model is None:
+            return False
+        return model.load_data(filepath)
 
     def update_style(self, style, filepath=None):
         """
@@ -600,11 +1236,11 @@ class Grade:
         bool
             True if the given style was correct and was saved correctly if a filepath was given, otherwise False.
         """
-        if type(style) is dict and set(style.keys()) == set(self.__style.keys()):
+        if type(style) is dict and set(style.keys()) == set(get_style().keys()):
             if filepath is not None:
                 if not format.update_format_file(filepath, style):
                     return False
-            self.__style = style
+            self.__config = self.__config.replace(style=style)
             return True
         return False
 
@@ -623,8 +1259,18 @@ class Grade:
             A style dictionary, unless the style couldn't be loaded from the file, raises an Exception then.
         """
         if filepath is not None:
-            self.__style = format.get_format_file(filepath)
-        return self.__style
+            self.__config = self.__config.replace(style=format.get_format_file(filepath))
+        return self.__config.get_style()
+
+    def get_config(self):
+        """
+        Returns
+        -------
+        GradeConfig
+            The rubric, weights and style used when grading without being given a GradeConfig. Updating any of them
+            replaces this with a new GradeConfig, so grades already in progress are left unchanged.
+        """
+        return self.__config
 
     def get_rubric(self):
         """
@@ -633,7 +1279,7 @@ class Grade:
         dict
             Gets the currently used rubric.
         """
-        return self.__rubric
+        return self.__config.get_rubric()
 
     def update_rubric(self, rubric):
         """
@@ -650,7 +1296,7 @@ class Grade:
             If the supplied rubric is correct, return True, otherwise False.
         """
         if type(rubric) is dict and set(rubric.keys()) == set(get_rubric().keys()):
-            self.__rubric = rubric
+            self.__config = self.__config.replace(rubric=rubric)
             return True
         return False
 
@@ -661,7 +1307,7 @@ class Grade:
         dict
             The currently used weights dictionary.
         """
-        return self.__weights
+        return self.__config.get_weights()
 
     def update_weights(self, weights):
         """
@@ -678,7 +1324,7 @@ class Grade:
             True if the given weights is correct, otherwise returns False.
         """
         if type(weights) is dict and set(weights) == set(get_weights().keys()):
-            self.__weights = weights
+            self.__config = self.__config.replace(weights=weights)
             return True
         return False
 
@@ -1,10 +1,300 @@
+import contextlib
 import pandas
-import language_tool_python
+import queue
+import re
+import threading
 
-tool = language_tool_python.LanguageTool('en-US')
+# A paragraph ends at a line break
+PARAGRAPH_BREAK = re.compile(r'\n+')
+# Placed between the paragraphs that are checked together, so that they are still read as separate paragraphs
+PARAGRAPH_SEPARATOR = '\n\n'
 
 
-def number_of_errors(text):
+class ToolPool:
+    """
+    The ToolPool class keeps a number of LanguageTool instances, so that multiple essays can be checked at the same time
+    without waiting on a single Java server. Each instance is checked out by one caller at a time and checked back in
+    once they are done with it. Instances whose server has died are restarted.
+    Instances are only started when first needed, as each one starts a Java server. Use warmup() to start them all up
+    front instead.
+
+    Parameters
+    ----------
+    size : int
+        The number of LanguageTool instances in the pool, which is the number of essays that can be checked at once.
+    remote_server : str
+        An optional url of an already running LanguageTool server, such as 'http://localhost:8081'. If not given, each
+        instance starts its own local server.
+    language : str
+        The language the essays are checked in.
+
+    Raises
+    ------
+    ValueError
+        The size is less than 1.
+    """
+    __slots__ = ('__size', '__remote_server', '__language', '__tools', '__created', '__closed', '__lock')
+
+    def __init__(self, size=1, remote_server=None, language='en-US'):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.__size = size
+        self.__remote_server = remote_server
+        self.__language = language
+        self.__tools = queue.Queue()
+        self.__created = 0
+        self.__closed = False
+        self.__lock = threading.Lock()
+
+    def __create(self):
+        # Imported here so that importing this module doesn't require, or start, LanguageTool
+        import language_tool_python
+
+        if self.__remote_server is not None:
+            return language_tool_python.LanguageTool(self.__language, remote_server=self.__remote_server)
+        return language_tool_python.LanguageTool(self.__language)
+
+    def get_size(self):
+        """
+        Returns
+        -------
+        int
+            The number of LanguageTool instances in the pool.
+        """
+        return self.__size
+
+    def __grow(self):
+        """
+        Starts a new instance if the pool hasn't reached its size yet
+
+        Returns
+        -------
+        language_tool_python.LanguageTool
+            The new instance, or None if the pool is already full.
+        """
+        with self.__lock:
+            if self.__created >= self.__size:
+                return None
+            self.__created += 1
+        # Started outside of the lock, so other checkouts don't wait on the Java server starting
+        try:
+            return self.__create()
+        except Exception:
+            with self.__lock:
+                self.__created -= 1
+            raise
+
+    def warmup(self):
+        """
+        Starts every instance that hasn't been started yet, so the first essays checked don't have to wait on them.
+        """
+        t = self.__grow()
+        while t is not None:
+            self.checkin(t)
+            t = self.__grow()
+
+    def checkout(self, timeout=None):
+        """
+        Takes a LanguageTool instance out of the pool, waiting for one to be checked in if they are all in use. The
+        instance must be given back with checkin() afterwards.
+
+        Parameters
+        ----------
+        timeout : float
+            The most seconds to wait for an instance, waits forever if not given.
+
+        Returns
+        -------
+        language_tool_python.LanguageTool
+            An instance whose server is running.
+
+        Raises
+        ------
+        queue.Empty
+            No instance was checked in before the timeout.
+        """
+        try:
+            t = self.__tools.get_nowait()
+        except queue.Empty:
+            t = self.__grow()
+            if t is None:
+                t = self.__tools.get(timeout=timeout)
+        if not is_alive(t):
+            try:
+                t = self.restart(t)
+            except Exception:
+                # Keep the dead instance in the pool so the restart is tried again by the next checkout
+                self.checkin(t)
+                raise
+        return t
+
+    def checkin(self, t):
+        """
+        Gives a LanguageTool instance taken by checkout() back to the pool, or closes it if the pool has been closed
+
+        Parameters
+        ----------
+        t : language_tool_python.LanguageTool
+            The instance to give back.
+        """
+        with self.__lock:
+            closed = self.__closed
+            if closed:
+                self.__created -= 1
+        if closed:
+            try:
+                t.close()
+            except Exception:
+                pass
+            return
+        self.__tools.put(t)
+
+    @contextlib.contextmanager
+    def tool(self, timeout=None):
+        """
+        Checks out a LanguageTool instance for the length of a with statement, checking it back in afterwards. If the
+        instance's server dies while being used, it is restarted before being checked back in.
+
+        Parameters
+        ----------
+        timeout : float
+            See checkout().
+        """
+        t = self.checkout(timeout)
+        try:
+            yield t
+        except Exception:
+            if not is_alive(t):
+                try:
+                    t = self.restart(t)
+                except Exception:
+                    pass
+            raise
+        finally:
+            self.checkin(t)
+
+    def restart(self, t):
+        """
+        Closes the given LanguageTool instance and creates a new one in its place
+
+        Parameters
+        ----------
+        t : language_tool_python.LanguageTool
+            The instance being replaced, which should be checked out.
+
+        Returns
+        -------
+        language_tool_python.LanguageTool
+            The new instance.
+        """
+        try:
+            t.close()
+        except Exception:
+            pass
+        return self.__create()
+
+    def health_check(self):
+        """
+        Checks every LanguageTool instance that isn't currently checked out by sending it a short request, restarting
+        any that fail to respond.
+
+        Returns
+        -------
+        int
+            The number of instances that had to be restarted.
+        """
+        restarted = 0
+        checked = []
+        try:
+            while True:
+                checked.append(self.__tools.get_nowait())
+        except queue.Empty:
+            pass
+
+        for i in range(len(checked)):
+            try:
+                if not is_alive(checked[i]):
+                    raise RuntimeError("LanguageTool server is not running")
+                checked[i].check('')
+            except Exception:
+                try:
+                    checked[i] = self.restart(checked[i])
+                    restarted += 1
+                except Exception:
+                    pass
+        for t in checked:
+            self.checkin(t)
+
+        return restarted
+
+    def close(self):
+        """
+        Closes every LanguageTool instance that isn't currently checked out, any that are checked out are closed once
+        they are checked back in.
+        """
+        with self.__lock:
+            self.__closed = True
+        try:
+            while True:
+                self.__tools.get_nowait().close()
+                with self.__lock:
+                    self.__created -= 1
+        except queue.Empty:
+            pass
+
+
+def is_alive(t):
+    """
+    Parameters
+    ----------
+    t : language_tool_python.LanguageTool
+        The instance to check.
+
+    Returns
+    -------
+    bool
+        False if the instance started a local server that has since stopped running, otherwise True.
+    """
+    server = getattr(t, '_server', None)
+    return server is None or server.poll() is None
+
+
+def configure(size=1, remote_server=None):
+    """
+    Replaces the pool of LanguageTool instances used by number_of_errors()
+
+    Parameters
+    ----------
+    size : int
+        See ToolPool.
+    remote_server : str
+        See ToolPool.
+
+    Returns
+    -------
+    ToolPool
+        The new pool.
+    """
+    global pool
+    old = pool
+    pool = ToolPool(size, remote_server)
+    old.close()
+    return pool
+
+
+def warmup():
+    """
+    Starts every LanguageTool instance in the pool now rather than when the first essays are checked, for servers that
+    would rather pay that cost up front.
+    """
+    pool.warmup()
+
+
+pool = ToolPool()
+
+
+def number_of_errors(text, incremental=False):
     """
     Corrects the given essay's errors and returns a list of all grammar and spelling errors. Note that
     the text is run through the grammar and spelling check twice for greater accuracy.
@@ -13,6 +303,9 @@ def number_of_errors(text):
     ----------
     text : str
         The text you want to check for grammar and spelling.
+    incremental : bool
+        If True, the corrections from the first check are applied locally and only the paragraphs they changed are
+        checked a second time, which takes two requests to LanguageTool at most instead of four.
 
     Returns
     -------
@@ -31,19 +324,144 @@ def number_of_errors(text):
     if type(text) is not str:
         raise TypeError("text must be a string")
 
-    matches = tool.check(text)
+    with pool.tool() as tool:
+        if incremental:
+            return incremental_errors(text, tool)
+
+        matches = tool.check(text)
+
+        for rules in matches:
+            if len(rules.replacements) > 0:
+                pair.append((text[rules.offset:rules.errorLength + rules.offset], rules.replacements[0]))
+
+        text = tool.correct(text)
+        matches = tool.check(text)
+
+        for rules in matches:
+            if len(rules.replacements) > 0:
+                pair.append((text[rules.offset:rules.errorLength + rules.offset], rules.replacements[0]))
+
+        text = tool.correct(text)
+
+    return pair, text
+
+
+def incremental_errors(text, tool=None):
+    """
+    Checks the text like number_of_errors(), but the whole text is only checked once. The corrections are applied by
+    their offsets, after which only the paragraphs that were changed get checked again. Each is checked whole, so
+    LanguageTool reads every sentence in the same context as the first check, but a mistake that only shows up across
+    two paragraphs can be missed by the second check.
+
+    Parameters
+    ----------
+    text : str
+        The text you want to check for grammar and spelling.
+    tool : language_tool_python.LanguageTool
+        An instance already checked out of the pool, if not given then one will be checked out for the check.
+
+    Returns
+    -------
+    tuple
+        The tuple consists of a list and the corrected text, see number_of_errors().
+    """
+    pair = []
+
+    if tool is None:
+        with pool.tool() as tool:
+            return incremental_errors(text, tool)
 
-    for rules in matches:
-        if len(rules.replacements) > 0:
-            pair.append((text[rules.offset:rules.errorLength + rules.offset], rules.replacements[0]))
+    matches = [m for m in tool.check(text) if len(m.replacements) > 0]
+    for m in matches:
+        pair.append((text[m.offset:m.errorLength + m.offset], m.replacements[0]))
+    text, changes = apply_corrections(text, [(m.offset, m.errorLength, m.replacements[0]) for m in matches])
 
-    text = tool.correct(text)
-    matches = tool.check(text)
+    # Only the paragraphs touched by a correction can have new errors
+    paragraphs = [p for p in get_paragraphs(text) if any(c[0] <= p[1] and c[1] >= p[0] for c in changes)]
+    if len(paragraphs) == 0:
+        return pair, text
 
-    for rules in matches:
-        if len(rules.replacements) > 0:
-            pair.append((text[rules.offset:rules.errorLength + rules.offset], rules.replacements[0]))
+    # Every changed paragraph is checked with a single request, the offsets are then mapped back onto the text
+    starts = []
+    position = 0
+    for p in paragraphs:
+        starts.append(position)
+        position += p[1] - p[0] + len(PARAGRAPH_SEPARATOR)
+    matches = tool.check(PARAGRAPH_SEPARATOR.join([text[p[0]:p[1]] for p in paragraphs]))
 
-    text = tool.correct(text)
+    corrections = []
+    for m in matches:
+        if len(m.replacements) == 0:
+            continue
+        i = 0
+        while i + 1 < len(starts) and starts[i + 1] <= m.offset:
+            i += 1
+        offset = paragraphs[i][0] + m.offset - starts[i]
+        # Skip anything that reaches into the separator
+        if offset + m.errorLength > paragraphs[i][1]:
+            continue
+        pair.append((text[offset:offset + m.errorLength], m.replacements[0]))
+        corrections.append((offset, m.errorLength, m.replacements[0]))
+    text = apply_corrections(text, corrections)[0]
 
     return pair, text
+
+
+def apply_corrections(text, corrections):
+    """
+    Replaces parts of the text, where every correction's offset is based on the original text
+
+    Parameters
+    ----------
+    text : str
+        The text to be corrected.
+    corrections : list of tuple
+        A list of (offset, length, replacement) tuples. Any correction that overlaps an earlier one is skipped.
+
+    Returns
+    -------
+    tuple
+        The tuple consists of the corrected text, followed by a list of (start, end) pairs that give where each
+        replacement ended up in the corrected text.
+    """
+    pieces, changes = [], []
+    position, shift = 0, 0
+
+    for offset, length, replacement in sorted(corrections, key=lambda c: c[0]):
+        if offset < position:
+            continue
+        pieces.append(text[position:offset])
+        pieces.append(replacement)
+        changes.append((offset + shift, offset + shift + len(replacement)))
+        shift += len(replacement) - length
+        position = offset + length
+    pieces.append(text[position:])
+
+    return ''.join(pieces), changes
+
+
+def get_paragraphs(text):
+    """
+    Splits the text into paragraphs, which end at a line break
+
+    Parameters
+    ----------
+    text : str
+        The text to be split.
+
+    Returns
+    -------
+    list of tuple
+        A list of (start, end) pairs, one for every paragraph in the text.
+    """
+    paragraphs = []
+    start = 0
+
+    for b in PARAGRAPH_BREAK.finditer(text):
+        if b.start() > start:
+            paragraphs.append((start, b.start()))
+        start = b.end()
+    if len(text) > start:
+        paragraphs.append((start, len(text)))
+
+    return paragraphs
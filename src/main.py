@@ -15,13 +15,12 @@ def main():
     try:
         test_data = pandas.read_csv('../data/test_set.tsv', sep='\t', encoding='ISO-8859-1')
 
-        # Grade each essay
+        # Grade every essay at once, so each model only has to run a single prediction
         a = 0
-        for i in test_data['essay']:
+        for db, gd, out in g.get_grades(list(test_data['essay'])):
             a += 1
             print("-------------------------------------------------------------------------------------------------\n")
             print("Essay: ", a)
-            db, gd, out = g.get_grade(i)
             print(db + "Grade: " + str(gd) + "\n" + out)
 
     except FileNotFoundError:
@@ -0,0 +1,293 @@
+import smtplib
+import sqlite3
+import ssl
+import threading
+import time
+import traceback
+
+CREATE_TABLE = ("CREATE TABLE IF NOT EXISTS Outbox (message_id INTEGER PRIMARY KEY AUTOINCREMENT, receiver TEXT, "
+                "message TEXT, attempts INTEGER DEFAULT 0, next_try REAL, error TEXT, status TEXT DEFAULT 'queued')")
+CREATE_INDEX = "CREATE INDEX IF NOT EXISTS OutboxDue ON Outbox (status, next_try)"
+
+# A refused address won't be accepted by trying again, so these aren't retried
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+# The server closed a connection that had been left open, so it is worth trying again straight away on a new one
+DROPPED_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+def smtp_connect(host, port, sender=None, password=None, use_ssl=True, timeout=30):
+    """
+    Returns a function that opens a new SMTP connection and logs in, for use as an Outbox's connect
+
+    Parameters
+    ----------
+    host : str
+        The address of the SMTP server.
+    port : int
+        The port of the SMTP server, usually 465 with SSL.
+    sender : str
+        The email address to log in with, no login is done if None, such as for a local test server.
+    password : str
+        The password to log in with.
+    use_ssl : bool
+        If True, the connection uses SSL from the start, otherwise it is plain SMTP.
+    timeout : float
+        The most seconds to wait on the server.
+
+    Returns
+    -------
+    function
+        Opens and returns a connected smtplib.SMTP.
+    """
+    def connect():
+        if use_ssl:
+            server = smtplib.SMTP_SSL(host, port, timeout=timeout, context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(host, port, timeout=timeout)
+        if sender is not None:
+            server.login(sender, password)
+        return server
+
+    return connect
+
+
+class Outbox:
+    """
+    The Outbox class sends emails from a background thread, so sending one never holds up a request. Messages are
+    stored in a SQLite file until they have been sent, so nothing is lost if the website restarts. The sender keeps one
+    logged in connection open while there are messages to send, sending them in batches, and any message that fails is
+    tried again later, waiting twice as long after every failure.
+
+    Parameters
+    ----------
+    filepath : str
+        The SQLite file the messages are stored in, it is made if it doesn't exist.
+    connect : function
+        Opens and returns a logged in connection with a sendmail() method, see smtp_connect().
+    sender : str
+        The email address messages are sent from.
+    batch_size : int
+        The most messages sent at a time before checking for new ones.
+    retries : int
+        The most times a failed message is tried again before it is given up on.
+    backoff : float
+        The number of seconds waited before the first retry of a message.
+    idle : float
+        The number of seconds the connection is kept open with nothing to send before it is closed.
+    """
+    __slots__ = ('__connect', '__sender', '__batch_size', '__retries', '__backoff', '__idle', '__db', '__lock',
+                 '__server', '__last_used', '__wake', '__running', '__thread')
+
+    def __init__(self, filepath, connect, sender, batch_size=20, retries=5, backoff=30, idle=60):
+        self.__connect = connect
+        self.__sender = sender
+        self.__batch_size = batch_size
+        self.__retries = retries
+        self.__backoff = backoff
+        self.__idle = idle
+        # Shared by the sender thread and every request, so it is only used while holding the lock
+        self.__db = sqlite3.connect(filepath, timeout=10, check_same_thread=False)
+        self.__db.execute(CREATE_TABLE)
+        self.__db.execute(CREATE_INDEX)
+        # A message being sent when the website stopped is sent again
+        self.__db.execute("UPDATE Outbox SET status = 'queued' WHERE status = 'sending'")
+        self.__db.commit()
+        self.__lock = threading.Lock()
+        self.__server = None
+        self.__last_used = 0
+        self.__wake = threading.Event()
+        self.__running = False
+        self.__thread = None
+
+    def send(self, receiver, message):
+        """
+        Adds a message to the outbox, it is sent by the background thread once start() has been called
+
+        Parameters
+        ----------
+        receiver : str
+            The email address to send to.
+        message : str
+            The whole message, including its Subject header.
+
+        Returns
+        -------
+        int
+            The message's id, see get_status().
+        """
+        with self.__lock:
+            cursor = self.__db.execute("INSERT INTO Outbox (receiver, message, next_try) VALUES (?, ?, ?)",
+                                       (receiver, message, time.time()))
+            self.__db.commit()
+        self.__wake.set()
+        return cursor.lastrowid
+
+    def get_status(self, message_id):
+        """
+        Parameters
+        ----------
+        message_id : int
+            The id given by send().
+
+        Returns
+        -------
+        dict
+            'status' is one of 'queued', 'sending', 'sent' or 'failed'.
+            'attempts' is the number of times sending the message has failed.
+            'error' is the reason it last failed, otherwise None.
+            None is returned instead if no message has the given id.
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT status, attempts, error FROM Outbox WHERE message_id = ?",
+                                    (message_id,)).fetchone()
+        if row is None:
+            return None
+        return {'status': row[0], 'attempts': row[1], 'error': row[2]}
+
+    def get_waiting(self):
+        """
+        Returns
+        -------
+        int
+            The number of messages that haven't been sent or given up on yet.
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT COUNT(*) FROM Outbox WHERE status IN ('queued', 'sending')").fetchone()
+        return row[0]
+
+    def __take_due(self):
+        """
+        Marks the next batch of messages that are due as being sent, and returns their (id, receiver, message, attempts)
+        """
+        with self.__lock:
+            rows = self.__db.execute("SELECT message_id, receiver, message, attempts FROM Outbox WHERE status = "
+                                     "'queued' AND next_try <= ? ORDER BY next_try LIMIT ?",
+                                     (time.time(), self.__batch_size)).fetchall()
+            self.__db.executemany("UPDATE Outbox SET status = 'sending' WHERE message_id = ?",
+                                  [(r[0],) for r in rows])
+            self.__db.commit()
+        return rows
+
+    def __finish(self, message_id, attempts, error=None, permanent=False):
+        with self.__lock:
+            if error is None:
+                # The message itself is no longer needed once it has been sent
+                self.__db.execute("UPDATE Outbox SET status = 'sent', message = NULL, error = NULL "
+                                  "WHERE message_id = ?", (message_id,))
+            elif permanent or attempts > self.__retries:
+                self.__db.execute("UPDATE Outbox SET status = 'failed', attempts = ?, error = ? WHERE message_id = ?",
+                                  (attempts, error, message_id))
+            else:
+                self.__db.execute("UPDATE Outbox SET status = 'queued', attempts = ?, error = ?, next_try = ? "
+                                  "WHERE message_id = ?",
+                                  (attempts, error, time.time() + self.__backoff * (2 ** (attempts - 1)), message_id))
+            self.__db.commit()
+
+    def __send_one(self, receiver, message):
+        """
+        Sends a message over the open connection, opening one first if needed. If a connection that had already been
+        used was dropped by the server, the message is sent again on a new connection.
+        """
+        reused = self.__server is not None
+        if not reused:
+            self.__server = self.__connect()
+        try:
+            self.__server.sendmail(self.__sender, receiver, message)
+        except DROPPED_ERRORS:
+            self.__close_server()
+            if not reused:
+                raise
+            self.__server = self.__connect()
+            self.__server.sendmail(self.__sender, receiver, message)
+        self.__last_used = time.time()
+
+    def __close_server(self):
+        if self.__server is None:
+            return
+        try:
+            self.__server.quit()
+        except Exception:
+            pass
+        self.__server = None
+
+    def send_pending(self):
+        """
+        Sends the next batch of messages that are due, this is called by the background thread but can also be called
+        directly while it isn't running
+
+        Returns
+        -------
+        int
+            The number of messages that were sent.
+        """
+        sent = 0
+        for message_id, receiver, message, attempts in self.__take_due():
+            try:
+                self.__send_one(receiver, message)
+            except PERMANENT_ERRORS as e:
+                self.__finish(message_id, attempts + 1, str(e), permanent=True)
+                continue
+            except Exception as e:
+                # The connection may be in any state, so a new one is opened for the next message
+                self.__close_server()
+                self.__finish(message_id, attempts + 1, str(e) or type(e).__name__)
+                continue
+            self.__finish(message_id, attempts)
+            sent += 1
+        return sent
+
+    def __get_wait(self):
+        """
+        Returns the number of seconds until the next message is due, or None if there are none
+        """
+        with self.__lock:
+            row = self.__db.execute("SELECT MIN(next_try) FROM Outbox WHERE status = 'queued'").fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0)
+
+    def __run(self):
+        while self.__running:
+            try:
+                if self.send_pending() > 0:
+                    continue
+            except Exception:
+                traceback.print_exc()
+
+            wait = self.__get_wait()
+            if self.__server is not None:
+                idle = self.__last_used + self.__idle - time.time()
+                if idle <= 0:
+                    self.__close_server()
+                else:
+                    wait = idle if wait is None else min(wait, idle)
+            self.__wake.wait(wait)
+            self.__wake.clear()
+        self.__close_server()
+
+    def start(self):
+        """
+        Starts the background thread that sends messages, nothing is sent until this is called.
+        """
+        if self.__running:
+            return
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='outbox', daemon=True)
+        self.__thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the background thread once it has finished the batch it is sending, any messages left are sent after
+        the next start().
+
+        Parameters
+        ----------
+        timeout : float
+            The most seconds to wait for the thread to stop, waits forever if not given.
+        """
+        if not self.__running:
+            return
+        self.__running = False
+        self.__wake.set()
+        self.__thread.join(timeout)
+        self.__thread = None
@@ -1,11 +1,13 @@
 from abc import ABC, abstractmethod
-from keras.layers import LSTM, Dense, Embedding, GlobalMaxPooling1D
+from keras.layers import LSTM, Dense, Embedding, GlobalMaxPooling1D, Input
 from keras.models import Sequential
+from keras.models import Model as KerasModel
 from keras.preprocessing.text import Tokenizer
 from keras.preprocessing.sequence import pad_sequences
 import numpy as np
 import pandas
 import os
+import embedding_store
 import score_model_helper
 from sklearn.model_selection import KFold
 
@@ -15,7 +17,10 @@ class Model(ABC):
     The Model class is an abstract class that should NOT be initialized, but only used to define the variables and
     functions used by the other model classes.
     """
-    __slots__ = ('_tokenizer', '_model', '_vocab_size', '_filepath', '_embedding', '__data_path')
+    # Names of the columns in y that the model is trained to predict, see train_and_test()
+    _outputs = ['normal']
+    __slots__ = ('_tokenizer', '_model', '_vocab_size', '_filepath', '_embedding', '_weights_mtime', '_fingerprint',
+                 '__data_path')
 
     def __init__(self):
         self._tokenizer = Tokenizer()
@@ -23,6 +28,8 @@ class Model(ABC):
         self._vocab_size = None
         self._filepath = None
         self._embedding = None
+        self._weights_mtime = None
+        self._fingerprint = None
         self.__data_path = None
 
     @abstractmethod
@@ -48,6 +55,18 @@ class Model(ABC):
         """
         return self._embedding
 
+    def get_fingerprint(self):
+        """
+        Returns
+        -------
+        str
+            A fingerprint of the model's vocabulary, models with the same fingerprint turn essays into the same
+            sequences and share an embedding matrix.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = embedding_store.get_fingerprint(self._tokenizer.word_index, self._vocab_size)
+        return self._fingerprint
+
     def train_and_test(self, x, y, n_splits, epochs):
         """
         Trains the model so it can be used to evaluate essays. The model's filepath will be used to save the
@@ -60,7 +79,7 @@ class Model(ABC):
             Should be a dataframe containing a 'essay' column to train the model with.
         y : pandas.Dataframe
             Should be a dataframe with the same indexes as x and a 'normal' column whose type is float32, being between
-            0.0 and 1.0.
+            0.0 and 1.0. Models with multiple outputs, such as FusedModel, need a column for each output instead.
         n_splits : int
             How many folds the model will train for.
         epochs : int
@@ -80,8 +99,11 @@ class Model(ABC):
         if set(x.index.values) != set(y.index.values):
             return False
 
-        if 'essay' not in x.keys() or 'normal' not in y.keys():
+        if 'essay' not in x.keys():
             return False
+        for o in self._outputs:
+            if o not in y.keys():
+                return False
 
         count = 1
         # Using the "split" function, we split the training data into
@@ -113,14 +135,19 @@ class Model(ABC):
             x_test_seq = np.array(x_test_seq)
 
             # Train LSTM model
-            self._model.fit(x_train_seq, y_train.loc[:, 'normal'].values, batch_size=128, epochs=epochs)
+            y_train_values = [y_train.loc[:, o].values for o in self._outputs]
+            if len(y_train_values) == 1:
+                y_train_values = y_train_values[0]
+            self._model.fit(x_train_seq, y_train_values, batch_size=128, epochs=epochs)
 
-            # Test LSTM model on test data
+            # Test LSTM model on test data, only the first output is reported on for models with multiple outputs
             y_pred = self._model.predict(x_test_seq)
+            if len(self._outputs) > 1:
+                y_pred = y_pred[0]
 
             j = 0
             for i in y_test.index.values:
-                differance = abs(y_test.loc[i, 'normal'] - y_pred[0])
+                differance = abs(y_test.loc[i, self._outputs[0]] - y_pred[0])
                 j += 1
                 t += 1
                 if differance < 0.15:
@@ -137,10 +164,60 @@ class Model(ABC):
             # Save the final iteration of the trained model
             if count == n_splits:
                 self._model.save(self._filepath)
+                self._weights_mtime = os.path.getmtime(self._filepath)
 
             count += 1
         return True
 
+    def reload_weights(self):
+        """
+        Loads the model's weights from its filepath, replacing the weights currently in use.
+
+        Returns
+        -------
+        bool
+            True if the weights were loaded, otherwise False, most likely due to the model never being trained.
+        """
+        if not os.path.exists(self._filepath):
+            return False
+
+        mtime = os.path.getmtime(self._filepath)
+        self._model.load_weights(self._filepath)
+        self._weights_mtime = mtime
+        return True
+
+    def get_weights_version(self):
+        """
+        Returns
+        -------
+        float
+            The modification time of the model's weights file, which changes whenever the model is retrained. None if
+            the model has no weights yet.
+        """
+        try:
+            return os.path.getmtime(self._filepath)
+        except OSError:
+            return self._weights_mtime
+
+    def _refresh_weights(self):
+        """
+        Reloads the model's weights only if the file has been changed since they were last loaded, such as by another
+        process retraining the model.
+
+        Returns
+        -------
+        bool
+            True if the model has weights to evaluate with, otherwise False.
+        """
+        try:
+            mtime = os.path.getmtime(self._filepath)
+        except OSError:
+            # Keep using the weights in memory if the file has been removed since
+            return self._weights_mtime is not None
+        if mtime != self._weights_mtime:
+            return self.reload_weights()
+        return True
+
     def evaluate(self, essay):
         """
         Returns a score between 0.0 and 1.0 for the essay. If the model's weights can't be found, the model will
@@ -155,40 +232,49 @@ class Model(ABC):
         -------
         A float32 between 0.0 and 1.0
         """
-        text_arr = score_model_helper.preprocess(essay, self._tokenizer)
+        return self.evaluate_batch([essay])[0]
+
+    def evaluate_batch(self, essays):
+        """
+        Returns a score between 0.0 and 1.0 for every essay, running a single prediction over all of them. If the
+        model's weights can't be found, the model will automatically be built from the given data.
+
+        Parameters
+        ----------
+        essays : list of str or score_model_helper.EssayBatch
+            Should be the essay texts you want to evaluate. Giving the same EssayBatch to multiple models means each
+            essay is only tokenized once.
+
+        Returns
+        -------
+        numpy.ndarray
+            A float32 between 0.0 and 1.0 for every essay, in the same order as given. Models with multiple outputs,
+            such as FusedModel, return a row with every output for each essay instead.
+        """
+        if len(essays) == 0:
+            return np.empty(0, dtype='float32')
+        if not isinstance(essays, score_model_helper.EssayBatch):
+            essays = score_model_helper.EssayBatch(essays)
+
+        text_arr = essays.get_sequences(self._tokenizer, self.get_fingerprint())
         text_arr = np.asarray(text_arr)
-        if os.path.exists(self._filepath):
-            self._model.load_weights(self._filepath)  # Get weights from trained model
-            return self._model.predict(text_arr)[0, 0]  # Predict score of input essay
-        else:
+        if not self._refresh_weights():
             self.load_data()
-            return self._model.predict(text_arr)[0, 0]
+        prediction = self._model.predict(text_arr)  # Predict score of every input essay
+        if len(self._outputs) > 1:
+            return np.hstack(prediction)
+        return prediction[:, 0]
 
     def get_embedding_matrix(self, filepath):
         """
         Returns
         -------
         numpy.ndarray
-            An embedding matrix that matches the vocabulary size of the model. This function does take a long time to
-            load, so reduce the calls to it when possible.
+            An embedding matrix that matches the vocabulary size of the model. The first call for a GloVe file converts
+            it into a binary store next to it (see embedding_store.py), every call after that only memory-maps the
+            store and gathers the rows needed by the model's vocabulary.
         """
-        embeddings_index = {}
-
-        f = open(filepath, encoding='utf8')
-        for line in f:
-            values = line.split()
-            word = values[0]
-            coefs = np.asarray(values[1:], dtype='float32')
-            embeddings_index[word] = coefs
-        f.close()
-
-        embedding_matrix = np.zeros((self._vocab_size, 300))
-        for word, i in self._tokenizer.word_index.items():
-            embedding_vector = embeddings_index.get(word)
-            if embedding_vector is not None:
-                embedding_matrix[i] = embedding_vector
-
-        return embedding_matrix
+        return embedding_store.get_embedding_matrix(filepath, self._tokenizer.word_index, self._vocab_size)
 
 
 class ScoreModel(Model):
@@ -211,7 +297,7 @@ class ScoreModel(Model):
 
     def __init__(self, filepath, data_path, embedding_path, embedding=None):
         super().__init__()
-        self._tokenizer.fit_on_texts(score_model_helper.get_dataframe(data_path)['essay'])
+        self._tokenizer = score_model_helper.get_tokenizer(data_path, filepath)
         self._vocab_size = len(self._tokenizer.word_index) + 1
 
         if embedding is None:
@@ -227,6 +313,7 @@ class ScoreModel(Model):
         self._model.compile(loss='mean_squared_error', optimizer='adam', metrics=['mae', 'mape', 'mse'])
         self._filepath = filepath
         self.__data_path = data_path
+        self.reload_weights()  # Weights are only read again if the file changes, see _refresh_weights()
 
     def load_data(self, filepath=None):
         """
@@ -294,7 +381,7 @@ class IdeaModel(Model):
 
     def __init__(self, filepath, data_path, embedding_path, embedding=None):
         super().__init__()
-        self._tokenizer.fit_on_texts(score_model_helper.get_dataframe(data_path)['essay'])
+        self._tokenizer = score_model_helper.get_tokenizer(data_path, filepath)
         self._vocab_size = len(self._tokenizer.word_index) + 1
         if embedding is None:
             self._embedding = self.get_embedding_matrix(embedding_path)
@@ -308,6 +395,7 @@ class IdeaModel(Model):
         self._model.compile(loss='mean_squared_error', optimizer='adam', metrics=['mae', 'mape', 'mse'])
         self._filepath = filepath
         self.__data_path = data_path
+        self.reload_weights()  # Weights are only read again if the file changes, see _refresh_weights()
 
     def load_data(self, filepath=None):
         """
@@ -368,7 +456,7 @@ class OrganizationModel(Model):
 
     def __init__(self, filepath, data_path, embedding_path, embedding=None):
         super().__init__()
-        self._tokenizer.fit_on_texts(score_model_helper.get_dataframe(data_path)['essay'])
+        self._tokenizer = score_model_helper.get_tokenizer(data_path, filepath)
         self._vocab_size = len(self._tokenizer.word_index) + 1
         if embedding is None:
             self._embedding = self.get_embedding_matrix(embedding_path)
@@ -382,6 +470,7 @@ class OrganizationModel(Model):
         self._model.compile(loss='mean_squared_error', optimizer='adam', metrics=['mae', 'mape', 'mse'])
         self._filepath = filepath
         self.__data_path = data_path
+        self.reload_weights()  # Weights are only read again if the file changes, see _refresh_weights()
 
     def load_data(self, filepath=None):
         """
@@ -442,7 +531,7 @@ class StyleModel(Model):
 
     def __init__(self, filepath, data_path, embedding_path, embedding=None):
         super().__init__()
-        self._tokenizer.fit_on_texts(score_model_helper.get_dataframe(data_path)['essay'])
+        self._tokenizer = score_model_helper.get_tokenizer(data_path, filepath)
         self._vocab_size = len(self._tokenizer.word_index) + 1
         if embedding is None:
             self._embedding = self.get_embedding_matrix(embedding_path)
@@ -456,6 +545,7 @@ class StyleModel(Model):
         self._model.compile(loss='mean_squared_error', optimizer='adam', metrics=['mae', 'mape', 'mse'])
         self._filepath = filepath
         self.__data_path = data_path
+        self.reload_weights()  # Weights are only read again if the file changes, see _refresh_weights()
 
     def load_data(self, filepath=None):
         """
@@ -495,6 +585,126 @@ class StyleModel(Model):
         return self.train_and_test(x, y, 8, 4)
 
 
+def normalize_score(set_number, score):
+    """
+    Returns the given domain1_score normalized to be between 0.0 and 1.0, in the same way as ScoreModel
+
+    Parameters
+    ----------
+    set_number : int
+        The essay_set the score was given in, between 1 and 8.
+    score : int
+        The domain1_score of the essay.
+
+    Returns
+    -------
+    float
+        The normalized score.
+    """
+    offset, scale = {1: (2, 10), 2: (1, 5), 3: (0, 3), 4: (0, 3), 5: (0, 4), 6: (0, 4), 7: (0, 30),
+                     8: (0, 60)}[set_number]
+    return (score - offset) / scale
+
+
+def normalize_comment(comment):
+    """
+    Returns the given comment code as a number, in the same way as IdeaModel, OrganizationModel and StyleModel
+
+    Parameters
+    ----------
+    comment : str
+        One part of the 'comments' column, such as 'ID1', 'ORG2' or 'STY3'.
+
+    Returns
+    -------
+    float
+        Either 0.0, 0.5 or 1.0.
+    """
+    if comment.find('1') != -1:
+        return 0.0
+    if comment.find('2') != -1:
+        return 0.5
+    return 1.0
+
+
+class FusedModel(Model):
+    """
+    The FusedModel class combines the score, idea, organization and style models into a single model. Each essay is
+    embedded and run through one LSTM, which then feeds a separate head for each of the four outputs. Evaluating an
+    essay gives all four scores at roughly the cost of evaluating one of the separate models.
+
+    Parameters
+    ----------
+    filepath : str
+        A filepath to where the model weights will be loaded and saved.
+    data_path : str
+        A filepath to where the training data to build the model is located. As every output is trained together, the
+        data needs both a 'domain1_score' and a 'comments' column, such as comment_set.tsv.
+    embedding_path : str
+        A filepath to where the glove.6B.300D.txt is located
+    embedding : numpy.ndarray
+        Only provide if you have already generated an embedding matrix of the same vocabulary size beforehand.
+    """
+    _outputs = ['score', 'idea', 'organization', 'style']
+
+    def __init__(self, filepath, data_path, embedding_path, embedding=None):
+        super().__init__()
+        self._tokenizer = score_model_helper.get_tokenizer(data_path, filepath)
+        self._vocab_size = len(self._tokenizer.word_index) + 1
+        if embedding is None:
+            self._embedding = self.get_embedding_matrix(embedding_path)
+        else:
+            self._embedding = embedding
+
+        inputs = Input(shape=(200,))
+        shared = Embedding(self._vocab_size, 300, weights=[self._embedding], input_length=200,
+                           trainable=False)(inputs)
+        shared = LSTM(128, dropout=0.3, return_sequences=True)(shared)
+        shared = GlobalMaxPooling1D()(shared)
+        outputs = []
+        for name in self._outputs:
+            head = Dense(64, activation='relu')(shared)
+            outputs.append(Dense(1, activation='sigmoid', name=name)(head))
+        self._model = KerasModel(inputs=inputs, outputs=outputs)
+        self._model.compile(loss='mean_squared_error', optimizer='adam', metrics=['mae', 'mape', 'mse'])
+        self._filepath = filepath
+        self.__data_path = data_path
+        self.reload_weights()  # Weights are only read again if the file changes, see _refresh_weights()
+
+    def load_data(self, filepath=None):
+        """
+        Loads the data into the fused model, and then initiates model training
+
+        Parameters
+        ----------
+        filepath : str
+            Should be a filepath to a .csv file with an 'essay_id', 'essay_set', 'essay', 'domain1_score' and 'comments'
+            column, where the 'comments' column should contain 'ID#,ORG#,STY#', where the # is either 1, 2, or 3. If not
+            provided, then the default filepath will be used in its place if one exists.
+
+        Returns
+        -------
+        bool
+            True if the model training was successful, otherwise False.
+        """
+        y = pandas.DataFrame(np.empty(0, dtype=[('essay_id', 'int'), ('score', 'float32'), ('idea', 'float32'),
+                                                ('organization', 'float32'), ('style', 'float32')]))
+
+        if filepath is not None:
+            self.__data_path = filepath
+        x = score_model_helper.get_dataframe(self.__data_path)  # Training data
+
+        for i in x.index.values:
+            comments = x.loc[i, 'comments'].split(',')
+            y.loc[i, 'essay_id'] = x.loc[i, 'essay_id']
+            y.loc[i, 'score'] = normalize_score(x.loc[i, 'essay_set'], x.loc[i, 'domain1_score'])
+            y.loc[i, 'idea'] = normalize_comment(comments[0])
+            y.loc[i, 'organization'] = normalize_comment(comments[1])
+            y.loc[i, 'style'] = normalize_comment(comments[2])
+
+        return self.train_and_test(x, y, 4, 4)
+
+
 # If you want to run this program specifically, you can put the appropriate
 # code into this main() function.
 def main():
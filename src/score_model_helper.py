@@ -1,9 +1,17 @@
 from keras.preprocessing.sequence import pad_sequences
+from keras.preprocessing.text import Tokenizer, tokenizer_from_json
 from nltk.tokenize import word_tokenize
+import cache
+import json
 import numpy as np
+import os
 import pandas as pd
 import pickle
 import preprocessing
+import threading
+
+# Increase whenever the way tokenizers are fit changes, so every saved tokenizer is refit
+TOKENIZER_VERSION = 1
 
 
 def get_dataframe(data_loc):
@@ -78,4 +86,181 @@ def preprocess(text_raw, tk):
     text_tokenized = word_tokenize(text_raw)
     text_encoded = tk.texts_to_sequences([text_tokenized])
     text_array = pad_sequences(text_encoded, maxlen=200, padding='post')
-    return text_array
\ No newline at end of file
+    return text_array
+
+
+def preprocess_batch(texts_raw, tk, texts_tokenized=None):
+    """
+    The same as preprocess(), except every essay in the list is padded into one array so they can all be evaluated with
+    a single prediction.
+
+    Parameters
+    ----------
+    texts_raw : list of str
+        The raw essays
+    tk : Tokenizer
+        A tokenizer from the Keras preprocessing package
+    texts_tokenized : list of list of str
+        The essays already split into tokens by word_tokenize, if given then texts_raw won't be tokenized again
+
+    Returns
+    -------
+    text_array : numpy.ndarray
+        An array with one row of 200 integers for every essay
+    """
+    if texts_tokenized is None:
+        texts_tokenized = [word_tokenize(text_raw) for text_raw in texts_raw]
+    texts_encoded = tk.texts_to_sequences(texts_tokenized)
+    text_array = pad_sequences(texts_encoded, maxlen=200, padding='post')
+    return text_array
+
+
+class EssayBatch:
+    """
+    The EssayBatch class holds the preprocessing of a list of essays that is shared between models. Every essay is only
+    split into tokens once, and each model's tokenizer then maps those tokens to its own sequences. Models with the
+    same vocabulary share the sequences as well.
+
+    Parameters
+    ----------
+    texts_raw : list of str
+        The raw essays
+    """
+    __slots__ = ('__texts', '__tokens', '__sequences')
+
+    def __init__(self, texts_raw):
+        self.__texts = list(texts_raw)
+        self.__tokens = None
+        self.__sequences = {}
+
+    def __len__(self):
+        return len(self.__texts)
+
+    def get_texts(self):
+        """
+        Returns
+        -------
+        list of str
+            The raw essays.
+        """
+        return self.__texts
+
+    def get_tokens(self):
+        """
+        Returns
+        -------
+        list of list of str
+            Every essay split into tokens by word_tokenize, which only happens on the first call.
+        """
+        if self.__tokens is None:
+            self.__tokens = [word_tokenize(text_raw) for text_raw in self.__texts]
+        return self.__tokens
+
+    def get_sequences(self, tk, key=None):
+        """
+        Returns the padded sequences of every essay for the given tokenizer
+
+        Parameters
+        ----------
+        tk : Tokenizer
+            A tokenizer from the Keras preprocessing package
+        key : str
+            Identifies the tokenizer's vocabulary, such as a fingerprint from embedding_store.get_fingerprint(). If
+            given, the sequences are kept and reused for any tokenizer with the same key.
+
+        Returns
+        -------
+        text_array : numpy.ndarray
+            An array with one row of 200 integers for every essay
+        """
+        if key is not None and key in self.__sequences:
+            return self.__sequences[key]
+
+        text_array = preprocess_batch(self.__texts, tk, self.get_tokens())
+        if key is not None:
+            self.__sequences[key] = text_array
+        return text_array
+
+
+def get_tokenizer_path(filepath):
+    """
+    Returns the filepath a model's tokenizer is saved at, which is right next to the model's weights
+
+    Parameters
+    ----------
+    filepath : str
+        Filepath of the model's weights, such as model_weights/final_lstm.h5
+
+    Returns
+    -------
+    str
+        The same filepath, but ending in _tokenizer.json instead
+    """
+    return os.path.splitext(filepath)[0] + '_tokenizer.json'
+
+
+def get_tokenizer(data_loc, filepath):
+    """
+    Returns a tokenizer fit on the essays of the given data file. The fit tokenizer is saved next to the model's weights
+    along with a hash of the data file, so the data file is only read and fit again when it has actually changed.
+
+    Parameters
+    ----------
+    data_loc : str
+        Filepath of data file
+    filepath : str
+        Filepath of the model's weights
+
+    Returns
+    -------
+    tk : Tokenizer
+        A tokenizer from the Keras preprocessing package
+
+    Raises
+    ------
+    FileNotFoundError
+        Neither the data file nor a saved tokenizer could be found.
+    """
+    tokenizer_path = get_tokenizer_path(filepath)
+    saved = None
+    try:
+        with open(tokenizer_path, encoding='utf8') as f:
+            saved = json.loads(f.read())
+        if saved['version'] != TOKENIZER_VERSION:
+            saved = None
+    except (OSError, ValueError, KeyError):
+        saved = None
+
+    # Without the data file there is nothing to check against, so trust the saved tokenizer
+    if not os.path.exists(data_loc):
+        if saved is not None:
+            return tokenizer_from_json(saved['tokenizer'])
+        raise FileNotFoundError(str(data_loc) + " not found")
+
+    # The size and modification time are checked first so the data file doesn't need to be hashed every time
+    stat = os.stat(data_loc)
+    if saved is not None and saved['size'] == stat.st_size and saved['mtime'] == stat.st_mtime:
+        return tokenizer_from_json(saved['tokenizer'])
+    data_hash = cache.get_file_key(data_loc)
+    if saved is not None and saved['hash'] == data_hash:
+        tk = tokenizer_from_json(saved['tokenizer'])
+    else:
+        tk = Tokenizer()
+        tk.fit_on_texts(get_dataframe(data_loc)['essay'])
+
+    saved = {'version': TOKENIZER_VERSION, 'hash': data_hash, 'size': stat.st_size, 'mtime': stat.st_mtime,
+             'tokenizer': tk.to_json()}
+    # Failing to save only means the tokenizer will be fit again next time
+    try:
+        directory = os.path.dirname(tokenizer_path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        # Every process and thread writes its own temp file, so ones fitting at the same time never mix their writes
+        temp = tokenizer_path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        with open(temp, 'w', encoding='utf8') as f:
+            f.write(json.dumps(saved))
+        os.replace(temp, tokenizer_path)
+    except OSError:
+        pass
+
+    return tk
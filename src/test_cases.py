@@ -1,10 +1,40 @@
+import bulk_grade
+import cache
+import database
+import embedding_store
+import file_store
 import format
+import format_rules
 import grammar_check
+import json
 import os
+import pandas
+import outbox
+import queue
+import re
+import shutil
+import smtplib
+import sqlite3
+import sys
+import time
 import unittest
+import unittest.mock
+import zipfile
 from json import JSONDecodeError
 from keywords import KeyWords
 from zipfile import BadZipFile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Interface'))
+import jobs
+try:
+    import score_model_helper
+except ImportError:
+    # Needs keras
+    score_model_helper = None
+try:
+    import grade
+except ImportError:
+    # Needs keras and pdfminer
+    grade = None
 # from score_model import Model, ScoreModel, IdeaModel, OrganizationModel, StyleModel
 # from grade import Grade
 
@@ -34,6 +64,52 @@ ways they exercise your mind and hands and help you learn and make things easier
         self.assertEqual(grammar_check.number_of_errors("exrcise"), ([("exrcise", "exercise")], "exercise"),
                          "grammar_check.py give incorrect return for a single correct word.")
 
+    def test_incremental_normal(self):
+        text = "They help you stay in touch with family in a couple different ways they excercise your mind and hands \
+and help you learn and make things easier. Computers are great."
+        self.assertEqual(grammar_check.number_of_errors(text, incremental=True), grammar_check.number_of_errors(text),
+                         "grammar_check.py's incremental mode doesn't match the regular check.")
+
+    def test_apply_corrections(self):
+        self.assertEqual(grammar_check.apply_corrections("teh cat sat", [(8, 3, "sits"), (0, 3, "the")]),
+                         ("the cat sits", [(0, 3), (8, 12)]), "grammar_check.py applied corrections incorrectly.")
+
+    def test_pool_size_error(self):
+        with self.assertRaises(ValueError):
+            grammar_check.ToolPool(0)
+
+    def test_pool_close_checked_out(self):
+        class Tool:
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        pool = grammar_check.ToolPool(1)
+        tool = Tool()
+        pool.close()
+        pool.checkin(tool)
+        self.assertTrue(tool.closed, "grammar_check.py didn't close an instance checked in after the pool closed.")
+
+    def test_pool_checkout(self):
+        tool = grammar_check.pool.checkout()
+        self.assertTrue(grammar_check.is_alive(tool), "grammar_check.py checked out a dead LanguageTool instance.")
+        grammar_check.pool.checkin(tool)
+
+    def test_paragraphs(self):
+        self.assertEqual(grammar_check.get_paragraphs("One. Two?\n\nThree"), [(0, 9), (11, 16)],
+                         "grammar_check.py split paragraphs incorrectly.")
+
+    def test_paragraphs_abbreviation(self):
+        text = "Studies by Dr. Smith show gains, e.g. in raeding. Tests agree.\nMore work is needed."
+        self.assertEqual(grammar_check.get_paragraphs(text), [(0, 62), (63, 83)],
+                         "grammar_check.py split a paragraph at an abbreviation.")
+
+    def test_incremental_abbreviation(self):
+        text = "Studies by Dr. Smith show gains, e.g. in raeding. Tests agree."
+        self.assertEqual(grammar_check.number_of_errors(text, incremental=True), grammar_check.number_of_errors(text),
+                         "grammar_check.py's incremental mode doesn't match the regular check after an abbreviation.")
+
 
 class KeyWordUnit(unittest.TestCase):
     def setUp(self):
@@ -214,6 +290,565 @@ class FormatUnit(unittest.TestCase):
         f = format.Format(FILEPATH + 'mixed_margin.docx')
         self.assertEqual(f.get_margin(), 1.25, "format couldn't correctly calculate margin score")
 
+    def test_font_usage(self):
+        f = format.Format(FILEPATH + 'multiple_font.docx')
+        usage = f.get_font_usage()
+        self.assertEqual(list(usage.keys()), f.get_font(), "format gave usage for the wrong fonts.")
+        self.assertEqual(sum(usage.values()), sum([len(p) for p in f.get_paragraphs()]),
+                         "format didn't count every character's font.")
+
+    def test_spacing_usage(self):
+        f = format.Format(FILEPATH + 'multiple_spacing.docx')
+        usage = f.get_spacing_usage()
+        self.assertEqual(list(usage.keys()), f.get_spacing(), "format gave usage for the wrong spacing.")
+        self.assertEqual(sum(usage.values()), sum([len(p) for p in f.get_paragraphs()]),
+                         "format didn't count every character's spacing.")
+
+    def test_paragraphs(self):
+        f = format.Format(FILEPATH + 'multiple_spacing.docx')
+        self.assertGreater(len(f.get_paragraphs()), 1, "format didn't split the text into paragraphs.")
+        self.assertEqual(f.get_text(), '\n'.join(f.get_paragraphs()), "format didn't put each paragraph on a line.")
+        self.assertEqual(list(format.iter_paragraphs(FILEPATH + 'multiple_spacing.docx')), f.get_paragraphs(),
+                         "iter_paragraphs gave different paragraphs than format.")
+
+    def test_text_box(self):
+        # A text box is stored twice, the copy in mc:Fallback is for older versions of Word
+        box = ('<w:p><w:r><w:t>Before box</w:t></w:r><w:r><mc:AlternateContent xmlns:mc="http://schemas.openxmlformats.'
+               'org/markup-compatibility/2006"><mc:Choice Requires="wps"><w:drawing><w:txbxContent><w:p><w:pPr>'
+               '<w:ind w:firstLine="720"/></w:pPr><w:r><w:t>Inside box</w:t></w:r></w:p></w:txbxContent></w:drawing>'
+               '</mc:Choice><mc:Fallback><w:pict><w:txbxContent><w:p><w:pPr><w:ind w:firstLine="720"/></w:pPr><w:r>'
+               '<w:t>Inside box</w:t></w:r></w:p></w:txbxContent></w:pict></mc:Fallback></mc:AlternateContent></w:r>'
+               '</w:p>')
+        with zipfile.ZipFile(FILEPATH + 'single_font.docx') as source, zipfile.ZipFile('./box.docx', 'w') as target:
+            for item in source.infolist():
+                data = source.read(item.filename)
+                if item.filename == 'word/document.xml':
+                    data = re.sub(r'<w:body>.*?(<w:sectPr)', lambda m: '<w:body>' + box + m.group(1),
+                                  data.decode('utf8'), flags=re.S).encode('utf8')
+                target.writestr(item, data)
+        try:
+            f = format.Format('./box.docx')
+            self.assertEqual(f.get_paragraphs(), ['Before box', 'Inside box'], "format read the text box wrong.")
+            self.assertEqual(list(format.iter_paragraphs('./box.docx')), f.get_paragraphs(),
+                             "iter_paragraphs gave different paragraphs than format.")
+            # Both copies of the indented paragraph are counted, along with the paragraph holding the box
+            self.assertAlmostEqual(f.get_indentation(), 2 / 3, msg="format counted the wrong paragraphs for indent.")
+            self.assertEqual(f.get_margin(), 0.0, "format couldn't correctly calculate margin score")
+        finally:
+            os.remove('./box.docx')
+
+    def test_format_cache(self):
+        shutil.copy(FILEPATH + 'single_font.docx', './copy.docx')
+        try:
+            documents = format.FormatCache(2)
+            word = documents.get(FILEPATH + 'single_font.docx')
+            self.assertIs(documents.get('./copy.docx'), word, "format cache read the same file twice.")
+            self.assertEqual(word.get_text(), format.Format('./copy.docx').get_text(),
+                             "format cache gave a different text.")
+            documents.get(FILEPATH + 'multiple_font.docx')
+            documents.get(FILEPATH + 'multiple_spacing.docx')
+            self.assertEqual(len(documents), 2, "format cache kept too many files.")
+        finally:
+            os.remove('./copy.docx')
+
+    def test_facts(self):
+        f = format.Format(FILEPATH + 'single_font.docx')
+        facts = f.get_facts()
+        self.assertEqual(facts['font'], f.get_font(), "format gave facts that don't match get_font().")
+        self.assertEqual(facts['default_style'], f.get_default_style(),
+                         "format gave facts that don't match get_default_style().")
+
+
+class FormatRulesUnit(unittest.TestCase):
+    def setUp(self):
+        self.word = format.Format(FILEPATH + 'multiple_font.docx')
+        self.facts = self.word.get_facts()
+        self.style = format.get_style()
+        self.style['font'] = ['Times New Roman']
+
+    def test_no_style(self):
+        result = format_rules.evaluate(self.facts, format.get_style(), 5)
+        self.assertEqual(result, {'points': 0, 'violations': {}}, "format_rules checked rules without a style.")
+
+    def test_font_violations(self):
+        violations = format_rules.evaluate(self.facts, self.style, 5)['violations']
+        wrong = [f for f in self.word.get_font() if f[0] != 'Times New Roman']
+        self.assertEqual(list(violations.keys()), ['font'], "format_rules checked the wrong rules.")
+        self.assertEqual(violations['font']['count'], len(wrong), "format_rules counted the wrong number of fonts.")
+        self.assertEqual(violations['font']['points'], 5 * len(wrong), "format_rules took off the wrong points.")
+        locations = self.word.get_font_locations()
+        self.assertEqual(violations['font']['locations'], sorted(set([i for f in wrong for i in locations[f]])),
+                         "format_rules gave the wrong paragraphs.")
+
+    def test_new_rule(self):
+        self.style['word_max'] = 10
+        rule = format_rules.Rule('word_max', ('word_max',), lambda facts, style, weight, proportional:
+                                 (weight, 1, None), "Paper is too long.")
+        result = format_rules.evaluate(self.facts, self.style, 5, rules=format_rules.RULES + [rule])
+        self.assertEqual(result['points'], 5 * result['violations']['font']['count'] + 5,
+                         "format_rules didn't add up every rule.")
+        self.assertEqual(format_rules.get_feedback(result, format_rules.RULES + [rule]),
+                         "Paper uses illegal font.\nPaper is too long.\n", "format_rules gave the wrong feedback.")
+
+    def test_batch(self):
+        facts = [self.facts, format.Format(FILEPATH + 'single_font.docx').get_facts()]
+        styles = [self.style, format.get_style()]
+        self.assertEqual(format_rules.evaluate_batch(facts, styles, 5, True),
+                         [[format_rules.evaluate(f, s, 5, True) for s in styles] for f in facts],
+                         "format_rules gave a different result in a batch.")
+
+
+class StubTokenizer:
+    """
+    Stands in for a Keras Tokenizer, counting every time one is fit
+    """
+    fits = 0
+
+    def __init__(self, word_index=None):
+        self.word_index = {} if word_index is None else word_index
+
+    def fit_on_texts(self, texts):
+        StubTokenizer.fits += 1
+        self.word_index = {w: i + 1 for i, w in enumerate(sorted(set(' '.join(texts).split())))}
+
+    def to_json(self):
+        return json.dumps(self.word_index)
+
+
+@unittest.skipIf(score_model_helper is None, "keras isn't installed")
+class TokenizerUnit(unittest.TestCase):
+    def setUp(self):
+        StubTokenizer.fits = 0
+        patcher = unittest.mock.patch.multiple(score_model_helper, Tokenizer=StubTokenizer,
+                                               tokenizer_from_json=lambda j: StubTokenizer(json.loads(j)),
+                                               get_dataframe=lambda loc: pandas.read_csv(loc, sep='\t'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.write_data("first essay")
+
+    def tearDown(self):
+        for path in ('./temp_data.tsv', './temp_model_tokenizer.json'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write_data(self, essay):
+        with open('./temp_data.tsv', 'w') as f:
+            f.write("essay\n" + essay + "\n")
+
+    def get_tokenizer(self):
+        return score_model_helper.get_tokenizer('./temp_data.tsv', './temp_model.h5')
+
+    def test_saved(self):
+        first = self.get_tokenizer()
+        self.assertEqual(self.get_tokenizer().word_index, first.word_index, "The saved tokenizer was changed.")
+        self.assertEqual(StubTokenizer.fits, 1, "The tokenizer was fit again on the same data.")
+
+    def test_data_changed(self):
+        self.get_tokenizer()
+        self.write_data("second essay")
+        self.assertIn('second', self.get_tokenizer().word_index, "The tokenizer wasn't fit on the new data.")
+        self.assertEqual(StubTokenizer.fits, 2, "The tokenizer wasn't fit again after the data changed.")
+
+    def test_only_mtime_changed(self):
+        self.get_tokenizer()
+        later = time.time() + 10
+        os.utime('./temp_data.tsv', (later, later))
+        self.get_tokenizer()
+        self.assertEqual(StubTokenizer.fits, 1, "The tokenizer was fit again when only the mtime changed.")
+
+    def test_version_changed(self):
+        self.get_tokenizer()
+        with unittest.mock.patch.object(score_model_helper, 'TOKENIZER_VERSION',
+                                        score_model_helper.TOKENIZER_VERSION + 1):
+            self.get_tokenizer()
+        self.assertEqual(StubTokenizer.fits, 2, "The tokenizer wasn't fit again after the version changed.")
+
+    def test_missing_data(self):
+        first = self.get_tokenizer()
+        os.remove('./temp_data.tsv')
+        self.assertEqual(self.get_tokenizer().word_index, first.word_index,
+                         "The saved tokenizer wasn't used without the data file.")
+        os.remove('./temp_model_tokenizer.json')
+        with self.assertRaises(FileNotFoundError):
+            self.get_tokenizer()
+
+
+class StubModel:
+    """
+    Stands in for a score_model.Model, so Grade can be made without loading any weights
+    """
+    def __init__(self, *args):
+        pass
+
+    def get_weights_version(self):
+        return 1
+
+    def evaluate_batch(self, essays):
+        return [0.0] * len(essays)
+
+
+@unittest.skipIf(grade is None, "keras or pdfminer isn't installed")
+class GradeUnit(unittest.TestCase):
+    def setUp(self):
+        self.checks = []
+
+        def number_of_errors(text, incremental=False):
+            self.checks.append(incremental)
+            return [], text
+
+        patcher = unittest.mock.patch.multiple(grade, ScoreModel=StubModel, IdeaModel=StubModel,
+                                               OrganizationModel=StubModel, StyleModel=StubModel)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch.object(grade.grammar_check, 'number_of_errors', number_of_errors)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.rubric = grade.get_rubric()
+        self.rubric.update({'grammar': 20, 'length': 20})
+        self.weights = grade.get_weights()
+        self.weights.update({'grammar': 1, 'allowed_mistakes': 0, 'word_min': 1, 'word_max': 100})
+        self.text = "This essay has exactly seven words."
+
+    def tearDown(self):
+        if os.path.exists('./temp_cache'):
+            shutil.rmtree('./temp_cache')
+
+    def make(self, **kwargs):
+        return grade.Grade(self.rubric, self.weights, FILEPATH, filepath={'dictionary': None}, style=grade.get_style(),
+                           **kwargs)
+
+    def test_config(self):
+        g = self.make()
+        weights = dict(self.weights)
+        weights['word_min'] = 50
+        config = g.get_config().replace(weights=weights)
+        default = g.get_grade(self.text)[1]
+        self.assertLess(g.get_grade(self.text, config)[1], default, "The given config wasn't graded under.")
+        self.assertEqual(g.get_config().get_weights(), self.weights, "Grading under a config changed the defaults.")
+        self.assertEqual(g.get_grade(self.text)[1], default, "The grade under one config was given for another.")
+        self.assertEqual(len(self.checks), 1, "The essay was measured again for a different config.")
+
+    def test_grammar_mode(self):
+        self.make(cache_path='./temp_cache').get_grade(self.text)
+        self.make(cache_path='./temp_cache', incremental_grammar=True).get_grade(self.text)
+        self.assertEqual(self.checks, [False, True], "A grammar check from one mode was used for the other.")
+
+
+class EmbeddingStoreUnit(unittest.TestCase):
+    def setUp(self):
+        self.file = open('temp.txt', 'w')
+        self.file.write("the 0.5 0.25\ncat 1.0 2.0\ndog 3.0 4.0")
+        self.file.close()
+
+    def tearDown(self):
+        embedding_store.clear()
+        for extension in ['.txt', embedding_store.VOCAB_EXTENSION, embedding_store.MATRIX_EXTENSION]:
+            if os.path.exists('temp' + extension):
+                os.remove('temp' + extension)
+
+    def test_store_path(self):
+        self.assertEqual(embedding_store.get_store_path('./temp.txt'), './temp', "Incorrect store path for a .txt")
+
+    def test_convert(self):
+        embedding_store.convert('./temp.txt')
+        vocabulary, matrix = embedding_store.load('./temp')
+        self.assertEqual(vocabulary, {'the': 0, 'cat': 1, 'dog': 2}, "The vocabulary index was stored incorrectly.")
+        self.assertEqual(matrix.shape, (3, 2), "The matrix was stored with the wrong shape.")
+
+    def test_gather(self):
+        matrix = embedding_store.get_embedding_matrix('./temp.txt', {'dog': 1, 'the': 2, 'missing': 3}, 4)
+        self.assertEqual(matrix.tolist(), [[0.0, 0.0], [3.0, 4.0], [0.5, 0.25], [0.0, 0.0]],
+                         "The embedding matrix rows don't match the word index.")
+
+    def test_shared_matrix(self):
+        a = embedding_store.get_embedding_matrix('./temp.txt', {'dog': 1, 'the': 2}, 3)
+        b = embedding_store.get_embedding_matrix('./temp.txt', {'the': 2, 'dog': 1}, 3)
+        c = embedding_store.get_embedding_matrix('./temp.txt', {'cat': 1}, 2)
+        self.assertIs(a, b, "Matching vocabularies didn't share an embedding matrix.")
+        self.assertIsNot(a, c, "Different vocabularies shared an embedding matrix.")
+        self.assertFalse(a.flags.writeable, "Shared embedding matrices should be read-only.")
+
+
+class BulkGradeUnit(unittest.TestCase):
+    def tearDown(self):
+        for path in ('./temp.csv', './temp.jsonl', './temp.tsv'):
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists('./temp_essays'):
+            shutil.rmtree('./temp_essays')
+
+    def write(self, path, text):
+        with open(path, 'w', newline='', encoding='utf8') as f:
+            f.write(text)
+
+    def test_essay_ids(self):
+        self.write('./temp.csv', 'essay_id,essay\n7,First essay\n8,\n9,"   "\n10,Second essay\n')
+        self.assertEqual(bulk_grade.read_essays('./temp.csv'), [('7', 'First essay'), ('10', 'Second essay')],
+                         "bulk_grade didn't leave out the empty essays.")
+
+    def test_row_ids(self):
+        self.write('./temp.csv', 'essay\nFirst essay\n""\nSecond essay\n')
+        self.assertEqual(bulk_grade.read_essays('./temp.csv'), [('0', 'First essay'), ('2', 'Second essay')],
+                         "bulk_grade didn't use the row numbers as ids.")
+
+    def test_directory(self):
+        os.makedirs('./temp_essays')
+        for name in ('b.docx', 'a.txt', 'notes.csv'):
+            self.write(os.path.join('./temp_essays', name), 'essay')
+        self.assertEqual(bulk_grade.read_essays('./temp_essays'),
+                         [('a.txt', './temp_essays/a.txt'), ('b.docx', './temp_essays/b.docx')],
+                         "bulk_grade listed the wrong essays.")
+
+    def test_finished_jsonl(self):
+        self.write('./temp.jsonl', '{"id": "1", "grade": 90}\n{"id": "2", "gra')
+        self.assertEqual(bulk_grade.read_finished('./temp.jsonl'), {'1'},
+                         "bulk_grade counted a cut off line as finished.")
+
+    def test_finished_tsv(self):
+        self.write('./temp.tsv', 'id\tgrade\tfeedback\tdebug\n1\t90\tgood\tdebug\n2\t80\n')
+        self.assertEqual(bulk_grade.read_finished('./temp.tsv'), {'1'},
+                         "bulk_grade counted a row without its debug as finished.")
+
+    def test_finished_missing(self):
+        self.assertEqual(bulk_grade.read_finished('./temp.tsv'), set(), "bulk_grade found results that don't exist.")
+
+
+class CacheUnit(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('./temp_cache'):
+            shutil.rmtree('./temp_cache')
+
+    def test_same_key(self):
+        self.assertEqual(cache.get_key('essay', {'a': 1, 'b': 2}), cache.get_key('essay', {'b': 2, 'a': 1}),
+                         "The same parts gave different keys.")
+
+    def test_different_key(self):
+        self.assertNotEqual(cache.get_key('essay', {'a': 1}), cache.get_key('essay', {'a': 2}),
+                            "Different parts gave the same key.")
+
+    def test_lru_eviction(self):
+        lru = cache.LRUCache(2)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3),
+                         "LRUCache didn't remove the least recently used value.")
+
+    def test_disk_tier(self):
+        cache.Cache(directory='./temp_cache').put('key', ('debug', 100, 'feedback'))
+        self.assertEqual(cache.Cache(directory='./temp_cache').get('key'), ('debug', 100, 'feedback'),
+                         "Cache couldn't read a value stored on disk.")
+
+    def test_clear(self):
+        c = cache.Cache(directory='./temp_cache')
+        c.put('key', 1)
+        c.clear()
+        self.assertIsNone(c.get('key'), "Cache kept a value after being cleared.")
+
+
+class DatabaseUnit(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('./temp.db'):
+            os.remove('./temp.db')
+
+    def test_save_and_get(self):
+        store = database.connect_sqlite('./temp.db')
+        result = {'grade': 90, 'sections': {'grammar': 10}, 'corrections': [['teh', 'the']], 'models': None}
+        store.save('essay.docx', 'ab12.docx', 'essay text', result, 90.0, 'feedback', 'error', 'a@b.com',
+                   '2021-04-01 10:00:00')
+        self.assertEqual(store.get_result('a@b.com', '2021-04-01 10:00:00'),
+                         ('essay.docx', 'ab12.docx', 90.0, 'error', 'feedback', 'essay text', result),
+                         "UserFileStore returned the wrong essay.")
+        store.close()
+
+    def test_lookup_index(self):
+        store = database.connect_sqlite('./temp.db')
+        store.save('essay.txt', 'ab12.txt', 'essay text', None, 90.0, 'feedback', 'error', 'a@b.com',
+                   '2021-04-01 10:00:00')
+        store.close()
+        c = sqlite3.connect('./temp.db')
+        plan = c.execute("EXPLAIN QUERY PLAN " + database.SELECT_RESULT.replace('%s', '?'),
+                         ('a@b.com', '2021-04-01 10:00:00')).fetchall()
+        c.close()
+        self.assertIn('UserFilesLookup', str(plan), "Results aren't looked up with the index.")
+
+    def test_add_columns(self):
+        c = sqlite3.connect('./temp.db')
+        c.execute("CREATE TABLE UserFiles (file_id INTEGER PRIMARY KEY AUTOINCREMENT, name CHAR(50), "
+                  "file_key CHAR(80), grade FLOAT, feedback TEXT, error TEXT, email CHAR(70), upload_date DATETIME)")
+        c.close()
+        store = database.connect_sqlite('./temp.db')
+        store.save('essay.txt', 'ab12.txt', 'essay text', None, 90.0, 'feedback', 'error', 'a@b.com',
+                   '2021-04-01 10:00:00')
+        self.assertEqual(store.get_result('a@b.com', '2021-04-01 10:00:00')[5], 'essay text',
+                         "UserFileStore didn't add the essay column to an older table.")
+        store.close()
+
+    def test_missing_result(self):
+        store = database.connect_sqlite('./temp.db')
+        self.assertIsNone(store.get_result('a@b.com', '2021-04-01 10:00:00'), "UserFileStore found a missing essay.")
+        store.close()
+
+    def test_pool_size(self):
+        pool = database.ConnectionPool(lambda: object(), lambda c: True, 1)
+        pool.checkout()
+        with self.assertRaises(queue.Empty):
+            pool.checkout(timeout=0.01)
+
+    def test_health_check(self):
+        pool = database.ConnectionPool(lambda: sqlite3.connect(':memory:'), lambda c: c.execute('SELECT 1'))
+        c = pool.checkout()
+        c.close()
+        pool.checkin(c)
+        self.assertEqual(pool.health_check(), 1, "ConnectionPool kept a closed connection.")
+        self.assertIsNotNone(pool.checkout().execute('SELECT 1'), "ConnectionPool didn't open a new connection.")
+
+
+class FileStoreUnit(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('./temp_files'):
+            shutil.rmtree('./temp_files')
+
+    def test_same_contents(self):
+        files = file_store.FileStore('./temp_files')
+        self.assertEqual(files.put(FILEPATH + 'single_font.docx'), files.put(FILEPATH + 'single_font.docx'),
+                         "FileStore gave the same file different keys.")
+
+    def test_copy(self):
+        files = file_store.FileStore('./temp_files')
+        key = files.put(FILEPATH + 'single_font.docx')
+        self.assertTrue(key.endswith('.docx'), "FileStore didn't keep the file's extension.")
+        with open(files.get_path(key), 'rb') as a, open(FILEPATH + 'single_font.docx', 'rb') as b:
+            self.assertEqual(a.read(), b.read(), "FileStore changed the stored file.")
+
+    def test_remove_older_than(self):
+        files = file_store.FileStore('./temp_files')
+        key = files.put(FILEPATH + 'single_font.docx')
+        self.assertEqual(files.remove_older_than(60), 0, "FileStore removed a new file.")
+        self.assertEqual(files.remove_older_than(-1), 1, "FileStore didn't remove an old file.")
+        self.assertFalse(files.exists(key), "FileStore kept a removed file.")
+
+
+class JobQueueUnit(unittest.TestCase):
+    def setUp(self):
+        self.queue = jobs.JobQueue(1, keep=0.2)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def wait(self, job_id):
+        for i in range(100):
+            status = self.queue.get_status(job_id)
+            if status['status'] in ('done', 'failed'):
+                return status
+            time.sleep(0.01)
+        self.fail("JobQueue never finished the job.")
+
+    def test_submit(self):
+        job_id = self.queue.submit(lambda a, b: a + b, 2, 3)
+        self.assertEqual(self.wait(job_id), {'status': 'done', 'result': 5, 'error': None},
+                         "JobQueue gave the wrong status.")
+        self.assertEqual(self.queue.get_waiting(), 0, "JobQueue counted a finished job as waiting.")
+
+    def test_missing(self):
+        self.assertIsNone(self.queue.get_status('missing'), "JobQueue found a job that was never submitted.")
+
+    def test_forget_finished(self):
+        job_id = self.queue.submit(lambda: None)
+        self.wait(job_id)
+        time.sleep(0.3)
+        # Finished jobs are forgotten when the next one is submitted
+        self.wait(self.queue.submit(lambda: None))
+        self.assertIsNone(self.queue.get_status(job_id), "JobQueue kept a job longer than keep.")
+
+    def test_failed(self):
+        def fail():
+            raise ValueError("bad essay")
+
+        with unittest.mock.patch('traceback.print_exc'):
+            status = self.wait(self.queue.submit(fail))
+        self.assertEqual(status, {'status': 'failed', 'result': None, 'error': 'bad essay'},
+                         "JobQueue didn't report the job failing.")
+        self.assertEqual(self.wait(self.queue.submit(lambda: 1))['status'], 'done',
+                         "JobQueue stopped running jobs after one failed.")
+
+
+class LocalServer:
+    """
+    Stands in for an SMTP connection, keeping every message it is given instead of sending it
+    """
+    def __init__(self, sent, refuse=()):
+        self.sent = sent
+        self.refuse = refuse
+
+    def sendmail(self, sender, receiver, message):
+        if receiver in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({receiver: (550, b'No such user')})
+        self.sent.append((sender, receiver, message))
+
+    def quit(self):
+        pass
+
+
+class OutboxUnit(unittest.TestCase):
+    def setUp(self):
+        self.sent = []
+        self.connections = 0
+
+    def tearDown(self):
+        if os.path.exists('./temp_outbox.db'):
+            os.remove('./temp_outbox.db')
+
+    def connect(self):
+        self.connections += 1
+        return LocalServer(self.sent, ['missing@b.com'])
+
+    def test_batch(self):
+        emails = outbox.Outbox('./temp_outbox.db', self.connect, 'iga@b.com')
+        ids = [emails.send('a@b.com', 'Subject: ' + str(i)) for i in range(3)]
+        self.assertEqual(emails.send_pending(), 3, "Outbox didn't send every message.")
+        self.assertEqual(self.connections, 1, "Outbox didn't send every message over one connection.")
+        self.assertEqual(self.sent[0], ('iga@b.com', 'a@b.com', 'Subject: 0'), "Outbox sent the wrong message.")
+        self.assertEqual(emails.get_status(ids[2])['status'], 'sent', "Outbox didn't mark a message as sent.")
+        self.assertEqual(emails.get_waiting(), 0, "Outbox still has messages waiting.")
+
+    def test_retry(self):
+        def connect():
+            self.connections += 1
+            if self.connections == 1:
+                raise ConnectionRefusedError()
+            return LocalServer(self.sent)
+
+        emails = outbox.Outbox('./temp_outbox.db', connect, 'iga@b.com', backoff=0)
+        message_id = emails.send('a@b.com', 'Subject: Test')
+        self.assertEqual(emails.send_pending(), 0, "Outbox sent a message without a connection.")
+        self.assertEqual(emails.get_status(message_id)['attempts'], 1, "Outbox didn't count a failed attempt.")
+        self.assertEqual(emails.send_pending(), 1, "Outbox didn't retry a failed message.")
+
+    def test_refused(self):
+        emails = outbox.Outbox('./temp_outbox.db', self.connect, 'iga@b.com', backoff=0)
+        message_id = emails.send('missing@b.com', 'Subject: Test')
+        emails.send_pending()
+        self.assertEqual(emails.get_status(message_id)['status'], 'failed', "Outbox retried a refused address.")
+
+    def test_kept_until_sent(self):
+        outbox.Outbox('./temp_outbox.db', self.connect, 'iga@b.com').send('a@b.com', 'Subject: Test')
+        emails = outbox.Outbox('./temp_outbox.db', self.connect, 'iga@b.com')
+        self.assertEqual(emails.send_pending(), 1, "Outbox lost a message that was never sent.")
+
+    def test_background(self):
+        emails = outbox.Outbox('./temp_outbox.db', self.connect, 'iga@b.com')
+        emails.start()
+        message_id = emails.send('a@b.com', 'Subject: Test')
+        for i in range(100):
+            if emails.get_status(message_id)['status'] == 'sent':
+                break
+            time.sleep(0.01)
+        emails.stop()
+        self.assertEqual(emails.get_status(message_id)['status'], 'sent', "Outbox didn't send in the background.")
+
 
 if __name__ == "__main__":
     unittest.main()